@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Snapshot delivery under packet loss: TCP vs the UDP snapshot channel
+
+Runs one game room on localhost with two bot players behind a loss-injecting
+proxy and reports how old each SNAPSHOT is when the client applies it.
+
+- TCP: the proxy cannot drop bytes from a stream, so it models what the kernel
+  does instead: a "lost" frame is held back for one retransmission timeout and
+  every frame queued behind it waits too (head-of-line blocking).
+- UDP: the proxy drops the datagram; the next snapshot replaces it.
+
+Usage:
+    python bench_snapshot_loss.py [--loss 0.05] [--rto 0.2] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import struct
+import time
+from typing import List, Optional
+
+import config
+import utils as ut
+import game
+
+
+# ============================================================================
+# Loss-injecting proxies
+# ============================================================================
+
+class TcpLossProxy:
+    """Forwards game TCP; server->client frames suffer RTO-sized stalls with probability `loss`"""
+
+    def __init__(self, target_port: int, loss: float, rto: float, rng: random.Random):
+        self.target_port = target_port
+        self.loss = loss
+        self.rto = rto
+        self.rng = rng
+        self.server: Optional[asyncio.Server] = None
+        self.port: Optional[int] = None
+        self.stalls = 0
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, client_reader, client_writer) -> None:
+        server_reader, server_writer = await asyncio.open_connection('127.0.0.1', self.target_port)
+        upstream = asyncio.create_task(self._pipe(client_reader, server_writer))
+        try:
+            await self._lossy_downstream(server_reader, client_writer)
+        finally:
+            upstream.cancel()
+            for writer in (client_writer, server_writer):
+                writer.close()
+
+    async def _pipe(self, reader, writer) -> None:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+
+    async def _lossy_downstream(self, reader, writer) -> None:
+        blocked_until = 0.0
+        while True:
+            try:
+                header = await reader.readexactly(4)
+                (length,) = struct.unpack('!I', header)
+                body = await reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            now = time.monotonic()
+            if self.rng.random() < self.loss:
+                # Segment lost: it and everything behind it wait for the retransmission
+                blocked_until = max(blocked_until, now) + self.rto
+                self.stalls += 1
+            if blocked_until > now:
+                await asyncio.sleep(blocked_until - now)
+            writer.write(header + body)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                break
+
+    def close(self) -> None:
+        if self.server:
+            self.server.close()
+
+
+class UdpLossProxy(asyncio.DatagramProtocol):
+    """Forwards the UDP snapshot channel, dropping server->client datagrams with probability `loss`"""
+
+    def __init__(self, target_port: int, loss: float, rng: random.Random):
+        self.target = ('127.0.0.1', target_port)
+        self.loss = loss
+        self.rng = rng
+        self.transport = None
+        self.port: Optional[int] = None
+        self.clients = {}           # upstream socket -> client address
+        self.dropped = 0
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        self.port = transport.get_extra_info('sockname')[1]
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        # Client -> server: one upstream socket per client so replies can be told apart
+        upstream = self.clients.get(addr)
+        if upstream is None:
+            asyncio.ensure_future(self._open_upstream(addr, data))
+            return
+        upstream.sendto(data)
+
+    async def _open_upstream(self, client_addr, first: bytes) -> None:
+        loop = asyncio.get_running_loop()
+        proxy = self
+
+        class Downstream(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                if proxy.rng.random() < proxy.loss:
+                    proxy.dropped += 1
+                    return
+                proxy.transport.sendto(data, client_addr)
+
+        transport, _ = await loop.create_datagram_endpoint(Downstream, remote_addr=self.target)
+        self.clients[client_addr] = transport
+        transport.sendto(first)
+
+    def close(self) -> None:
+        for transport in self.clients.values():
+            transport.close()
+        if self.transport:
+            self.transport.close()
+
+
+# ============================================================================
+# Bot player
+# ============================================================================
+
+async def run_bot(username: str, room_id: str, tcp_port: int, udp_port: Optional[int],
+                  deadline: float, ages: List[float]) -> dict:
+    reader, writer = await asyncio.open_connection('127.0.0.1', tcp_port)
+    await ut.send_message(writer, {'type': 'JOIN', 'username': username, 'roomId': room_id,
+                                   'udp': udp_port is not None})
+    welcome = json.loads(await ut.unpack_message(reader))
+    stream = game.GameMessageStream(reader)
+    if udp_port is not None and welcome.get('udp'):
+        await stream.open_udp('127.0.0.1', {**welcome['udp'], 'port': udp_port})
+    await ut.send_message(writer, {'type': 'READY', 'username': username})
+
+    try:
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                msg = await asyncio.wait_for(stream.recv(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if msg is None or msg.get('type') == 'END':
+                break
+            if msg.get('type') == 'SNAPSHOT':
+                ages.append(time.time() * 1000 - msg['ts'])
+    finally:
+        stream.close()
+        writer.close()
+    return {'datagrams': stream.datagrams, 'stale_dropped': stream.stale_dropped}
+
+
+async def run_trial(transport: str, loss: float, rto: float, duration: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    room_id = f"bench-{transport}"
+    server, port, tick_task, game_ctx = await game.run_game_server(
+        room_id, [f'P1_{room_id}', f'P2_{room_id}'], '127.0.0.1', 0
+    )
+    tcp_proxy = TcpLossProxy(port, loss, rto, rng)
+    await tcp_proxy.start()
+    udp_proxy = None
+    if transport == 'udp':
+        loop = asyncio.get_running_loop()
+        _, udp_proxy = await loop.create_datagram_endpoint(
+            lambda: UdpLossProxy(port, loss, rng), local_addr=('127.0.0.1', 0)
+        )
+
+    ages: List[float] = []
+    deadline = time.time() + duration
+    udp_port = udp_proxy.port if udp_proxy else None
+    bots = await asyncio.gather(
+        run_bot('alice', room_id, tcp_proxy.port, udp_port, deadline, ages),
+        run_bot('bob', room_id, tcp_proxy.port, udp_port, deadline, ages),
+    )
+
+    # End the game so the server's and proxy's connection handlers return by themselves
+    # (cancelling a start_server handler is logged as an unhandled error before 3.12),
+    # then cancel whatever is left and wait for all of it before the next trial
+    game_ctx.game_active = False
+    tick_task.cancel()
+    server.close()
+    tcp_proxy.close()
+    if udp_proxy:
+        udp_proxy.close()
+    handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    if handlers:
+        _, stragglers = await asyncio.wait(handlers, timeout=2)
+        for task in stragglers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+    await server.wait_closed()
+    await tcp_proxy.server.wait_closed()
+
+    ages.sort()
+    pick = lambda q: ages[min(len(ages) - 1, int(q * len(ages)))] if ages else float('nan')
+    return {
+        'transport': transport,
+        'snapshots': len(ages),
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'max_ms': ages[-1] if ages else float('nan'),
+        'mean_ms': statistics.fmean(ages) if ages else float('nan'),
+        'tcp_stalls': tcp_proxy.stalls,
+        'udp_dropped': udp_proxy.dropped if udp_proxy else 0,
+        'stale_dropped': sum(b['stale_dropped'] for b in bots),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loss', type=float, default=0.05, help='loss probability per frame/datagram')
+    parser.add_argument('--rto', type=float, default=0.2, help='simulated TCP retransmission timeout (s)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per trial')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    config.GAME_UDP_SNAPSHOTS = True
+    print(f"loss={args.loss:.1%} rto={args.rto * 1000:.0f}ms duration={args.duration:.0f}s")
+    print(f"{'transport':<10}{'snaps':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}  notes")
+    for transport in ('tcp', 'udp'):
+        r = await run_trial(transport, args.loss, args.rto, args.duration, args.seed)
+        notes = (f"{r['tcp_stalls']} HOL stalls" if transport == 'tcp'
+                 else f"{r['udp_dropped']} dropped, {r['stale_dropped']} stale discarded")
+        print(f"{transport:<10}{r['snapshots']:>7}{r['p50_ms']:>7.0f}ms{r['p95_ms']:>6.0f}ms"
+              f"{r['p99_ms']:>6.0f}ms{r['max_ms']:>6.0f}ms  {notes}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(levelname)s] %(message)s')
+    asyncio.run(main())
@@ -679,6 +679,7 @@ async def connect_to_game_server(ip, port, username, room_id, mode="player"):
     Connect to the game server and handle the game session.
     """
     writer = None
+    stream = None
     try:
         reader, writer = await asyncio.open_connection(ip, port)
         print(f"Successfully connected to game server at {ip}:{port}")
@@ -689,12 +690,15 @@ async def connect_to_game_server(ip, port, username, room_id, mode="player"):
             join_msg = {
                 "type": "WATCH",
                 "username": username,
-                "roomId": room_id
+                "roomId": room_id,
+                "udp": config.GAME_UDP_SNAPSHOTS
             }
         else:
             join_msg = {
                 "type": "JOIN",
-                "username": username
+                "username": username,
+                "roomId": room_id,
+                "udp": config.GAME_UDP_SNAPSHOTS
             }
         await ut.send_message(writer, join_msg)
         logging.info(f"Sent {join_msg['type']} message with username: {username}")
@@ -725,6 +729,10 @@ async def connect_to_game_server(ip, port, username, room_id, mode="player"):
             logging.error(f"Failed to parse WELCOME message: {e}")
             return
         
+        stream = game.GameMessageStream(reader)
+        if welcome_msg.get("udp"):
+            await stream.open_udp(ip, welcome_msg["udp"])
+        
         if mode != "watcher":
             ready_msg = {
                 "type": "READY",
@@ -734,21 +742,23 @@ async def connect_to_game_server(ip, port, username, room_id, mode="player"):
             logging.info("Sent READY signal to game server")
         
         # Start game loop
-        await game_loop(reader, writer, username, mode=mode)
+        await game_loop(stream, writer, username, mode=mode)
         
     except Exception as e:
         logging.error(f"Error in game session: {e}")
         print(f"Game session error: {e}")
     finally:
+        if stream:
+            stream.close()
         if writer:
             writer.close()
             await writer.wait_closed()
         logging.info("Disconnected from game server")
 
 
-async def game_loop(reader, writer, username, mode="player"):
+async def game_loop(stream, writer, username, mode="player"):
     if TEXT_MODE_CLIENT or pygame is None:
-        return await text_mode_game_loop(reader, writer, username, mode=mode)
+        return await text_mode_game_loop(stream, writer, username, mode=mode)
     """
     Render local/opponent boards with pygame and stream keyboard inputs to the game server.
     """
@@ -823,18 +833,12 @@ async def game_loop(reader, writer, username, mode="player"):
         nonlocal game_active, opponent_name, info_banner, final_message
         try:
             while True:
-                message = await ut.unpack_message(reader)
-                if not message:
+                msg = await stream.recv()
+                if msg is None:
                     info_banner = "Lost connection to the game server."
                     game_active = False
                     break
 
-                try:
-                    msg = json.loads(message)
-                except json.JSONDecodeError:
-                    logging.error(f"Failed to parse game message: {message}")
-                    continue
-
                 msg_type = msg.get("type")
                 if msg_type == "SNAPSHOT":
                     player = msg.get("username")
@@ -1044,7 +1048,7 @@ TEXT_INPUT_MAP = {
 }
 
 
-async def text_mode_game_loop(reader, writer, username, mode="player"):
+async def text_mode_game_loop(stream, writer, username, mode="player"):
     player_states = {}
     opponent_name = None
     is_watcher = mode == "watcher"
@@ -1104,15 +1108,11 @@ async def text_mode_game_loop(reader, writer, username, mode="player"):
         nonlocal opponent_name, info_banner, final_message, game_active
         try:
             while True:
-                message = await ut.unpack_message(reader)
-                if not message:
+                msg = await stream.recv()
+                if msg is None:
                     info_banner = "Lost connection to the game server."
                     game_active = False
                     break
-                try:
-                    msg = json.loads(message)
-                except json.JSONDecodeError:
-                    continue
                 msg_type = msg.get("type")
                 if msg_type == "SNAPSHOT":
                     player = msg.get("username")
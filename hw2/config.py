@@ -1,5 +1,8 @@
 import asyncio
 import json
+import os
+
+import allocator
 
 # HOST = '140.113.17.13'
 HOST = '192.168.56.1'
@@ -11,14 +14,32 @@ PORT = 52273
 DB_PORT = 52274
 GAME_PORT_RANGE = (52275, 52325)
 GAME_HOST = HOST
+# Host rooms in worker processes (one per core) instead of the lobby's event loop
+USE_GAME_WORKERS = True
+GAME_WORKERS = os.cpu_count() or 1
+# "shared": one listener per game host routes connections by roomId
+# "per_room": every room binds its own port from GAME_PORT_RANGE
+GAME_ROUTING = "shared"
+# Worker N listens on GAME_ROUTER_PORT + N
+GAME_ROUTER_PORT = 52330
+# Offer SNAPSHOT/TEMPO over UDP (same port number as the TCP listener)
+GAME_UDP_SNAPSHOTS = True
+# Frames buffered per game recipient before stale snapshots are dropped
+GAME_OUTBOX_FRAMES = 32
+# Watchers beyond this many per room are sent to a spectator relay process started by the lobby
+MAX_DIRECT_WATCHERS = 4
+# Seconds the relay holds frames before spectators see them
+SPECTATOR_DELAY = 0.0
 LOG_FILE = 'logger.log'
 SNAPSHOT_LOG_FILE = 'snapshots.log'
 DB_FILE = 'data.json'
 
 P2P_PORT_RANGE = (63042, 63142)
-available_ports = {}
-for i in range(63042, 63142 + 1):
-    available_ports[i] = 1
+# Ports stay leased to their room until the lobby releases it; no TTL, so a long
+# game's port is never reaped and handed to another room while still bound
+p2p_ports = allocator.IdAllocator(*P2P_PORT_RANGE, name="p2p ports")
+game_ports = allocator.IdAllocator(*GAME_PORT_RANGE, name="game ports")
+room_ids = allocator.RoomIdAllocator()
 
 MAX_MSG_SIZE = 65536
 
@@ -54,3 +75,7 @@ class server:
             self.rooms = {}
         
 tetris_server = server()
+
+# Room IDs restored from disk stay taken
+for _room_id in tetris_server.rooms:
+    room_ids.reserve_id(_room_id)
@@ -71,6 +71,9 @@ async def handle_client(reader, writer):
 
             elif command == "SERVER_CLOSED":
                 await db_close_server(params)
+
+            elif command == "DELETE_ROOM":
+                await db_delete_room(params)
             
             else:
                 await ut.send_message(writer, ut.build_response("database", "error", "[DB] Unknown command"))
@@ -193,6 +196,7 @@ async def db_logout(username, writer):
                     remove_room.append(room)
             for room in remove_room:
                 del tetris_server.rooms[room]
+                ut.release_room_id(room)
                 logging.info(f"Removed room {room}")
             
             async with tetris_server.db_lock:
@@ -210,9 +214,32 @@ async def db_logout(username, writer):
 """
 Game-related
 """
+async def db_delete_room(params):
+    """The lobby closed a room after its last player left; drop it and free its ID"""
+    if not params:
+        return
+    room_id = params[0]
+    async with tetris_server.rooms_lock:
+        tetris_server.rooms.pop(room_id, None)
+        ut.release_room_id(room_id)
+
+        async with tetris_server.db_lock:
+            with open(config.DB_FILE, "r") as f:
+                data = json.load(f)
+
+            data["rooms"] = tetris_server.rooms
+
+            with open(config.DB_FILE, "w") as f:
+                json.dump(data, f, indent=4)
+    logging.info(f"[DB] Deleted room {room_id}")
+
+
 async def db_create_room(params, writer):
-    room_id = ut.get_room_id()
     username, room_type = params
+    room_id = ut.get_room_id(username)
+    if room_id is None:
+        await ut.send_message(writer, ut.build_response("database", "error", "No room IDs available"))
+        return
     
     # Update server
     async with tetris_server.rooms_lock:
@@ -557,6 +584,7 @@ async def db_close_server(params):
                 
         for rm in rm_room:
             del tetris_server.rooms[rm]
+            ut.release_room_id(rm)
         
         async with tetris_server.db_lock:
             with open(config.DB_FILE, "r") as f:
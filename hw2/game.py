@@ -7,15 +7,18 @@ Handles real-time 2-player tetris with:
 - Client sends input events
 - Server broadcasts state snapshots
 - Length-prefixed framing protocol
+- Optional UDP channel for SNAPSHOT/TEMPO (negotiated in WELCOME), TCP for control
 """
 
 import asyncio
+import collections
 import json
 import logging
 import random
+import secrets
 import struct
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
 import config
 import utils as ut
@@ -257,6 +260,10 @@ class GameServerContext:
         self.tick_task: Optional[asyncio.Task] = None
         self.game_start_event = asyncio.Event()
         self.watchers: Dict[str, asyncio.StreamWriter] = {}
+        self.outboxes: Dict[str, 'Outbox'] = {}
+        # Called when a watcher the lobby sent here directly connects / disconnects (not for relays)
+        self.on_watcher_joined: Optional[Callable[[], None]] = None
+        self.on_watcher_left: Optional[Callable[[], None]] = None
         
         # Game state
         self.boards: Dict[str, TetrisBoard] = {}
@@ -269,6 +276,13 @@ class GameServerContext:
         self.game_end_time = None
         self.winner = None
         self.game_over_reason = None
+        self.results: List[dict] = []
+        
+        # Datagram channel: recipient key (user_id / watch_id) -> token / client address
+        self.udp: Optional['SnapshotDatagramEndpoint'] = None
+        self.udp_tokens: Dict[str, str] = {}
+        self.udp_peers: Dict[str, tuple] = {}
+        self.datagram_seq = 0
         
         # Timing
         self.gravity_interval = 500  # ms
@@ -277,6 +291,7 @@ class GameServerContext:
         self.gravity_step_seconds = 60  # seconds between gravity boosts
         self.next_gravity_update_time: Optional[float] = None
         self.snapshot_interval = 100  # ms
+        self.max_tick_ms = 0.0
         
         self.lock = asyncio.Lock()
     
@@ -320,25 +335,128 @@ class GameServerContext:
         return plan
 
 
+# ============================================================================
+# Outbound buffers
+# ============================================================================
+
+class Outbox:
+    """
+    Encoded frames waiting for one recipient, drained by its own writer task.
+    put() never awaits, so the tick loop runs at the same pace no matter how
+    many recipients there are or how slow their sockets are.
+    Frames put with a key (e.g. "SNAPSHOT:P1_x") are superseded state: once
+    the buffer is full the oldest queued frame with that key is dropped.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, name: str, max_frames: Optional[int] = None):
+        self.writer = writer
+        self.name = name
+        self.max_frames = max_frames or config.GAME_OUTBOX_FRAMES
+        self.frames: Deque[Tuple[Optional[str], bytes]] = collections.deque()
+        self.ready = asyncio.Event()
+        self.closing = False
+        self.sent = 0
+        self.dropped = 0
+        self.task = asyncio.create_task(self._drain())
+
+    def put(self, frame: Optional[bytes], key: Optional[str] = None) -> bool:
+        if frame is None or self.closing or self.task.done():
+            return False
+        if len(self.frames) >= self.max_frames and not self._make_room(key):
+            # Only control frames are queued and the peer is not reading at all
+            logging.warning(f"[Game] Outbox for {self.name} overflowed, disconnecting")
+            self.closing = True
+            self.frames.clear()
+            self.writer.close()
+            return False
+        self.frames.append((key, frame))
+        self.ready.set()
+        return True
+
+    def _make_room(self, key: Optional[str]) -> bool:
+        victim = None
+        for index, (queued_key, _) in enumerate(self.frames):
+            if queued_key is None:
+                continue
+            if queued_key == key:
+                victim = index
+                break
+            if victim is None:
+                victim = index
+        if victim is None:
+            return len(self.frames) < self.max_frames * 4
+        del self.frames[victim]
+        self.dropped += 1
+        return True
+
+    async def _drain(self) -> None:
+        try:
+            while True:
+                if not self.frames:
+                    if self.closing:
+                        break
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                while self.frames:
+                    _, frame = self.frames.popleft()
+                    self.writer.write(frame)
+                    self.sent += 1
+                await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            logging.info(f"[Game] Stopped writing to {self.name}: {e}")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.frames.clear()
+
+    async def close(self, timeout: float = 2.0) -> None:
+        """Flush what is queued (up to timeout), then stop the writer task"""
+        self.closing = True
+        self.ready.set()
+        try:
+            await asyncio.wait_for(self.task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"[Game] Gave up flushing {len(self.frames)} frames to {self.name}")
+
+
+def deliver(game_ctx: GameServerContext, key: str, frame: Optional[bytes],
+            datagram: Optional[bytes] = None, supersede: Optional[str] = None) -> None:
+    """Queue a message for one recipient: UDP if bound, otherwise its outbox"""
+    if send_datagram(game_ctx, key, datagram):
+        return
+    outbox = game_ctx.outboxes.get(key)
+    if outbox is not None:
+        outbox.put(frame, supersede)
+
+
+async def read_hello(reader: asyncio.StreamReader, addr) -> Optional[dict]:
+    """Read and decode the JOIN/WATCH hello that opens every game connection"""
+    join_data = await ut.unpack_message(reader)
+    if not join_data:
+        logging.error(f"[Game] Failed to receive HELLO from {addr}")
+        return None
+    try:
+        return json.loads(join_data)
+    except json.JSONDecodeError as e:
+        logging.error(f"[Game] JSON decode error from {addr}: {e}")
+        return None
+
+
 async def handle_player_connection(reader: asyncio.StreamReader, 
                                    writer: asyncio.StreamWriter,
-                                   game_ctx: GameServerContext) -> None:
+                                   game_ctx: GameServerContext,
+                                   join_msg: Optional[dict] = None) -> None:
     """Handle a single player or watcher connection"""
     addr = writer.get_extra_info('peername')
     username = None
     user_id = None
     
     try:
-        join_data = await ut.unpack_message(reader)
-        if not join_data:
-            logging.error(f"[Game] Failed to receive HELLO from {addr}")
-            return
-        
-        try:
-            join_msg = json.loads(join_data)
-        except json.JSONDecodeError as e:
-            logging.error(f"[Game] JSON decode error from {addr}: {e}")
-            return
+        if join_msg is None:
+            join_msg = await read_hello(reader, addr)
+            if join_msg is None:
+                return
 
         msg_type = join_msg.get('type')
         username = join_msg.get('username')
@@ -358,6 +476,7 @@ async def handle_player_connection(reader: asyncio.StreamReader,
                         user_id = pid
                         game_ctx.players[user_id] = writer
                         game_ctx.usernames[user_id] = username
+                        game_ctx.outboxes[user_id] = Outbox(writer, username)
                         break
             
             if not user_id:
@@ -378,7 +497,9 @@ async def handle_player_connection(reader: asyncio.StreamReader,
                 'bagRule': '7bag',
                 'gravityPlan': game_ctx.get_gravity_plan()
             }
-            await ut.send_message(writer, welcome_msg)
+            if join_msg.get('udp') and game_ctx.udp:
+                welcome_msg['udp'] = game_ctx.udp.offer(game_ctx, user_id)
+            game_ctx.outboxes[user_id].put(ut.encode_message(welcome_msg))
             logging.info(f"[Game] Sent WELCOME to {username}")
             
             # Wait for READY
@@ -408,6 +529,11 @@ async def handle_player_connection(reader: asyncio.StreamReader,
                     del game_ctx.players[user_id]
                 if user_id in game_ctx.usernames:
                     del game_ctx.usernames[user_id]
+                outbox = game_ctx.outboxes.pop(user_id, None)
+            if game_ctx.udp:
+                game_ctx.udp.revoke(game_ctx, user_id)
+            if outbox:
+                await outbox.close()
             logging.info(f"[Game] Player {username} ({user_id}) disconnected")
         
         try:
@@ -426,6 +552,7 @@ async def handle_watcher_connection(join_msg: dict,
     watch_id = f"WATCH_{username}_{int(time.time() * 1000)}"
     async with game_ctx.lock:
         game_ctx.watchers[watch_id] = writer
+        game_ctx.outboxes[watch_id] = Outbox(writer, username)
     welcome_msg = {
         'type': 'WELCOME',
         'role': 'WATCHER',
@@ -435,7 +562,11 @@ async def handle_watcher_connection(join_msg: dict,
         'gravityPlan': game_ctx.get_gravity_plan(),
         'players': list(game_ctx.usernames.values())
     }
-    await ut.send_message(writer, welcome_msg)
+    if join_msg.get('udp') and game_ctx.udp:
+        welcome_msg['udp'] = game_ctx.udp.offer(game_ctx, watch_id)
+    game_ctx.outboxes[watch_id].put(ut.encode_message(welcome_msg))
+    if game_ctx.on_watcher_joined and not join_msg.get('relay'):
+        game_ctx.on_watcher_joined()
     logging.info(f"[Game] Watcher {username} connected from {addr}")
     try:
         while True:
@@ -448,6 +579,13 @@ async def handle_watcher_connection(join_msg: dict,
         async with game_ctx.lock:
             if watch_id in game_ctx.watchers:
                 del game_ctx.watchers[watch_id]
+            outbox = game_ctx.outboxes.pop(watch_id, None)
+        if game_ctx.udp:
+            game_ctx.udp.revoke(game_ctx, watch_id)
+        if outbox:
+            await outbox.close()
+        if game_ctx.on_watcher_left and not join_msg.get('relay'):
+            game_ctx.on_watcher_left()
         logging.info(f"[Game] Watcher {username} disconnected")
         try:
             writer.close()
@@ -519,6 +657,7 @@ async def game_tick_loop(game_ctx: GameServerContext) -> None:
     """Main game loop: gravity, snapshots, game-over detection"""
     try:
         while game_ctx.game_active:
+            tick_started = time.perf_counter()
             game_ctx.tick += 1
             now_ts = time.time()
             current_time = now_ts - game_ctx.game_start_time
@@ -532,7 +671,7 @@ async def game_tick_loop(game_ctx: GameServerContext) -> None:
                 )
                 if new_interval != game_ctx.gravity_interval:
                     game_ctx.gravity_interval = new_interval
-                    await broadcast_tempo(game_ctx)
+                    broadcast_tempo(game_ctx)
                 if game_ctx.gravity_interval <= game_ctx.gravity_min_interval:
                     game_ctx.next_gravity_update_time = None
                 else:
@@ -547,55 +686,55 @@ async def game_tick_loop(game_ctx: GameServerContext) -> None:
             
             # Send snapshots periodically
             if game_ctx.tick % max(1, int(game_ctx.snapshot_interval / 16)) == 0:
-                await broadcast_snapshots(game_ctx)
+                broadcast_snapshots(game_ctx)
             
             # Check for game over
             game_overs = sum(1 for b in game_ctx.boards.values() if b.game_over)
             if game_overs > 0:
                 game_ctx.game_active = False
                 game_ctx.game_end_time = time.time()
-                await end_game(game_ctx)
+                end_game(game_ctx)
                 break
             
+            # Nothing above awaits the network, so this stays flat as recipients are added
+            game_ctx.max_tick_ms = max(game_ctx.max_tick_ms, (time.perf_counter() - tick_started) * 1000)
             await asyncio.sleep(0.016)  # ~60 FPS
     
     except asyncio.CancelledError:
         pass
 
 
-async def broadcast_snapshots(game_ctx: GameServerContext) -> None:
-    """Send game state snapshots to all connected players"""
+def broadcast_snapshots(game_ctx: GameServerContext) -> None:
+    """Queue game state snapshots for all connected players and watchers"""
     snapshots = {}
     for user_id in game_ctx.player_ids:
         board = game_ctx.boards[user_id]
         username = game_ctx.usernames.get(user_id, user_id)
         snapshots[user_id] = board.get_snapshot(user_id, game_ctx.tick, username=username)
+    datagrams = {user_id: stamp_datagram(game_ctx, snapshot) for user_id, snapshot in snapshots.items()}
+    
+    # Encode each snapshot once; every recipient shares the same frame
+    frames = {}
+    for user_id, snapshot in snapshots.items():
+        frames[user_id] = ut.encode_message(snapshot)
+        ut.log_sent(snapshot)
     
     # Send each player their own snapshot + opponent's
-    for user_id in game_ctx.players:
-        try:
-            # Send own state
-            await ut.send_message(game_ctx.players[user_id], snapshots[user_id])
-            
-            # Send opponent state
-            opponent_id = game_ctx.player_ids[1] if game_ctx.player_ids[0] == user_id else game_ctx.player_ids[0]
-            if opponent_id in snapshots:
-                await ut.send_message(game_ctx.players[user_id], snapshots[opponent_id])
-        
-        except Exception as e:
-            logging.error(f"[Game] Failed to send snapshot to {user_id}: {e}")
+    for user_id in list(game_ctx.players):
+        opponent_id = game_ctx.player_ids[1] if game_ctx.player_ids[0] == user_id else game_ctx.player_ids[0]
+        for snapshot_id in (user_id, opponent_id):
+            if snapshot_id in snapshots:
+                deliver(game_ctx, user_id, frames[snapshot_id],
+                        datagrams[snapshot_id], supersede=f"SNAPSHOT:{snapshot_id}")
     
     # Broadcast snapshots to watchers
-    watcher_writers = list(game_ctx.watchers.values())
-    for watcher in watcher_writers:
-        for snapshot in snapshots.values():
-            try:
-                await ut.send_message(watcher, snapshot)
-            except Exception as e:
-                logging.error(f"[Game] Failed to send snapshot to watcher: {e}")
+    for watch_id in list(game_ctx.watchers):
+        for snapshot_id in snapshots:
+            deliver(game_ctx, watch_id, frames[snapshot_id],
+                    datagrams[snapshot_id], supersede=f"SNAPSHOT:{snapshot_id}")
 
 
-async def end_game(game_ctx: GameServerContext) -> None:
+def end_game(game_ctx: GameServerContext) -> None:
     """Handle game end and determine winner"""
     results = []
     
@@ -622,6 +761,7 @@ async def end_game(game_ctx: GameServerContext) -> None:
         winner = max(results, key=lambda x: x['score'])
         game_ctx.winner = winner['userId']
         game_ctx.game_over_reason = 'both_topped_out'
+    game_ctx.results = results
     
     # Send end message
     end_msg = {
@@ -632,46 +772,320 @@ async def end_game(game_ctx: GameServerContext) -> None:
         'duration': game_ctx.game_end_time - game_ctx.game_start_time
     }
     
-    for user_id in game_ctx.players:
-        try:
-            await ut.send_message(game_ctx.players[user_id], end_msg)
-        except Exception as e:
-            logging.error(f"[Game] Failed to send END to {user_id}: {e}")
+    frame = ut.encode_message(end_msg)
+    for key in list(game_ctx.players) + list(game_ctx.watchers):
+        deliver(game_ctx, key, frame)
+    ut.log_sent(end_msg)
     
-    watcher_writers = list(game_ctx.watchers.values())
-    for watcher in watcher_writers:
-        try:
-            await ut.send_message(watcher, end_msg)
-        except Exception as e:
-            logging.error(f"[Game] Failed to send END to watcher: {e}")
-    
-    logging.info(f"[Game] Game ended. Winner: {game_ctx.winner}. Results: {results}")
+    logging.info(f"[Game] Game ended. Winner: {game_ctx.winner}. Results: {results}. "
+                 f"Slowest tick {game_ctx.max_tick_ms:.2f} ms")
 
 
-async def broadcast_tempo(game_ctx: GameServerContext) -> None:
+def broadcast_tempo(game_ctx: GameServerContext) -> None:
     """Notify players and watchers about gravity changes"""
     tempo_msg = {
         'type': 'TEMPO',
         'dropMs': game_ctx.gravity_interval,
         'ts': int(time.time() * 1000)
     }
-    for writer in list(game_ctx.players.values()):
+    datagram = stamp_datagram(game_ctx, tempo_msg)
+    frame = ut.encode_message(tempo_msg)
+    for key in list(game_ctx.players) + list(game_ctx.watchers):
+        deliver(game_ctx, key, frame, datagram, supersede='TEMPO')
+    ut.log_sent(tempo_msg)
+
+
+# ============================================================================
+# Datagram snapshot channel
+# ============================================================================
+#
+# SNAPSHOT/TEMPO are superseded every few ticks, so a lost TCP segment only
+# delays fresher state behind it. A client may ask for them over UDP instead:
+#   JOIN/WATCH {..., "udp": true}
+#   WELCOME    {..., "udp": {"port", "token"}}
+#   client -> server datagram {"type": "UDP_HELLO", "token"}   (repeated until acked)
+#   server -> client datagram {"type": "UDP_ACK"}
+# From the first HELLO on, that recipient gets SNAPSHOT/TEMPO as one JSON
+# datagram each, carrying a room-wide "seq"; receivers drop anything older than
+# what they already applied. JOIN/READY/INPUT/END stay on TCP.
+
+MAX_DATAGRAM_SIZE = 1200        # stay under a typical path MTU
+DATAGRAM_TYPES = ('SNAPSHOT', 'TEMPO')
+
+
+class SnapshotDatagramEndpoint(asyncio.DatagramProtocol):
+    """Server-side UDP socket shared by every room on one listener port"""
+
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.port: Optional[int] = None
+        self.tokens: Dict[str, Tuple[GameServerContext, str]] = {}
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        self.port = transport.get_extra_info('sockname')[1]
+
+    def datagram_received(self, data: bytes, addr) -> None:
         try:
-            await ut.send_message(writer, tempo_msg)
-        except Exception as e:
-            logging.error(f"[Game] Failed to send TEMPO to player: {e}")
-    for watcher in list(game_ctx.watchers.values()):
+            msg = json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return
+        if not isinstance(msg, dict) or msg.get('type') != 'UDP_HELLO':
+            return
+        entry = self.tokens.get(msg.get('token'))
+        if entry is None:
+            return
+        game_ctx, key = entry
+        if game_ctx.udp_peers.get(key) != addr:
+            logging.info(f"[Game] Room {game_ctx.room_id}: {key} receives snapshots over UDP at {addr}")
+        game_ctx.udp_peers[key] = addr
+        self.transport.sendto(b'{"type": "UDP_ACK"}', addr)
+
+    def error_received(self, exc: Exception) -> None:
+        logging.debug(f"[Game] UDP snapshot channel error: {exc}")
+
+    def offer(self, game_ctx: GameServerContext, key: str) -> dict:
+        """Issue the token a recipient uses to bind its UDP address"""
+        token = secrets.token_hex(8)
+        self.revoke(game_ctx, key)
+        self.tokens[token] = (game_ctx, key)
+        game_ctx.udp_tokens[key] = token
+        return {'port': self.port, 'token': token}
+
+    def revoke(self, game_ctx: GameServerContext, key: str) -> None:
+        token = game_ctx.udp_tokens.pop(key, None)
+        if token:
+            self.tokens.pop(token, None)
+        game_ctx.udp_peers.pop(key, None)
+
+    def revoke_room(self, game_ctx: GameServerContext) -> None:
+        for key in list(game_ctx.udp_tokens):
+            self.revoke(game_ctx, key)
+
+    def send(self, data: bytes, addr) -> bool:
+        if self.transport is None or self.transport.is_closing():
+            return False
+        self.transport.sendto(data, addr)
+        return True
+
+    def close(self) -> None:
+        if self.transport:
+            self.transport.close()
+        self.tokens.clear()
+
+
+async def open_datagram_endpoint(host: str, port: int) -> Optional[SnapshotDatagramEndpoint]:
+    """Bind the UDP snapshot channel next to a TCP listener; None keeps everything on TCP"""
+    if not config.GAME_UDP_SNAPSHOTS:
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        _, endpoint = await loop.create_datagram_endpoint(SnapshotDatagramEndpoint, local_addr=(host, port))
+    except OSError as e:
+        logging.warning(f"[Game] UDP snapshot channel unavailable on {host}:{port}: {e}")
+        return None
+    return endpoint
+
+
+def stamp_datagram(game_ctx: GameServerContext, msg: dict) -> Optional[bytes]:
+    """Number a SNAPSHOT/TEMPO and encode it once for every UDP recipient"""
+    game_ctx.datagram_seq += 1
+    msg['seq'] = game_ctx.datagram_seq
+    if game_ctx.udp is None or not game_ctx.udp_peers:
+        return None
+    data = json.dumps(msg).encode('utf-8')
+    return data if len(data) <= MAX_DATAGRAM_SIZE else None
+
+
+def send_datagram(game_ctx: GameServerContext, key: str, data: Optional[bytes]) -> bool:
+    """Send over UDP if the recipient bound an address; False means use TCP"""
+    if data is None:
+        return False
+    addr = game_ctx.udp_peers.get(key)
+    if addr is None:
+        return False
+    return game_ctx.udp.send(data, addr)
+
+
+class _DatagramReceiver(asyncio.DatagramProtocol):
+    def __init__(self, stream: 'GameMessageStream'):
+        self.stream = stream
+
+    def datagram_received(self, data: bytes, addr) -> None:
         try:
-            await ut.send_message(watcher, tempo_msg)
-        except Exception as e:
-            logging.error(f"[Game] Failed to send TEMPO to watcher: {e}")
+            msg = json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return
+        if isinstance(msg, dict):
+            self.stream.on_datagram(msg)
+
+    def error_received(self, exc: Exception) -> None:
+        logging.debug(f"[Game] UDP snapshot receive error: {exc}")
+
+
+class GameMessageStream:
+    """
+    Client side: game messages from the TCP connection merged with the optional
+    UDP snapshot channel. recv() returns decoded dicts, or None once TCP closes.
+    SNAPSHOT/TEMPO older than the last applied one (by seq) are dropped.
+    """
 
+    def __init__(self, reader: asyncio.StreamReader):
+        self.reader = reader
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.udp_acked = asyncio.Event()
+        self.last_seq: Dict[str, int] = {}
+        self.stale_dropped = 0
+        self.datagrams = 0
+        self._tcp_task = asyncio.create_task(self._read_tcp())
+        self._hello_task: Optional[asyncio.Task] = None
 
-async def run_game_server(room_id: str, player_ids: List[str], host: str = '0.0.0.0', port: int = None) -> Tuple[asyncio.Server, int, asyncio.Task, GameServerContext]:
-    """Run a game server instance for one room"""
+    async def _read_tcp(self) -> None:
+        try:
+            while True:
+                data = await ut.unpack_message(self.reader)
+                if not data:
+                    break
+                try:
+                    msg = json.loads(data)
+                except json.JSONDecodeError:
+                    logging.error(f"[Game] Failed to parse game message: {data}")
+                    continue
+                self._deliver(msg)
+        finally:
+            self.queue.put_nowait(None)
+
+    def _is_fresh(self, msg: dict) -> bool:
+        seq = msg.get('seq')
+        if seq is None:
+            return True
+        key = f"{msg.get('type')}:{msg.get('userId', '')}"
+        if seq <= self.last_seq.get(key, 0):
+            self.stale_dropped += 1
+            return False
+        self.last_seq[key] = seq
+        return True
+
+    def _deliver(self, msg: dict) -> None:
+        if msg.get('type') in DATAGRAM_TYPES and not self._is_fresh(msg):
+            return
+        self.queue.put_nowait(msg)
+
+    def on_datagram(self, msg: dict) -> None:
+        if msg.get('type') == 'UDP_ACK':
+            self.udp_acked.set()
+            return
+        if msg.get('type') in DATAGRAM_TYPES:
+            self.datagrams += 1
+            self._deliver(msg)
+
+    async def open_udp(self, host: str, udp_info: dict, attempts: int = 10, interval: float = 0.2) -> None:
+        """Bind the UDP channel offered in WELCOME; TCP keeps carrying snapshots until it works"""
+        loop = asyncio.get_running_loop()
+        try:
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramReceiver(self), remote_addr=(host, udp_info['port'])
+            )
+        except (OSError, KeyError) as e:
+            logging.warning(f"[Game] UDP snapshot channel unavailable: {e}")
+            return
+        hello = json.dumps({'type': 'UDP_HELLO', 'token': udp_info.get('token')}).encode('utf-8')
+
+        async def say_hello():
+            for _ in range(attempts):
+                if self.transport.is_closing():
+                    return
+                self.transport.sendto(hello)
+                try:
+                    await asyncio.wait_for(self.udp_acked.wait(), timeout=interval)
+                    logging.info("[Game] Receiving snapshots over UDP")
+                    return
+                except asyncio.TimeoutError:
+                    continue
+            logging.warning("[Game] No UDP_ACK from game server, staying on TCP")
+
+        self._hello_task = asyncio.create_task(say_hello())
+
+    async def recv(self) -> Optional[dict]:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        for task in (self._tcp_task, self._hello_task):
+            if task and not task.done():
+                task.cancel()
+        if self.transport:
+            self.transport.close()
+
+
+# ============================================================================
+# Room listeners
+# ============================================================================
+
+class GameRouter:
+    """
+    Single listener shared by every room on this host.
+    Connections are routed to a GameServerContext by the roomId in their JOIN/WATCH hello,
+    so the number of rooms is not bounded by GAME_PORT_RANGE.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[str, GameServerContext] = {}
+        self.server: Optional[asyncio.Server] = None
+        self.port: Optional[int] = None
+        self.udp: Optional[SnapshotDatagramEndpoint] = None
+
+    async def start(self, host: str, port: int) -> None:
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.udp = await open_datagram_endpoint(host, self.port)
+        logging.info(f"[Game] Room router listening on {host}:{self.port}")
+
+    def register(self, game_ctx: GameServerContext) -> None:
+        self.rooms[game_ctx.room_id] = game_ctx
+        game_ctx.udp = self.udp
+
+    def unregister(self, room_id: str) -> None:
+        game_ctx = self.rooms.pop(room_id, None)
+        if game_ctx and self.udp:
+            self.udp.revoke_room(game_ctx)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        addr = writer.get_extra_info('peername')
+        join_msg = await read_hello(reader, addr)
+        game_ctx = self.rooms.get(join_msg.get('roomId')) if join_msg else None
+        if game_ctx is None:
+            if join_msg is not None:
+                logging.warning(f"[Game] No room {join_msg.get('roomId')} for connection from {addr}")
+                await ut.send_message(writer, {'type': 'ERROR', 'message': 'Unknown room'})
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+            return
+        await handle_player_connection(reader, writer, game_ctx, join_msg)
+
+    async def close(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.udp:
+            self.udp.close()
+        self.rooms.clear()
+
+
+async def run_game_server(room_id: str, player_ids: List[str], host: str = '0.0.0.0', port: int = None,
+                          router: Optional[GameRouter] = None) -> Tuple[Optional[asyncio.Server], int, asyncio.Task, GameServerContext]:
+    """
+    Run a game server instance for one room.
+    With a router the room shares its listener and no per-room server is returned.
+    """
     
-    if port is None:
-        port = ut.get_game_port()
+    if port is None and router is None:
+        port = ut.get_game_port(room_id)
+        if port is None:
+            raise RuntimeError("No game ports available")
     
     # Create game context
     seed = random.randint(100000, 999999)
@@ -681,7 +1095,16 @@ async def run_game_server(room_id: str, player_ids: List[str], host: str = '0.0.
         await handle_player_connection(reader, writer, game_ctx)
     
     # Start server
-    server = await asyncio.start_server(handle_connection, host, port)
+    owns_udp = False
+    if router is not None:
+        router.register(game_ctx)
+        server = None
+        port = router.port
+    else:
+        server = await asyncio.start_server(handle_connection, host, port)
+        port = server.sockets[0].getsockname()[1]
+        game_ctx.udp = await open_datagram_endpoint(host, port)
+        owns_udp = True
     
     async def tick_runner():
         try:
@@ -689,6 +1112,9 @@ async def run_game_server(room_id: str, player_ids: List[str], host: str = '0.0.
             await game_tick_loop(game_ctx)
         except asyncio.CancelledError:
             pass
+        finally:
+            if owns_udp and game_ctx.udp:
+                game_ctx.udp.close()
     
     tick_task = asyncio.create_task(tick_runner())
     game_ctx.tick_task = tick_task
@@ -702,28 +1128,36 @@ async def run_game_server(room_id: str, player_ids: List[str], host: str = '0.0.
 # Integration with Lobby Server
 # ============================================================================
 
-async def start_game_server(room_id: str, host_bind: str = '0.0.0.0'):
+async def start_game_server(room_id: str, host_bind: str = '0.0.0.0', router: Optional[GameRouter] = None):
     """
     Called by lobby server to start a new game instance.
     Returns (server, port, tick_task, game_ctx) tuple or None on failure.
+    server is None when the room is attached to a shared router.
     """
+    port = None
     try:
-        port = ut.get_game_port()
+        if router is None:
+            port = ut.get_game_port(room_id)
+            if port is None:
+                logging.error(f"[Game] No game ports available for room {room_id}")
+                return None
         
         # Get player IDs (using room_id for now; could lookup from DB)
         player_ids = [f'P1_{room_id}', f'P2_{room_id}']
         
         # Create and return server with all necessary info
-        result = await run_game_server(room_id, player_ids, host_bind, port)
+        result = await run_game_server(room_id, player_ids, host_bind, port, router=router)
         
         if result:
             # Return all components so lobby can manage them
             return result
         else:
+            ut.release_game_port(port)
             return None
     
     except Exception as e:
         logging.error(f"[Game] Failed to start game server for room {room_id}: {e}")
+        ut.release_game_port(port)
         return None
 
 
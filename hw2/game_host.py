@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Game-host supervisor
+
+Runs Tetris rooms in a pool of worker processes instead of the lobby's event loop:
+- One worker per core, each with its own asyncio loop hosting many rooms
+- Rooms are assigned to the least-loaded worker
+- With config.GAME_ROUTING == "shared" each worker owns one GameRouter listener
+- Lobby <-> worker IPC over a multiprocessing Pipe carrying small dict messages
+
+    lobby -> worker   {"op": "CREATE", "room_id", "port"}
+                      {"op": "TEARDOWN", "room_id"}
+                      {"op": "SHUTDOWN"}
+    worker -> lobby   {"op": "CREATED", "room_id", "port"}
+                      {"op": "CREATE_FAILED", "room_id", "error"}
+                      {"op": "RESULT", "room_id", "winner", "reason", "results", "duration"}
+                      {"op": "WATCHER_JOINED", "room_id"}
+                      {"op": "WATCHER_LEFT", "room_id"}
+                      {"op": "CLOSED", "room_id"}
+"""
+
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+from typing import Callable, Dict, List, Optional
+
+import config
+import utils as ut
+import game
+
+
+# ============================================================================
+# Worker process
+# ============================================================================
+
+class _WorkerState:
+    """Rooms hosted by a single worker process"""
+
+    def __init__(self, conn, worker_id: int, host_bind: str):
+        self.conn = conn
+        self.worker_id = worker_id
+        self.host_bind = host_bind
+        self.rooms: Dict[str, dict] = {}
+        self.router: Optional[game.GameRouter] = None
+
+    async def start_router(self) -> None:
+        if config.GAME_ROUTING != 'shared':
+            return
+        self.router = game.GameRouter()
+        await self.router.start(self.host_bind, config.GAME_ROUTER_PORT + self.worker_id)
+
+    def reply(self, message: dict) -> None:
+        try:
+            self.conn.send(message)
+        except (BrokenPipeError, EOFError, OSError) as e:
+            logging.error(f"[GameHost {self.worker_id}] Lost lobby pipe: {e}")
+
+    async def create_room(self, room_id: str, port: int) -> None:
+        if room_id in self.rooms:
+            self.reply({'op': 'CREATED', 'room_id': room_id, 'port': self.rooms[room_id]['port']})
+            return
+        player_ids = [f'P1_{room_id}', f'P2_{room_id}']
+        if port is None and self.router is None:
+            # Shared routing, but this worker's router failed to start. Ports are leased
+            # only by the lobby, so let the OS pick one rather than lease from a private copy
+            port = 0
+        try:
+            server_obj, port, tick_task, game_ctx = await game.run_game_server(
+                room_id, player_ids, self.host_bind, port, router=self.router
+            )
+        except Exception as e:
+            logging.error(f"[GameHost {self.worker_id}] Failed to start room {room_id}: {e}")
+            self.reply({'op': 'CREATE_FAILED', 'room_id': room_id, 'error': str(e)})
+            return
+        game_ctx.on_watcher_joined = lambda: self.reply({'op': 'WATCHER_JOINED', 'room_id': room_id})
+        game_ctx.on_watcher_left = lambda: self.reply({'op': 'WATCHER_LEFT', 'room_id': room_id})
+
+        async def _serve():
+            if server_obj is None:
+                return
+            async with server_obj:
+                await server_obj.serve_forever()
+
+        self.rooms[room_id] = {
+            'server': server_obj,
+            'serve_task': asyncio.create_task(_serve()),
+            'tick_task': tick_task,
+            'result_task': asyncio.create_task(self.report_result(room_id, tick_task, game_ctx)),
+            'port': port,
+        }
+        self.reply({'op': 'CREATED', 'room_id': room_id, 'port': port})
+        logging.info(f"[GameHost {self.worker_id}] Hosting room {room_id} on port {port}")
+
+    async def report_result(self, room_id: str, tick_task: asyncio.Task,
+                            game_ctx: game.GameServerContext) -> None:
+        with contextlib.suppress(asyncio.CancelledError):
+            await tick_task
+        if game_ctx.winner is None:
+            return
+        self.reply({
+            'op': 'RESULT',
+            'room_id': room_id,
+            'winner': game_ctx.winner,
+            'reason': game_ctx.game_over_reason,
+            'results': game_ctx.results,
+            'duration': game_ctx.game_end_time - game_ctx.game_start_time
+        })
+
+    async def teardown_room(self, room_id: str) -> None:
+        info = self.rooms.pop(room_id, None)
+        if info:
+            if info['server'] is not None:
+                info['server'].close()
+            if self.router:
+                self.router.unregister(room_id)
+            for key in ('serve_task', 'tick_task', 'result_task'):
+                task = info[key]
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+            logging.info(f"[GameHost {self.worker_id}] Closed room {room_id}")
+        self.reply({'op': 'CLOSED', 'room_id': room_id})
+
+
+async def _worker_loop(conn, worker_id: int, host_bind: str) -> None:
+    state = _WorkerState(conn, worker_id, host_bind)
+    loop = asyncio.get_running_loop()
+    commands: asyncio.Queue = asyncio.Queue()
+
+    def on_readable():
+        try:
+            commands.put_nowait(conn.recv())
+        except (EOFError, OSError):
+            loop.remove_reader(conn.fileno())
+            commands.put_nowait({'op': 'SHUTDOWN'})
+
+    loop.add_reader(conn.fileno(), on_readable)
+    try:
+        await state.start_router()
+    except OSError as e:
+        logging.error(f"[GameHost {worker_id}] Router unavailable, falling back to per-room ports: {e}")
+    logging.info(f"[GameHost {worker_id}] Worker started (pid {os.getpid()})")
+
+    while True:
+        command = await commands.get()
+        op = command.get('op')
+        if op == 'CREATE':
+            await state.create_room(command['room_id'], command.get('port'))
+        elif op == 'TEARDOWN':
+            await state.teardown_room(command['room_id'])
+        elif op == 'SHUTDOWN':
+            break
+
+    for room_id in list(state.rooms):
+        await state.teardown_room(room_id)
+    if state.router:
+        await state.router.close()
+    with contextlib.suppress(Exception):
+        loop.remove_reader(conn.fileno())
+    logging.info(f"[GameHost {worker_id}] Worker stopped")
+
+
+def _worker_main(conn, worker_id: int, host_bind: str) -> None:
+    """Entry point of a worker process"""
+    ut.init_logging()
+    try:
+        asyncio.run(_worker_loop(conn, worker_id, host_bind))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+
+# ============================================================================
+# Lobby-side supervisor
+# ============================================================================
+
+class _WorkerHandle:
+    """Lobby's view of one worker process"""
+
+    def __init__(self, worker_id: int, process, conn):
+        self.worker_id = worker_id
+        self.process = process
+        self.conn = conn
+        self.rooms: set = set()
+        self.alive = True
+
+
+class GameHostSupervisor:
+    """Spawns game worker processes and assigns rooms to the least-loaded one"""
+
+    def __init__(self, num_workers: Optional[int] = None, host_bind: str = '0.0.0.0',
+                 on_result: Optional[Callable[[str, dict], None]] = None,
+                 on_watcher_joined: Optional[Callable[[str], None]] = None,
+                 on_watcher_left: Optional[Callable[[str], None]] = None):
+        self.num_workers = max(1, num_workers or os.cpu_count() or 1)
+        self.host_bind = host_bind
+        self.on_result = on_result
+        self.on_watcher_joined = on_watcher_joined
+        self.on_watcher_left = on_watcher_left
+        self.workers: List[_WorkerHandle] = []
+        self.room_workers: Dict[str, _WorkerHandle] = {}
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        self._ctx = multiprocessing.get_context('spawn')
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        for worker_id in range(self.num_workers):
+            parent_conn, child_conn = self._ctx.Pipe()
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(child_conn, worker_id, self.host_bind),
+                name=f"game-host-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            handle = _WorkerHandle(worker_id, process, parent_conn)
+            loop.add_reader(parent_conn.fileno(), self._on_worker_message, handle)
+            self.workers.append(handle)
+        logging.info(f"[Lobby] Started {self.num_workers} game host workers")
+
+    def least_loaded(self) -> Optional[_WorkerHandle]:
+        alive = [w for w in self.workers if w.alive]
+        if not alive:
+            return None
+        return min(alive, key=lambda w: len(w.rooms))
+
+    def _expect(self, op: str, room_id: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[(op, room_id)] = future
+        return future
+
+    def _resolve(self, op: str, room_id: str, message: dict) -> None:
+        future = self._pending.pop((op, room_id), None)
+        if future and not future.done():
+            future.set_result(message)
+
+    def _on_worker_message(self, handle: _WorkerHandle) -> None:
+        try:
+            message = handle.conn.recv()
+        except (EOFError, OSError):
+            self._mark_dead(handle)
+            return
+
+        op = message.get('op')
+        room_id = message.get('room_id')
+        if op in ('CREATED', 'CREATE_FAILED'):
+            if op == 'CREATE_FAILED':
+                handle.rooms.discard(room_id)
+                self.room_workers.pop(room_id, None)
+            self._resolve('CREATE', room_id, message)
+        elif op == 'CLOSED':
+            self._resolve('TEARDOWN', room_id, message)
+        elif op == 'RESULT':
+            logging.info(f"[Lobby] Room {room_id} finished on worker {handle.worker_id}: "
+                         f"winner {message.get('winner')} ({message.get('reason')})")
+            if self.on_result:
+                try:
+                    self.on_result(room_id, message)
+                except Exception as e:
+                    logging.error(f"[Lobby] Result handler failed for room {room_id}: {e}")
+        elif op == 'WATCHER_JOINED':
+            if self.on_watcher_joined:
+                self.on_watcher_joined(room_id)
+        elif op == 'WATCHER_LEFT':
+            if self.on_watcher_left:
+                self.on_watcher_left(room_id)
+
+    def _mark_dead(self, handle: _WorkerHandle) -> None:
+        if not handle.alive:
+            return
+        handle.alive = False
+        with contextlib.suppress(Exception):
+            asyncio.get_running_loop().remove_reader(handle.conn.fileno())
+        logging.error(f"[Lobby] Game host worker {handle.worker_id} exited, "
+                      f"dropping rooms {sorted(handle.rooms)}")
+        for room_id in list(handle.rooms):
+            self.room_workers.pop(room_id, None)
+            for op in ('CREATE', 'TEARDOWN'):
+                self._resolve(op, room_id, {'op': 'CREATE_FAILED', 'room_id': room_id,
+                                            'error': 'worker exited'})
+        handle.rooms.clear()
+
+    async def create_room(self, room_id: str, port: Optional[int], timeout: float = 10) -> Optional[int]:
+        """Start a room on the least-loaded worker, returning its port or None"""
+        handle = self.room_workers.get(room_id)
+        if handle is None:
+            handle = self.least_loaded()
+            if handle is None:
+                logging.error(f"[Lobby] No game host workers available for room {room_id}")
+                return None
+            handle.rooms.add(room_id)
+            self.room_workers[room_id] = handle
+
+        future = self._expect('CREATE', room_id)
+        handle.conn.send({'op': 'CREATE', 'room_id': room_id, 'port': port})
+        try:
+            reply = await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"[Lobby] Worker {handle.worker_id} timed out creating room {room_id}")
+            self._pending.pop(('CREATE', room_id), None)
+            self._abandon_room(handle, room_id)
+            return None
+        if reply.get('op') != 'CREATED':
+            logging.error(f"[Lobby] Worker {handle.worker_id} failed room {room_id}: {reply.get('error')}")
+            self._abandon_room(handle, room_id)
+            return None
+        return reply.get('port')
+
+    def _abandon_room(self, handle: _WorkerHandle, room_id: str) -> None:
+        """Forget a room that failed to start; the worker tears down anything it started late"""
+        handle.rooms.discard(room_id)
+        if self.room_workers.get(room_id) is handle:
+            del self.room_workers[room_id]
+        if handle.alive:
+            with contextlib.suppress(Exception):
+                handle.conn.send({'op': 'TEARDOWN', 'room_id': room_id})
+
+    async def teardown_room(self, room_id: str, timeout: float = 5) -> None:
+        handle = self.room_workers.pop(room_id, None)
+        if handle is None:
+            return
+        handle.rooms.discard(room_id)
+        if not handle.alive:
+            return
+        future = self._expect('TEARDOWN', room_id)
+        handle.conn.send({'op': 'TEARDOWN', 'room_id': room_id})
+        try:
+            await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(('TEARDOWN', room_id), None)
+            logging.error(f"[Lobby] Worker {handle.worker_id} timed out closing room {room_id}")
+
+    def worker_for(self, room_id: str) -> Optional[int]:
+        handle = self.room_workers.get(room_id)
+        return handle.worker_id if handle else None
+
+    async def stop(self) -> None:
+        loop = asyncio.get_running_loop()
+        for handle in self.workers:
+            if handle.alive:
+                with contextlib.suppress(Exception):
+                    loop.remove_reader(handle.conn.fileno())
+                with contextlib.suppress(Exception):
+                    handle.conn.send({'op': 'SHUTDOWN'})
+        for handle in self.workers:
+            await loop.run_in_executor(None, handle.process.join, 5)
+            if handle.process.is_alive():
+                handle.process.terminate()
+            handle.conn.close()
+        self.workers.clear()
+        self.room_workers.clear()
+        logging.info("[Lobby] Game host workers stopped")
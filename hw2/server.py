@@ -6,6 +6,12 @@ import utils as ut
 import config
 from config import tetris_server
 import game
+import game_host
+import spectator_relay
+
+game_host_supervisor = None
+game_router = None
+relay_lock = asyncio.Lock()
 
 
 async def handle_client(reader, writer):
@@ -151,7 +157,7 @@ async def process_client_message(message, username, client_reader, client_writer
 
         elif command == "GAME_OVER":
             if username:
-                await handle_game_over(username)
+                await handle_game_over(username, db_writer)
             else:
                 await ut.send_message(client_writer, ut.build_response("lobby", "error", "Not logged in"))
         
@@ -430,12 +436,35 @@ async def launch_game_instance(room_id):
     async with tetris_server.game_servers_lock:
         if room_id in tetris_server.game_servers:
             return tetris_server.game_servers[room_id]["port"]
-    result = await game.start_game_server(room_id, host_bind="0.0.0.0")
+    if game_host_supervisor:
+        requested_port = None
+        if config.GAME_ROUTING == "per_room":
+            requested_port = ut.get_game_port(room_id)
+            if requested_port is None:
+                logging.error(f"[Lobby] No game ports available for room {room_id}")
+                return None
+        port = await game_host_supervisor.create_room(room_id, requested_port)
+        if not port:
+            ut.release_game_port(requested_port)
+            return None
+        async with tetris_server.game_servers_lock:
+            tetris_server.game_servers[room_id] = {
+                "port": port,
+                "worker": game_host_supervisor.worker_for(room_id)
+            }
+        logging.info(f"[Lobby] Room {room_id} hosted by worker {game_host_supervisor.worker_for(room_id)} on port {port}")
+        return port
+
+    result = await game.start_game_server(room_id, host_bind="0.0.0.0", router=game_router)
     if not result:
         return None
     server_obj, port, tick_task, game_ctx = result
+    game_ctx.on_watcher_joined = lambda: direct_watcher_joined(room_id)
+    game_ctx.on_watcher_left = lambda: direct_watcher_left(room_id)
 
     async def _run():
+        if server_obj is None:
+            return
         async with server_obj:
             await server_obj.serve_forever()
 
@@ -457,11 +486,22 @@ async def stop_game_instance(room_id):
         info = tetris_server.game_servers.pop(room_id, None)
     if not info:
         return
+    if info.get("relay"):
+        await info["relay"].close()
+    # Per-room and relay ports are leased under the room ID; routed rooms hold none
+    config.game_ports.release_owner(room_id)
+    if "worker" in info:
+        await game_host_supervisor.teardown_room(room_id)
+        logging.info(f"[Lobby] Stopped game server for room {room_id}")
+        return
     server_obj = info["server"]
     task = info["task"]
     tick_task = info.get("tick_task")
-    server_obj.close()
-    await server_obj.wait_closed()
+    if server_obj is None:
+        game_router.unregister(room_id)
+    else:
+        server_obj.close()
+        await server_obj.wait_closed()
     task.cancel()
     with contextlib.suppress(asyncio.CancelledError):
         await task
@@ -471,6 +511,16 @@ async def stop_game_instance(room_id):
             await tick_task
     logging.info(f"[Lobby] Stopped game server for room {room_id}")
 
+
+def record_game_result(room_id, result):
+    room = tetris_server.rooms.get(room_id)
+    if room is not None:
+        room["game_results"] = {
+            "winner": result.get("winner"),
+            "reason": result.get("reason"),
+            "results": result.get("results", [])
+        }
+
 async def handle_decline_invite(params, username, writer, db_writer):
     if len(params) != 2:
         await ut.send_message(writer, ut.build_response("lobby", "error", "Invalid DECLINE_INVITE command"))
@@ -511,16 +561,62 @@ async def handle_watch_room(params, username, writer):
     if not server_entry:
         await ut.send_message(writer, ut.build_response("lobby", "error", "No active game found for this room"))
         return
+    port = server_entry["port"]
+    relay = None
+    # "watchers" counts connected direct watchers only: the game server reports each one
+    # joining and leaving, so watch_info handed out but never used holds no slot
+    if server_entry.get("watchers", 0) >= config.MAX_DIRECT_WATCHERS:
+        relay = await ensure_spectator_relay(room_id, server_entry)
+    if relay:
+        port = relay.port
     message = {
         "status": "watch_info",
         "room_id": room_id,
         "game_host": config.GAME_HOST,
-        "game_port": server_entry["port"]
+        "game_port": port
     }
     await ut.send_message(writer, message)
 
 
-async def handle_game_over(username):
+def direct_watcher_joined(room_id):
+    server_entry = tetris_server.game_servers.get(room_id)
+    if server_entry:
+        server_entry["watchers"] = server_entry.get("watchers", 0) + 1
+
+
+def direct_watcher_left(room_id):
+    server_entry = tetris_server.game_servers.get(room_id)
+    if server_entry and server_entry.get("watchers", 0) > 0:
+        server_entry["watchers"] -= 1
+
+
+async def ensure_spectator_relay(room_id, server_entry):
+    """One relay per watched room takes over fan-out once direct watchers hit the limit"""
+    async with relay_lock:
+        relay = server_entry.get("relay")
+        if relay and not relay.done.is_set():
+            return relay
+        return await start_spectator_relay(room_id, server_entry)
+
+
+async def start_spectator_relay(room_id, server_entry):
+    relay_port = ut.get_game_port(room_id)
+    if relay_port is None:
+        logging.error(f"[Lobby] No port for spectator relay of room {room_id}")
+        return None
+    # The relay runs in its own process so spectator fan-out never competes with the lobby loop
+    relay = spectator_relay.RelayProcess(room_id, "127.0.0.1", server_entry["port"], delay=config.SPECTATOR_DELAY)
+    try:
+        await relay.start("0.0.0.0", relay_port)
+    except (OSError, ConnectionError) as e:
+        logging.error(f"[Lobby] Failed to start spectator relay for room {room_id}: {e}")
+        ut.release_game_port(relay_port)
+        return None
+    server_entry["relay"] = relay
+    return relay
+
+
+async def handle_game_over(username, db_writer):
     async with tetris_server.online_users_lock:
         if username in tetris_server.online_users:
             tetris_server.online_users[username]["status"] = "idle"
@@ -540,6 +636,9 @@ async def handle_game_over(username):
                 break
         if room_to_delete:
             del tetris_server.rooms[room_to_delete]
+    if room_to_delete:
+        # Room IDs are leased by the DB; it frees this one along with its copy of the room
+        await ut.send_command("lobby", db_writer, "DELETE_ROOM", [room_to_delete])
     if target_room:
         await stop_game_instance(target_room)
 
@@ -572,7 +671,21 @@ async def handle_game_over(username):
 
 
 async def main():
+    global game_host_supervisor, game_router
     ut.init_logging()
+
+    if config.USE_GAME_WORKERS:
+        game_host_supervisor = game_host.GameHostSupervisor(
+            config.GAME_WORKERS,
+            host_bind="0.0.0.0",
+            on_result=record_game_result,
+            on_watcher_joined=direct_watcher_joined,
+            on_watcher_left=direct_watcher_left
+        )
+        await game_host_supervisor.start()
+    elif config.GAME_ROUTING == "shared":
+        game_router = game.GameRouter()
+        await game_router.start("0.0.0.0", config.GAME_ROUTER_PORT)
     
     server_ = await asyncio.start_server(handle_client, config.HOST, config.PORT)
     addr = server_.sockets[0].getsockname()
@@ -587,6 +700,13 @@ async def main():
         finally:
             server_.close()
             await server_.wait_closed()
+            for info in list(tetris_server.game_servers.values()):
+                if info.get("relay"):
+                    await info["relay"].close()
+            if game_host_supervisor:
+                await game_host_supervisor.stop()
+            if game_router:
+                await game_router.close()
             logging.info("[Lobby] Server is closed.")
 
 if __name__ == "__main__":
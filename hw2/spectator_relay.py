@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Spectator relay
+
+Takes watcher fan-out off the game host:
+- Subscribes once to a room as a WATCH client (upstream may be a game server or another relay)
+- Re-broadcasts the upstream frames byte-for-byte to its own watchers, through per-watcher Outboxes
+- Late joiners get the cached WELCOME plus the latest snapshot of each player and TEMPO
+- Optional broadcast delay: frames are held for `delay` seconds before anyone sees them
+- Speaks the same WATCH/WELCOME/SNAPSHOT/TEMPO/END protocol downstream, so relays chain
+  (game server -> relay -> relay -> ... -> thousands of watchers)
+
+The lobby runs each relay as a sidecar process through RelayProcess, so fan-out to
+spectators never shares the lobby's event loop.
+
+Usage:
+    python spectator_relay.py <room_id> <upstream_host> <upstream_port> [--port N] [--delay S]
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+import time
+from typing import Deque, Dict, Optional, Tuple
+
+import config
+import utils as ut
+import game
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Tuple[bytes, dict]]:
+    """Read one length-prefixed frame, returning the raw bytes and the decoded body"""
+    try:
+        header = await reader.readexactly(4)
+        (length,) = struct.unpack('!I', header)
+        if length > config.MAX_MSG_SIZE:
+            logging.warning(f"[Relay] Oversized upstream frame ({length} bytes)")
+            return None
+        body = await reader.readexactly(length)
+        return header + body, json.loads(body)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    except json.JSONDecodeError as e:
+        logging.error(f"[Relay] Bad upstream frame: {e}")
+        return None
+
+
+class SpectatorRelay:
+    """Fans one upstream WATCH subscription out to many watchers"""
+
+    def __init__(self, room_id: str, upstream_host: str, upstream_port: int, delay: float = 0.0,
+                 name: Optional[str] = None):
+        self.room_id = room_id
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.delay = delay
+        self.name = name or f"relay-{room_id}"
+
+        self.server: Optional[asyncio.Server] = None
+        self.port: Optional[int] = None
+        self.upstream_writer: Optional[asyncio.StreamWriter] = None
+        self.welcome_frame: Optional[bytes] = None
+        self.latest: Dict[str, bytes] = {}            # supersede key -> last published frame
+        self.end_frame: Optional[bytes] = None
+        self.delayed: Deque[Tuple[float, str, bytes]] = collections.deque()
+        self.delay_ready = asyncio.Event()
+        self.watchers: Dict[int, game.Outbox] = {}
+        self.next_watcher_id = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        self.done = asyncio.Event()
+        self._tasks = []
+
+    # ------------------------------------------------------------------
+    # Upstream
+    # ------------------------------------------------------------------
+
+    async def start(self, host: str = '0.0.0.0', port: int = 0) -> None:
+        """Subscribe upstream, then accept watchers on host:port"""
+        reader, self.upstream_writer = await asyncio.open_connection(self.upstream_host, self.upstream_port)
+        await ut.send_message(self.upstream_writer, {
+            'type': 'WATCH',
+            'username': self.name,
+            'roomId': self.room_id,
+            'relay': True
+        })
+        first = await read_frame(reader)
+        if first is None or first[1].get('type') != 'WELCOME':
+            self.upstream_writer.close()
+            raise ConnectionError(f"No WELCOME from upstream {self.upstream_host}:{self.upstream_port}")
+        self.welcome_frame = first[0]
+
+        self.server = await asyncio.start_server(self.handle_watcher, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._tasks.append(asyncio.create_task(self._read_upstream(reader)))
+        if self.delay > 0:
+            self._tasks.append(asyncio.create_task(self._release_delayed()))
+        logging.info(f"[Relay] {self.name} relaying room {self.room_id} from "
+                     f"{self.upstream_host}:{self.upstream_port} on port {self.port} (delay {self.delay}s)")
+
+    async def _read_upstream(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                result = await read_frame(reader)
+                if result is None:
+                    break
+                frame, msg = result
+                self.frames_in += 1
+                msg_type = msg.get('type')
+                if msg_type == 'SNAPSHOT':
+                    key = f"SNAPSHOT:{msg.get('userId')}"
+                elif msg_type in ('TEMPO', 'END'):
+                    key = msg_type
+                else:
+                    continue
+                if self.delay > 0:
+                    self.delayed.append((time.monotonic() + self.delay, key, frame))
+                    self.delay_ready.set()
+                else:
+                    self.publish(key, frame)
+                if msg_type == 'END':
+                    break
+        finally:
+            logging.info(f"[Relay] {self.name} upstream finished")
+            if self.delay > 0:
+                self.delayed.append((time.monotonic() + self.delay, 'CLOSE', b''))
+                self.delay_ready.set()
+            else:
+                asyncio.create_task(self.close())
+
+    async def _release_delayed(self) -> None:
+        while True:
+            if not self.delayed:
+                self.delay_ready.clear()
+                await self.delay_ready.wait()
+                continue
+            release_at, key, frame = self.delayed[0]
+            wait = release_at - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.delayed.popleft()
+            if key == 'CLOSE':
+                asyncio.create_task(self.close())
+                return
+            self.publish(key, frame)
+
+    # ------------------------------------------------------------------
+    # Downstream
+    # ------------------------------------------------------------------
+
+    def publish(self, key: str, frame: bytes) -> None:
+        """Hand one encoded frame to every watcher and remember it for late joiners"""
+        if key == 'END':
+            self.end_frame = frame
+        else:
+            self.latest[key] = frame
+        supersede = None if key == 'END' else key
+        for outbox in list(self.watchers.values()):
+            if outbox.put(frame, supersede):
+                self.frames_out += 1
+
+    async def handle_watcher(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        addr = writer.get_extra_info('peername')
+        hello = await game.read_hello(reader, addr)
+        if hello is None:
+            writer.close()
+            return
+        if hello.get('type') != 'WATCH' or hello.get('roomId', self.room_id) != self.room_id:
+            await ut.send_message(writer, {'type': 'ERROR', 'message': 'Relay only accepts WATCH for this room'})
+            writer.close()
+            return
+
+        watcher_id = self.next_watcher_id
+        self.next_watcher_id += 1
+        outbox = game.Outbox(writer, f"{self.name}/{hello.get('username', 'watcher')}")
+        self.watchers[watcher_id] = outbox
+        outbox.put(self.welcome_frame)
+        for key, frame in self.latest.items():
+            outbox.put(frame, key)
+        if self.end_frame:
+            outbox.put(self.end_frame)
+        logging.info(f"[Relay] {self.name} watcher {hello.get('username')} joined from {addr} "
+                     f"({len(self.watchers)} watching)")
+        try:
+            # Watchers only ever send their hello; wait for them to leave
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.watchers.pop(watcher_id, None)
+            await outbox.close()
+            writer.close()
+
+    def stats(self) -> dict:
+        return {
+            'room_id': self.room_id,
+            'watchers': len(self.watchers),
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+            'dropped': sum(outbox.dropped for outbox in self.watchers.values()),
+            'delay': self.delay
+        }
+
+    async def close(self) -> None:
+        if self.done.is_set():
+            return
+        self.done.set()
+        if self.server:
+            self.server.close()
+        for task in self._tasks:
+            if task is not asyncio.current_task():
+                task.cancel()
+        if self.upstream_writer:
+            self.upstream_writer.close()
+        outboxes = list(self.watchers.values())
+        self.watchers.clear()
+        await asyncio.gather(*(outbox.close() for outbox in outboxes), return_exceptions=True)
+        for outbox in outboxes:
+            outbox.writer.close()
+        logging.info(f"[Relay] {self.name} closed ({self.frames_in} frames in, {self.frames_out} out)")
+
+
+class RelayProcess:
+    """Runs a SpectatorRelay in a child process; exposes the same port / done / close() as the relay"""
+
+    def __init__(self, room_id: str, upstream_host: str, upstream_port: int, delay: float = 0.0):
+        self.room_id = room_id
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.delay = delay
+        self.port: Optional[int] = None
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.done = asyncio.Event()
+        self._waiter: Optional[asyncio.Task] = None
+
+    async def start(self, host: str = '0.0.0.0', port: int = 0, timeout: float = 10) -> None:
+        """Spawn the relay and wait for it to report the port it listens on"""
+        script = os.path.abspath(__file__)
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, script, self.room_id, self.upstream_host, str(self.upstream_port),
+            '--host', host, '--port', str(port), '--delay', str(self.delay),
+            stdout=asyncio.subprocess.PIPE,
+            cwd=os.path.dirname(script)
+        )
+        try:
+            line = await asyncio.wait_for(self.process.stdout.readline(), timeout=timeout)
+        except asyncio.TimeoutError:
+            line = b''
+        if not line.startswith(b'Relaying'):
+            await self.close()
+            raise ConnectionError(f"Spectator relay for room {self.room_id} did not start")
+        self.port = int(line.split()[-1])
+        self._waiter = asyncio.create_task(self._wait())
+
+    async def _wait(self) -> None:
+        await self.process.wait()
+        self.done.set()
+
+    async def close(self, timeout: float = 5) -> None:
+        self.done.set()
+        if self.process is None or self.process.returncode is not None:
+            return
+        with contextlib.suppress(ProcessLookupError):
+            self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            with contextlib.suppress(ProcessLookupError):
+                self.process.kill()
+            await self.process.wait()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Relay a room's spectator stream")
+    parser.add_argument('room_id')
+    parser.add_argument('upstream_host')
+    parser.add_argument('upstream_port', type=int)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--delay', type=float, default=config.SPECTATOR_DELAY)
+    args = parser.parse_args()
+
+    ut.init_logging()
+    relay = SpectatorRelay(args.room_id, args.upstream_host, args.upstream_port, delay=args.delay)
+    await relay.start(args.host, args.port)
+    # RelayProcess waits for this line
+    print(f"Relaying room {args.room_id} on port {relay.port}", flush=True)
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    waiters = [asyncio.create_task(relay.done.wait()), asyncio.create_task(stop.wait())]
+    with contextlib.suppress(asyncio.CancelledError):
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    for waiter in waiters:
+        waiter.cancel()
+    await relay.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
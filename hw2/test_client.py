@@ -28,10 +28,11 @@ logging.basicConfig(
 MAX_MSG_SIZE = 65536
 
 class TestGameClient:
-    def __init__(self, username, server_ip, server_port):
+    def __init__(self, username, server_ip, server_port, room_id=None):
         self.username = username
         self.server_ip = server_ip
         self.server_port = server_port
+        self.room_id = room_id
         self.reader = None
         self.writer = None
         self.game_active = False
@@ -101,7 +102,8 @@ class TestGameClient:
         # Send JOIN
         join_msg = {
             "type": "JOIN",
-            "username": self.username
+            "username": self.username,
+            "roomId": self.room_id
         }
         logging.info(f"Sending JOIN message for user: {self.username}")
         await self.send_message(join_msg)
@@ -333,13 +335,14 @@ async def main():
     """Main entry point"""
     # Parse command line arguments
     if len(sys.argv) < 1:
-        print("Usage: python test_game_client.py <username> <server_ip> <server_port> [mode]")
+        print("Usage: python test_game_client.py <username> <server_ip> <server_port> [mode] [room_id]")
         print()
         print("Arguments:")
         print("  username    - Your player name")
         print("  server_ip   - Game server IP (e.g., localhost)")
         print("  server_port - Game server port (e.g., 64050)")
         print("  mode        - 'auto' for auto-play or 'manual' for interactive (default: auto)")
+        print("  room_id     - Room to join when the server routes rooms on a shared port")
         print()
         print("Examples:")
         print("  python test_game_client.py Alice localhost 64050")
@@ -350,6 +353,7 @@ async def main():
     server_ip = config.HOST
     server_port = 52274
     mode = sys.argv[4] if len(sys.argv) > 4 else "auto"
+    room_id = sys.argv[5] if len(sys.argv) > 5 else None
     
     if mode not in ["auto", "manual"]:
         print(f"Invalid mode: {mode}. Use 'auto' or 'manual'")
@@ -363,7 +367,7 @@ async def main():
     print(f"Mode: {mode.upper()}")
     print("="*60 + "\n")
     
-    client = TestGameClient(username, server_ip, server_port)
+    client = TestGameClient(username, server_ip, server_port, room_id)
     
     try:
         await client.run(mode)
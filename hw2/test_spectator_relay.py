@@ -0,0 +1,184 @@
+import asyncio
+import contextlib
+import time
+import unittest
+
+import game
+import spectator_relay
+import utils as ut
+
+
+ROOM = '123456'
+
+
+class FakeRoom:
+    """Stands in for a game server: answers one WATCH with WELCOME, then sends what the test publishes"""
+
+    def __init__(self):
+        self.server = None
+        self.port = None
+        self.hellos = []
+        self.subscribers = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        hello = await game.read_hello(reader, None)
+        self.hellos.append(hello)
+        writer.write(ut.encode_message({'type': 'WELCOME', 'role': 'WATCHER', 'roomId': ROOM, 'seed': 7}))
+        await writer.drain()
+        self.subscribers.append(writer)
+        with contextlib.suppress(ConnectionError):
+            while await reader.read(1024):
+                pass
+
+    async def publish(self, message):
+        for writer in self.subscribers:
+            writer.write(ut.encode_message(message))
+            await writer.drain()
+
+    async def end(self):
+        await self.publish({'type': 'END', 'winner': 'P1'})
+        for writer in self.subscribers:
+            writer.close()
+
+    async def close(self):
+        for writer in self.subscribers:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def watch(port, username='viewer'):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    await ut.send_message(writer, {'type': 'WATCH', 'username': username, 'roomId': ROOM})
+    return reader, writer
+
+
+async def next_message(reader, timeout=2):
+    result = await asyncio.wait_for(spectator_relay.read_frame(reader), timeout)
+    return result[1] if result else None
+
+
+async def wait_for(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+class SpectatorRelayTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.room = FakeRoom()
+        await self.room.start()
+        self.relays = []
+        self.writers = []
+
+    async def asyncTearDown(self):
+        for writer in self.writers:
+            writer.close()
+        for relay in self.relays:
+            await relay.close()
+        await self.room.close()
+
+    async def start_relay(self, upstream_port, delay=0.0):
+        relay = spectator_relay.SpectatorRelay(ROOM, '127.0.0.1', upstream_port, delay=delay)
+        await relay.start('127.0.0.1', 0)
+        self.relays.append(relay)
+        return relay
+
+    async def start_watcher(self, port):
+        reader, writer = await watch(port)
+        self.writers.append(writer)
+        return reader
+
+    async def test_late_joiner_gets_welcome_and_latest_frames(self):
+        relay = await self.start_relay(self.room.port)
+        self.assertTrue(self.room.hellos[0]['relay'])
+        await self.room.publish({'type': 'SNAPSHOT', 'userId': 'P1', 'score': 1})
+        await self.room.publish({'type': 'SNAPSHOT', 'userId': 'P2', 'score': 5})
+        await self.room.publish({'type': 'SNAPSHOT', 'userId': 'P1', 'score': 2})
+        await self.room.publish({'type': 'TEMPO', 'level': 3})
+        await wait_for(lambda: relay.frames_in == 4)
+
+        reader = await self.start_watcher(relay.port)
+        welcome = await next_message(reader)
+        self.assertEqual((welcome['type'], welcome['seed']), ('WELCOME', 7))
+        replay = [await next_message(reader) for _ in range(3)]
+        self.assertEqual(replay, [
+            {'type': 'SNAPSHOT', 'userId': 'P1', 'score': 2},
+            {'type': 'SNAPSHOT', 'userId': 'P2', 'score': 5},
+            {'type': 'TEMPO', 'level': 3},
+        ])
+
+        await self.room.publish({'type': 'SNAPSHOT', 'userId': 'P2', 'score': 6})
+        self.assertEqual(await next_message(reader), {'type': 'SNAPSHOT', 'userId': 'P2', 'score': 6})
+        self.assertEqual(relay.stats()['watchers'], 1)
+
+    async def test_delay_holds_frames_back(self):
+        relay = await self.start_relay(self.room.port, delay=0.3)
+        reader = await self.start_watcher(relay.port)
+        self.assertEqual((await next_message(reader))['type'], 'WELCOME')
+        await wait_for(lambda: relay.watchers)
+
+        sent_at = time.monotonic()
+        await self.room.publish({'type': 'SNAPSHOT', 'userId': 'P1', 'score': 1})
+        with self.assertRaises(asyncio.TimeoutError):
+            await next_message(reader, timeout=0.15)
+        self.assertEqual(relay.frames_in, 1)
+        self.assertEqual(relay.latest, {})
+        self.assertEqual(await next_message(reader), {'type': 'SNAPSHOT', 'userId': 'P1', 'score': 1})
+        self.assertGreaterEqual(time.monotonic() - sent_at, 0.3)
+
+    async def test_relay_chains_off_another_relay(self):
+        first = await self.start_relay(self.room.port)
+        second = await self.start_relay(first.port)
+        self.assertEqual(first.stats()['watchers'], 1)
+        self.assertEqual(len(self.room.subscribers), 1)
+
+        reader = await self.start_watcher(second.port)
+        self.assertEqual((await next_message(reader))['roomId'], ROOM)
+        await wait_for(lambda: second.watchers)
+        await self.room.publish({'type': 'TEMPO', 'level': 4})
+        self.assertEqual(await next_message(reader), {'type': 'TEMPO', 'level': 4})
+        self.assertEqual(second.frames_in, 1)
+
+    async def test_end_frame_is_passed_on_and_closes_the_relay(self):
+        relay = await self.start_relay(self.room.port)
+        reader = await self.start_watcher(relay.port)
+        self.assertEqual((await next_message(reader))['type'], 'WELCOME')
+        await wait_for(lambda: relay.watchers)
+
+        await self.room.end()
+        self.assertEqual(await next_message(reader), {'type': 'END', 'winner': 'P1'})
+        self.assertIsNone(await next_message(reader))
+        await asyncio.wait_for(relay.done.wait(), 2)
+
+    async def test_relay_process_runs_outside_this_loop(self):
+        relay = spectator_relay.RelayProcess(ROOM, '127.0.0.1', self.room.port)
+        await relay.start('127.0.0.1', 0)
+        self.relays.append(relay)
+        self.assertIsNone(relay.process.returncode)
+        reader = await self.start_watcher(relay.port)
+        self.assertEqual((await next_message(reader, timeout=5))['type'], 'WELCOME')
+
+        await self.room.end()
+        self.assertEqual(await next_message(reader, timeout=5), {'type': 'END', 'winner': 'P1'})
+        await asyncio.wait_for(relay.done.wait(), 5)
+        self.assertEqual(relay.process.returncode, 0)
+
+    async def test_relay_process_reports_a_dead_upstream(self):
+        await self.room.close()
+        relay = spectator_relay.RelayProcess(ROOM, '127.0.0.1', self.room.port)
+        with self.assertRaises(ConnectionError):
+            await relay.start('127.0.0.1', 0)
+        self.assertTrue(relay.done.is_set())
+        self.room = FakeRoom()
+        await self.room.start()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,6 @@ import hashlib
 
 import logging
 import json
-import random
 import config
 from config import tetris_server as tetris_server
 
@@ -13,39 +12,51 @@ _snapshot_logger = logging.getLogger("snapshot")
 """
 General utils
 """
+def encode_message(msg):
+    """
+    Frame a message once so it can be written to many recipients.
+    [4-byte length (uint32, network byte order)] [body: length bytes (custom format)]
+    Returns None if the body is too long.
+    """
+    if isinstance(msg, dict):
+        msg = json.dumps(msg)
+    message = msg.encode('utf-8')
+    length = len(message)
+    
+    # If message too long, log error
+    if length > config.MAX_MSG_SIZE:
+        logging.error(f"Message length {length} bytes exceeds {config.MAX_MSG_SIZE}")
+        return None
+    
+    return struct.pack('!I', length) + message
+
+
+def log_sent(msg):
+    parsed_payload = None
+    if isinstance(msg, dict):
+        parsed_payload = msg
+        msg = json.dumps(msg)
+    else:
+        try:
+            parsed_payload = json.loads(msg)
+        except Exception:
+            parsed_payload = None
+    
+    if isinstance(parsed_payload, dict) and parsed_payload.get("type") == "SNAPSHOT":
+        _snapshot_logger.info(msg)
+    else:
+        logging.info(f"Sent message: {msg}")
+
+
 async def send_message(writer, msg):
     try:
-        log_payload = msg
-        if isinstance(msg, dict):
-            msg = json.dumps(msg)
-        message = msg.encode('utf-8')
-        length = len(message)
-        
-        # If message too long, log error
-        if length > config.MAX_MSG_SIZE:
-            logging.error(f"Message length {length} bytes exceeds {config.MAX_MSG_SIZE}")
+        frame = encode_message(msg)
+        if frame is None:
             return
-        
-        # Format message 
-        # [4-byte length (uint32, network byte order)] [body: length bytes (custom format)]
-        header = struct.pack('!I', length)
-        writer.write(header + message)
+        writer.write(frame)
         
         await writer.drain()
-        
-        parsed_payload = None
-        if isinstance(log_payload, dict):
-            parsed_payload = log_payload
-        else:
-            try:
-                parsed_payload = json.loads(log_payload)
-            except Exception:
-                parsed_payload = None
-        
-        if isinstance(parsed_payload, dict) and parsed_payload.get("type") == "SNAPSHOT":
-            _snapshot_logger.info(msg)
-        else:
-            logging.info(f"Sent message: {msg}")
+        log_sent(msg)
     except Exception as e:
         logging.error(f"Failed to send message: {e}")
 
@@ -111,17 +122,42 @@ def hash(p):
     pswd = hashlib.sha256(p.encode()).hexdigest()
     return str(pswd)
 
-def get_port():
-    return random.randint(config.P2P_PORT_RANGE[0], config.P2P_PORT_RANGE[1])
+def get_port(owner=None):
+    """Lease a P2P port, None when the range is exhausted"""
+    return config.p2p_ports.allocate(owner)
+
+
+def release_port(port):
+    if port is not None:
+        config.p2p_ports.release(port)
+
+
+def release_ports(owner):
+    """Release every P2P port leased to owner (e.g. a room)"""
+    return config.p2p_ports.release_owner(owner)
+
+
+def get_game_port(owner=None):
+    """Lease a game server port, None when the range is exhausted"""
+    return config.game_ports.allocate(owner)
+
+
+def release_game_port(port):
+    if port is not None:
+        config.game_ports.release(port)
+
+
+def get_room_id(owner=None):
+    """Lease an unused 6-digit room ID, None when all are taken"""
+    return config.room_ids.allocate_id(owner)
 
 
-def get_game_port():
-    return random.randint(config.GAME_PORT_RANGE[0], config.GAME_PORT_RANGE[1])
+def release_room_id(room_id):
+    config.room_ids.release_id(room_id)
 
 
-def get_room_id():
-    id = ''.join(str(random.randint(0, 9)) for x in range(6))
-    return id
+def allocator_stats():
+    return [config.p2p_ports.stats(), config.game_ports.stats(), config.room_ids.stats()]
 
 
 """
@@ -0,0 +1,210 @@
+"""
+Port / room-ID allocator
+
+Tracks every value handed out from a fixed range so nothing is reused while it
+is still leased:
+- allocate/release are O(1): released values go on a free list and are reused
+  first, otherwise the next never-used slot is taken from a counter
+- the counter walks the range with a stride coprime to its size, so every
+  value is visited exactly once but consecutive rooms don't get adjacent IDs
+- a lease may carry a TTL; expired leases are reaped lazily on the next
+  allocate so values owned by rooms that died without cleanup come back
+- stats() reports utilization and allocation counters
+"""
+
+import collections
+import heapq
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+
+@dataclass
+class Lease:
+    value: int
+    owner: Optional[str] = None
+    expires_at: Optional[float] = None
+
+
+class IdAllocator:
+    """Leases integers from the inclusive range [start, end]"""
+
+    def __init__(self, start: int, end: int, stride: int = 1, offset: int = 0,
+                 default_ttl: Optional[float] = None, name: str = "ids",
+                 clock: Callable[[], float] = time.monotonic):
+        if end < start:
+            raise ValueError(f"Empty range {start}..{end}")
+        self.start = start
+        self.size = end - start + 1
+        if math.gcd(stride, self.size) != 1:
+            raise ValueError(f"Stride {stride} must be coprime to range size {self.size}")
+        self.stride = stride
+        self.offset = offset % self.size
+        self.default_ttl = default_ttl
+        self.name = name
+        self._clock = clock
+
+        self._cursor = 0                                # never-used slots consumed so far
+        self._free: collections.deque = collections.deque()
+        self._leases: Dict[int, Lease] = {}
+        self._by_owner: Dict[str, Set[int]] = {}
+        self._expiry: List[Tuple[float, int]] = []      # min-heap, entries may be stale
+
+        self.allocations = 0
+        self.releases = 0
+        self.expired = 0
+        self.exhausted = 0
+
+    # ------------------------------------------------------------------
+    # Leasing
+    # ------------------------------------------------------------------
+
+    def contains(self, value: int) -> bool:
+        return self.start <= value < self.start + self.size
+
+    def _next_unused(self) -> Optional[int]:
+        while self._cursor < self.size:
+            value = self.start + (self.offset + self._cursor * self.stride) % self.size
+            self._cursor += 1
+            if value not in self._leases:
+                return value
+        return None
+
+    def _take(self, value: int, owner: Optional[str], ttl: Optional[float]) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl else None
+        self._leases[value] = Lease(value, owner, expires_at)
+        if owner is not None:
+            self._by_owner.setdefault(owner, set()).add(value)
+        if expires_at is not None:
+            heapq.heappush(self._expiry, (expires_at, value))
+
+    def allocate(self, owner: Optional[str] = None, ttl: Optional[float] = None) -> Optional[int]:
+        """Lease a free value, or return None when the range is exhausted"""
+        self.reap()
+        value = None
+        while self._free:
+            candidate = self._free.popleft()
+            if candidate not in self._leases:     # may have been reserve()d meanwhile
+                value = candidate
+                break
+        if value is None:
+            value = self._next_unused()
+        if value is None:
+            self.exhausted += 1
+            logging.warning(f"[Allocator] {self.name} exhausted ({self.size} in use)")
+            return None
+        self._take(value, owner, ttl)
+        self.allocations += 1
+        return value
+
+    def reserve(self, value: int, owner: Optional[str] = None, ttl: Optional[float] = None) -> bool:
+        """Mark a specific value as leased, e.g. room IDs restored from disk"""
+        if not self.contains(value) or value in self._leases:
+            return False
+        self._take(value, owner, ttl)
+        return True
+
+    def release(self, value: int) -> bool:
+        lease = self._leases.pop(value, None)
+        if lease is None:
+            return False
+        if lease.owner is not None:
+            owned = self._by_owner.get(lease.owner)
+            if owned is not None:
+                owned.discard(value)
+                if not owned:
+                    del self._by_owner[lease.owner]
+        self._free.append(value)
+        self.releases += 1
+        return True
+
+    def release_owner(self, owner: str) -> int:
+        """Release every value leased by owner"""
+        values = list(self._by_owner.get(owner, ()))
+        for value in values:
+            self.release(value)
+        return len(values)
+
+    def renew(self, value: int, ttl: Optional[float] = None) -> bool:
+        lease = self._leases.get(value)
+        if lease is None:
+            return False
+        ttl = self.default_ttl if ttl is None else ttl
+        lease.expires_at = self._clock() + ttl if ttl else None
+        if lease.expires_at is not None:
+            heapq.heappush(self._expiry, (lease.expires_at, value))
+        return True
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """Release leases whose TTL has passed"""
+        now = self._clock() if now is None else now
+        count = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, value = heapq.heappop(self._expiry)
+            lease = self._leases.get(value)
+            if lease is None or lease.expires_at != expires_at:
+                continue                          # released or renewed since
+            logging.info(f"[Allocator] {self.name} lease {value} (owner {lease.owner}) expired")
+            self.release(value)
+            self.expired += 1
+            count += 1
+        return count
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def is_leased(self, value: int) -> bool:
+        return value in self._leases
+
+    def owner_of(self, value: int) -> Optional[str]:
+        lease = self._leases.get(value)
+        return lease.owner if lease else None
+
+    def stats(self) -> dict:
+        in_use = len(self._leases)
+        return {
+            'name': self.name,
+            'capacity': self.size,
+            'in_use': in_use,
+            'free': self.size - in_use,
+            'utilization': in_use / self.size,
+            'allocations': self.allocations,
+            'releases': self.releases,
+            'expired': self.expired,
+            'exhausted': self.exhausted,
+        }
+
+
+class RoomIdAllocator(IdAllocator):
+    """Fixed-width numeric room IDs ("000000" - "999999")"""
+
+    def __init__(self, digits: int = 6, stride: int = 387_281, offset: Optional[int] = None, **kwargs):
+        self.digits = digits
+        size = 10 ** digits
+        # Random starting point so a restarted server doesn't replay the same IDs
+        offset = random.randrange(size) if offset is None else offset
+        super().__init__(0, size - 1, stride=stride, offset=offset, name="room ids", **kwargs)
+
+    def format(self, value: int) -> str:
+        return str(value).zfill(self.digits)
+
+    def allocate_id(self, owner: Optional[str] = None) -> Optional[str]:
+        value = self.allocate(owner)
+        return None if value is None else self.format(value)
+
+    def reserve_id(self, room_id: str, owner: Optional[str] = None) -> bool:
+        try:
+            return self.reserve(int(room_id), owner)
+        except (TypeError, ValueError):
+            return False
+
+    def release_id(self, room_id: str) -> bool:
+        try:
+            return self.release(int(room_id))
+        except (TypeError, ValueError):
+            return False
@@ -0,0 +1,161 @@
+"""
+Event-driven stdin line reader
+
+get_user_input used to hand a blocking input() to the default thread pool for
+every prompt, and the input loops polled with asyncio.sleep in between. Lines are
+now read with loop.add_reader on stdin's fd and handed to whoever is awaiting
+readline():
+- the fd is only watched while someone is waiting for a line, so a game (in a
+  runner process or in-process) can own the terminal while the lobby is paused
+- pause()/resume() stop watching stdin even with a readline() pending
+- where stdin can't be registered with the selector (Windows' proactor loop, a
+  regular file) a single daemon thread reads lines instead; it can't be paused,
+  so lines typed meanwhile are queued
+- at end of input readline() raises EOFError, like input()
+- games use read_line(), which gives every event loop a reader of its own: a
+  runner process has its own loop and stdin, and an in-process game must not
+  share the lobby's reader, which stays paused while the game runs
+"""
+
+import asyncio
+import codecs
+import collections
+import io
+import os
+import sys
+import threading
+import weakref
+
+READ_SIZE = 4096
+
+
+class AsyncLineReader:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self.lines = collections.deque()
+        self.eof = False
+        self.mode = None            # "selector" or "thread", decided on first use
+        self._loop = None
+        self._fd = None
+        self._buffer = ''
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._waiters = collections.deque()
+        self._watching = False
+        self._paused = False
+        self._thread = None
+
+    def _attach(self):
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        try:
+            fd = self.stream.fileno()
+            self._loop.add_reader(fd, self._on_readable)
+            self._loop.remove_reader(fd)
+            self._fd = fd
+            self.mode = "selector"
+        except (AttributeError, OSError, ValueError, NotImplementedError, io.UnsupportedOperation):
+            self.mode = "thread"
+
+    def _update(self):
+        want = bool(self._waiters) and not self._paused and not self.eof
+        if self.mode == "thread":
+            if want and self._thread is None:
+                self._thread = threading.Thread(target=self._read_thread, name="stdin-reader", daemon=True)
+                self._thread.start()
+            return
+        if want and not self._watching:
+            self._loop.add_reader(self._fd, self._on_readable)
+            self._watching = True
+        elif not want and self._watching:
+            self._loop.remove_reader(self._fd)
+            self._watching = False
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if data:
+            self._feed(self._decoder.decode(data))
+        else:
+            self._feed(self._decoder.decode(b'', final=True), eof=True)
+
+    def _read_thread(self):
+        while True:
+            try:
+                line = self.stream.readline()
+            except (OSError, ValueError):
+                line = ''
+            self._loop.call_soon_threadsafe(self._feed, line, not line)
+            if not line:
+                return
+
+    def _feed(self, text, eof=False):
+        self._buffer += text
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            self.lines.append(line.rstrip('\r'))
+        if eof:
+            if self._buffer:
+                self.lines.append(self._buffer)
+                self._buffer = ''
+            self.eof = True
+        while self._waiters and (self.lines or self.eof):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+        if self._loop is not None:
+            self._update()
+
+    async def readline(self, prompt=''):
+        """Next line without its newline; raises EOFError once stdin is exhausted"""
+        self._attach()
+        if prompt:
+            sys.stdout.write(prompt)
+            sys.stdout.flush()
+        while not self.lines:
+            if self.eof:
+                raise EOFError
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+            self._update()
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._update()
+        return self.lines.popleft()
+
+    def pause(self):
+        """Stop taking input (e.g. while a game reads the terminal)"""
+        self._paused = True
+        if self._loop is not None:
+            self._update()
+
+    def resume(self):
+        self._paused = False
+        if self._loop is not None:
+            self._update()
+
+
+stdin_reader = AsyncLineReader()
+
+
+async def ainput(prompt=''):
+    return await stdin_reader.readline(prompt)
+
+
+_loop_readers = weakref.WeakKeyDictionary()
+
+
+async def read_line(prompt=''):
+    """input() for games: a stdin reader per event loop; raises EOFError at end of input"""
+    loop = asyncio.get_running_loop()
+    reader = _loop_readers.get(loop)
+    if reader is None or reader.stream is not sys.stdin:
+        reader = _loop_readers[loop] = AsyncLineReader(sys.stdin)
+    return await reader.readline(prompt)
@@ -1,8 +1,13 @@
 import asyncio
+import contextlib
+import hashlib
 import json
 import sys
 import logging
 import os
+import random
+from dataclasses import asdict, dataclass
+from typing import Optional
 import aiofiles
 import aiofiles.os
 import config
@@ -10,9 +15,16 @@ import config
 os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
 
 TEXT_MODE_CLIENT = os.environ.get("TEXT_MODE_CLIENT", "").lower() in ("1", "true", "yes")
+# PREFETCH_GAMES=0 ignores the lobby's prefetch hints, to compare time to first tick with and without them
+PREFETCH_GAMES = os.environ.get("PREFETCH_GAMES", "1").lower() not in ("0", "false", "no")
 
 import utils as ut
 import config
+import async_input
+import code_cache
+import delta
+import game_runner
+import game_sdk
 from config import tetris_server as tetris_server
 
 # ANSI style helpers for nicer CLI output
@@ -30,6 +42,81 @@ peer_info = {
 }
 GAME_VERSIONS_FILENAME = "game_versions.json"
 
+
+@dataclass
+class PeerInfo:
+    """Connection details for one match, handed straight to the game"""
+    role: Optional[str] = None
+    peer_ip: Optional[str] = None
+    peer_port: Optional[int] = None
+    own_port: Optional[int] = None
+    game_name: Optional[str] = None
+    room_id: Optional[str] = None
+    game_version: Optional[str] = None
+    relay_host: Optional[str] = None
+    relay_port: Optional[int] = None
+    relay_token: Optional[str] = None
+    host_ready: bool = False
+
+    REQUIRED = ("role", "peer_ip", "peer_port", "own_port", "game_name")
+
+    @classmethod
+    def from_message(cls, message_json):
+        return cls(
+            role=message_json.get("role"),
+            peer_ip=message_json.get("peer_ip"),
+            peer_port=message_json.get("peer_port"),
+            own_port=message_json.get("own_port"),
+            game_name=message_json.get("game_name"),
+            room_id=message_json.get("room_id"),
+            game_version=message_json.get("game_version"),
+            relay_host=message_json.get("relay_host"),
+            relay_port=message_json.get("relay_port"),
+            relay_token=message_json.get("relay_token"),
+            host_ready=bool(message_json.get("host_ready"))
+        )
+
+    def missing(self):
+        return [field for field in self.REQUIRED if not getattr(self, field)]
+
+    def as_dict(self):
+        # Games read peer_info as a plain dict
+        return asdict(self)
+
+
+class LobbyLink:
+    """The lobby connection, used as both reader and writer; resuming a session swaps the socket underneath"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    def attach(self, reader, writer):
+        with contextlib.suppress(Exception):
+            self.writer.close()
+        self.reader = reader
+        self.writer = writer
+
+    async def readexactly(self, n):
+        return await self.reader.readexactly(n)
+
+    def write(self, data):
+        self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def get_extra_info(self, name, default=None):
+        return self.writer.get_extra_info(name, default)
+
+    def close(self):
+        self.closed = True
+        self.writer.close()
+
+    async def wait_closed(self):
+        await self.writer.wait_closed()
+
 PRE_LOGIN_MENU = [
     {
         "command": "REGISTER",
@@ -222,10 +309,16 @@ For server
 """
 pending_invitations = []
 username = None
+session_token = None
 user_folder = None
+runner_pool = None
 pending_uploads = {}
 pending_upload_confirms = {}
 pending_downloads = {}
+download_activity = {}
+prefetch_tasks = {}
+# Fire-and-forget tasks; the event loop only keeps weak references to them
+background_tasks = set()
 pending_review_requests = {}
 room_info = {}
 current_room_id = None
@@ -451,6 +544,52 @@ async def set_local_game_version(game_name, version):
     await save_local_game_versions(versions)
 
 
+async def write_game_file(file_path, data, version):
+    """Atomically replace file_path with data, refusing content that doesn't match a hash version"""
+    if ut.is_sha256(version) and hashlib.sha256(data).hexdigest() != version:
+        raise ValueError(f"{file_path} failed hash check (expected {version})")
+    async with aiofiles.open(file_path + ".part", 'wb') as f:
+        await f.write(data)
+    os.replace(file_path + ".part", file_path)
+
+
+def _partial_path(game_name, version):
+    return os.path.join(user_folder, f"{game_name}.py.{version}.part")
+
+
+def _find_partial(game_name):
+    """(version, size) of an interrupted download of game_name, or None"""
+    prefix = f"{game_name}.py."
+    try:
+        names = os.listdir(user_folder)
+    except OSError:
+        return None
+    for name in names:
+        if name.startswith(prefix) and name.endswith(".part"):
+            version = name[len(prefix):-len(".part")]
+            if version:
+                return version, os.path.getsize(os.path.join(user_folder, name))
+    return None
+
+
+def _discard_partials(game_name, keep=None):
+    partial = _find_partial(game_name)
+    while partial and partial[0] != keep:
+        with contextlib.suppress(OSError):
+            os.remove(_partial_path(game_name, partial[0]))
+        partial = _find_partial(game_name)
+
+
+def _download_progress(game_name):
+    printer = ut.progress_printer(f"下載 {game_name}.py")
+    loop = asyncio.get_event_loop()
+
+    def progress(done, total):
+        download_activity[game_name] = loop.time()
+        printer(done, total)
+    return progress
+
+
 async def download_game_from_server(game_name, writer, *, silent=False):
     if user_folder is None:
         if not silent:
@@ -460,14 +599,27 @@ async def download_game_from_server(game_name, writer, *, silent=False):
     loop = asyncio.get_event_loop()
     download_future = loop.create_future()
     pending_downloads[game_name] = download_future
-    await ut.send_command("client", writer, "DOWNLOAD_GAME_FILE", [game_name])
+    # Send the hash of our copy so the server can skip the transfer if it's current,
+    # and the size of any interrupted download so it can pick up where it stopped
+    local_hash = await ut.file_sha256(os.path.join(user_folder, game_name + ".py"))
+    params = [game_name, local_hash or "", "gzip"]
+    partial = _find_partial(game_name)
+    if partial and partial[1] > 0:
+        params.append(f"resume={partial[0]}:{partial[1]}")
+    download_activity[game_name] = loop.time()
+    await ut.send_command("client", writer, "DOWNLOAD_GAME_FILE", params)
     try:
-        await asyncio.wait_for(download_future, timeout=15)
+        # Give up only when nothing has arrived for a while, not after a fixed total time
+        while not download_future.done():
+            await asyncio.wait({download_future}, timeout=1)
+            if loop.time() - download_activity.get(game_name, 0) > config.DOWNLOAD_IDLE_TIMEOUT:
+                raise asyncio.TimeoutError
+        download_future.result()
         return True
     except asyncio.TimeoutError:
         if not silent:
-            print("下載遊戲檔案超時。")
-        logging.error(f"Download timed out for {game_name}")
+            print("下載遊戲檔案超時，下次將從中斷處繼續。")
+        logging.error(f"Download of {game_name} stalled for {config.DOWNLOAD_IDLE_TIMEOUT}s")
         return False
     except Exception as e:
         if not silent:
@@ -476,14 +628,34 @@ async def download_game_from_server(game_name, writer, *, silent=False):
         return False
     finally:
         pending_downloads.pop(game_name, None)
+        download_activity.pop(game_name, None)
+
+
+async def prefetch_game(game_name, version, writer):
+    """Background download started by the lobby's prefetch hint when we enter a room"""
+    if await ensure_local_game_version(game_name, version, writer, prefetch=True):
+        logging.info(f"Prefetched {game_name} ({version})")
 
 
-async def ensure_local_game_version(game_name, expected_version, writer):
+async def ensure_local_game_version(game_name, expected_version, writer, prefetch=False):
     if not expected_version:
         return True
+    task = prefetch_tasks.get(game_name)
+    if not prefetch and task is not None:
+        # Let an in-flight prefetch finish rather than starting a second download
+        with contextlib.suppress(Exception):
+            await task
+    if ut.is_sha256(expected_version) and user_folder:
+        # Versions are content hashes: the file itself says whether it's current
+        local_hash = await ut.file_sha256(os.path.join(user_folder, game_name + ".py"))
+        if local_hash == expected_version:
+            await set_local_game_version(game_name, expected_version)
+            return True
     current_version = await get_local_game_version(game_name)
-    if current_version == expected_version:
+    if current_version == expected_version and not ut.is_sha256(expected_version):
         return True
+    if prefetch:
+        return await download_game_from_server(game_name, writer, silent=True)
     print(f"{game_name} 版本落後（目前 {current_version or '未知'}，需要 {expected_version}），正在自動更新...")
     success = await download_game_from_server(game_name, writer)
     if success:
@@ -554,12 +726,66 @@ async def handle_market_review(game_name, writer):
     comment = await get_user_input("請輸入評語： ")
     await ut.send_command("client", writer, "LEAVE_REVIEW", [game_name, str(rating), comment])
 
+async def resume_lobby_session(link, logged_in):
+    """Reconnect after the lobby connection dropped and reattach the session; False if the lobby stayed unreachable"""
+    global session_token
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + config.SESSION_GRACE_PERIOD
+    delay = config.RESUME_BASE_DELAY
+    print("\n與大廳的連線中斷，正在重新連線...")
+    while session_token and loop.time() < deadline:
+        reply = None
+        try:
+            reader, writer = await asyncio.open_connection(config.HOST, config.PORT)
+        except OSError:
+            writer = None
+        if writer is not None:
+            link.attach(reader, writer)
+            await ut.send_command("client", link, "RESUME", [session_token])
+            reply = await ut.unpack_message(link)
+        if reply is None:
+            # Unreachable, or accepted and dropped before answering: back off either way
+            if writer is not None:
+                writer.close()
+            await asyncio.sleep(delay / 2 + random.uniform(0, delay / 2))
+            delay = min(delay * 2, config.RESUME_MAX_DELAY)
+            continue
+        try:
+            reply_json = json.loads(reply)
+        except json.JSONDecodeError:
+            reply_json = {}
+        params = reply_json.get("params") or []
+        if reply_json.get("status") == "success" and reply_json.get("message", "").startswith("RESUME_SUCCESS"):
+            session_token = params[0] if params else None
+            logging.info(f"Resumed lobby session in {(loop.time() - started) * 1000:.0f} ms")
+            print("已重新連線至大廳。")
+            return True
+        # The lobby is back but the session is gone: stay connected, logged out
+        logging.info(f"Could not resume lobby session: {reply_json.get('message')}")
+        session_token = None
+        logged_in.value = False
+        pending_invitations.clear()
+        room_info.clear()
+        reset_current_room_state()
+        exit_market_mode()
+        print("工作階段已過期，請重新登入。")
+        display_help(False)
+        return True
+    session_token = None
+    return False
+
+
 async def handle_server_messages(reader, writer, game_in_progress, logged_in, shutdown_event):
+    global session_token
     while True:
         try:
             # data = await reader.readline()
             message = await ut.unpack_message(reader)
             if message is None:
+                if session_token and not shutdown_event.is_set() and not getattr(reader, "closed", True):
+                    if await resume_lobby_session(reader, logged_in):
+                        continue
                 if not shutdown_event.is_set():
                     async with tetris_server.rooms_lock:
                         for room in tetris_server.rooms:
@@ -586,6 +812,7 @@ async def handle_server_messages(reader, writer, game_in_progress, logged_in, sh
                     
                     elif msg.startswith("LOGIN_SUCCESS"):
                         print("\nYou have logged in successfully.\n")
+                        session_token = params_list[0] if params_list else None
                         logged_in.value = True
                         pending_invitations.clear()
                         room_info.clear()
@@ -601,6 +828,7 @@ async def handle_server_messages(reader, writer, game_in_progress, logged_in, sh
                     
                     elif msg.startswith("LOGOUT_SUCCESS"):
                         print("\nYou have logged out successfully.")
+                        session_token = None
                         logged_in.value = False
                         pending_invitations.clear()
                         room_info.clear()
@@ -706,10 +934,37 @@ async def handle_server_messages(reader, writer, game_in_progress, logged_in, sh
                     game_name = message_json.get("game_name")
                     file_size = int(message_json.get("file_size", 0))
                     version = message_json.get("version")
-                    file_content = await reader.readexactly(file_size)
                     file_path = os.path.join(user_folder, game_name + ".py")
-                    async with aiofiles.open(file_path, 'wb') as f:
-                        await f.write(file_content)
+                    try:
+                        # The body (raw, or gzip inflated as it arrives) lands in a per-version
+                        # .part file that survives interruptions; it only replaces the game once
+                        # the hash checks out
+                        offset = int(message_json.get("offset", 0))
+                        _discard_partials(game_name, keep=version if offset else None)
+                        part_path = _partial_path(game_name, version)
+                        part_size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                        if offset and part_size != offset:
+                            # The .part we resumed from changed meanwhile; appending would leave a
+                            # hole, so drop this body and fetch the whole file instead
+                            await ut.skip_bytes(reader, file_size)
+                            logging.info(f"Partial download of {game_name} is {part_size} bytes, "
+                                         f"not {offset}; downloading it again")
+                            _discard_partials(game_name)
+                            await ut.send_command("client", writer, "DOWNLOAD_GAME_FILE", [game_name, "", "gzip"])
+                            continue
+                        await ut.append_to_file(reader, part_path, offset, file_size,
+                                                progress=_download_progress(game_name),
+                                                gzipped=message_json.get("encoding") == "gzip")
+                        if ut.is_sha256(version) and await ut.file_sha256(part_path) != version:
+                            os.remove(part_path)
+                            raise ValueError(f"{game_name}.py failed hash check (expected {version})")
+                        os.replace(part_path, file_path)
+                    except (OSError, ValueError) as e:
+                        logging.error(f"Discarded download of {game_name}: {e}")
+                        download_future = pending_downloads.pop(game_name, None)
+                        if download_future and not download_future.done():
+                            download_future.set_exception(e)
+                        continue
                     await set_local_game_version(game_name, version)
                     download_future = pending_downloads.get(game_name)
                     if download_future and not download_future.done():
@@ -719,6 +974,43 @@ async def handle_server_messages(reader, writer, game_in_progress, logged_in, sh
                     else:
                         print(f"{game_name} 已自動同步為最新版本（{version or '未知'}）。")
 
+                elif status == "file_delta":
+                    game_name = message_json.get("game_name")
+                    version = message_json.get("version")
+                    patch = await reader.readexactly(int(message_json.get("delta_size", 0)))
+                    file_path = os.path.join(user_folder, game_name + ".py")
+                    try:
+                        async with aiofiles.open(file_path, 'rb') as f:
+                            base = await f.read()
+                        await write_game_file(file_path, delta.apply_delta(base, patch), version)
+                    except (OSError, ValueError) as e:
+                        # Local copy changed under us or the patch is bad: fetch the whole file
+                        logging.error(f"Delta for {game_name} failed ({e}), requesting full download")
+                        await ut.send_command("client", writer, "DOWNLOAD_GAME_FILE", [game_name])
+                        continue
+                    await set_local_game_version(game_name, version)
+                    download_future = pending_downloads.pop(game_name, None)
+                    if download_future and not download_future.done():
+                        download_future.set_result(version or True)
+                    print(f"已套用 {game_name}.py 的差異更新（{len(patch)} bytes，版本 {version or '未知'}）")
+
+                elif status == "prefetch":
+                    game_name = message_json.get("game_name")
+                    task = prefetch_tasks.get(game_name)
+                    if PREFETCH_GAMES and game_name and (task is None or task.done()):
+                        task = asyncio.create_task(prefetch_game(game_name, message_json.get("version"), writer))
+                        prefetch_tasks[game_name] = task
+                        task.add_done_callback(lambda t, name=game_name: prefetch_tasks.pop(name, None) if prefetch_tasks.get(name) is t else None)
+
+                elif status == "not_modified":
+                    game_name = message_json.get("game_name")
+                    version = message_json.get("version")
+                    await set_local_game_version(game_name, version)
+                    download_future = pending_downloads.pop(game_name, None)
+                    if download_future and not download_future.done():
+                        download_future.set_result(version or True)
+                    print(f"{game_name}.py 已是最新版本（{version or '未知'}），無需下載。")
+
                 elif status == "update":
                     update_type = message_json.get("type")
                     if update_type == "online_users":
@@ -774,6 +1066,8 @@ async def handle_server_messages(reader, writer, game_in_progress, logged_in, sh
 
 async def process_p2p_info_message(message_json, writer, game_in_progress):
     global username
+    loop = asyncio.get_event_loop()
+    received_at = loop.time()
     room_id = message_json.get("room_id")
     if room_id and message_json.get("game_name"):
         room_info[room_id] = message_json["game_name"]
@@ -789,45 +1083,58 @@ async def process_p2p_info_message(message_json, writer, game_in_progress):
         set_current_room_state(room_id, base_players)
     elif room_id and current_room_id is None:
         set_current_room_state(room_id, current_room_players if current_room_players else None)
-    new_peer_info = {
-        "role": message_json.get("role"),
-        "peer_ip": message_json.get("peer_ip"),
-        "peer_port": message_json.get("peer_port"),
-        "own_port": message_json.get("own_port"),
-        "game_name": message_json.get("game_name")
-    }
-    await update_peer_info(new_peer_info)
-    current_peer_info = await read_peer_info()
-    if current_peer_info is None:
-        print("錯誤：無法讀取 peer_info。")
-        logging.error("Failed to read peer_info after p2p_info.")
-        return
-    required_fields = ["role", "peer_ip", "peer_port", "own_port", "game_name"]
-    missing = [field for field in required_fields if not current_peer_info.get(field)]
+    match_info = PeerInfo.from_message(message_json)
+    missing = match_info.missing()
     if missing:
         print(f"錯誤：收到不完整的連線資訊，缺少 {', '.join(missing)}。")
         logging.error(f"Incomplete p2p_info: missing {missing}")
         return
-    expected_version = message_json.get("game_version")
-    version_ready = await ensure_local_game_version(current_peer_info["game_name"], expected_version, writer)
+    # Kept on disk only for crash diagnostics; nothing on the start path waits for it
+    task = asyncio.create_task(persist_peer_info(match_info))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    version_ready = await ensure_local_game_version(match_info.game_name, match_info.game_version, writer)
     if not version_ready:
-        logging.error(f"Failed to synchronize game version for {current_peer_info['game_name']}")
+        logging.error(f"Failed to synchronize game version for {match_info.game_name}")
         return
+    logging.info(f"Game {match_info.game_name} ready {(loop.time() - received_at) * 1000:.0f} ms after p2p_info")
     logging.info(
-        f"角色：{current_peer_info['role']}，對等方 IP：{current_peer_info['peer_ip']}，"
-        f"對等方 Port：{current_peer_info['peer_port']}，自身 Port：{current_peer_info['own_port']}")
+        f"角色：{match_info.role}，對等方 IP：{match_info.peer_ip}，"
+        f"對等方 Port：{match_info.peer_port}，自身 Port：{match_info.own_port}")
     print(
-        f"\n角色：{current_peer_info['role']}，對等方 IP：{current_peer_info['peer_ip']}，"
-        f"對等方 Port：{current_peer_info['peer_port']}，自身 Port：{current_peer_info['own_port']}")
+        f"\n角色：{match_info.role}，對等方 IP：{match_info.peer_ip}，"
+        f"對等方 Port：{match_info.peer_port}，自身 Port：{match_info.own_port}")
     game_in_progress.value = True
     asyncio.create_task(
-        initiate_game(current_peer_info["game_name"], game_in_progress, writer, user_folder)
+        initiate_game(match_info, game_in_progress, writer, user_folder, received_at)
     )
 
 
 async def get_user_input(prompt):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: input(prompt).strip())
+    return (await async_input.ainput(prompt)).strip()
+
+
+class GameInProgress:
+    """game_in_progress flag; while set, the lobby stops reading stdin so the game owns the terminal"""
+
+    def __init__(self):
+        self._value = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, playing):
+        self._value = playing
+        if playing:
+            self.idle.clear()
+            async_input.stdin_reader.pause()
+        else:
+            self.idle.set()
+            async_input.stdin_reader.resume()
 
 
 async def handle_user_input(writer, game_in_progress, logged_in, shutdown_event):
@@ -835,9 +1142,10 @@ async def handle_user_input(writer, game_in_progress, logged_in, shutdown_event)
         global username
         try:
             if game_in_progress.value:
-                await asyncio.sleep(0.1)
+                await game_in_progress.idle.wait()
                 continue
-            await asyncio.sleep(1)
+            # Let the reply to the previous command print before the next prompt
+            await asyncio.sleep(config.PROMPT_SETTLE_DELAY)
             user_input = await get_user_input("Input a command: ")
             if not user_input:
                 continue
@@ -1109,35 +1417,38 @@ async def handle_user_input(writer, game_in_progress, logged_in, shutdown_event)
 For game
 """
 
-async def read_peer_info():
-    global user_folder
-    peer_info_path = os.path.join(user_folder, "peer_info.json")
-    try:
-        async with aiofiles.open(peer_info_path, 'r') as f:
-            content = await f.read()
-            return json.loads(content)
-    except Exception as e:
-        print(f"讀取 peer_info.json 時發生錯誤：{e}")
-        logging.error(f"讀取 peer_info.json 時發生錯誤：{e}")
-        return None
-
-async def update_peer_info(new_info):
-    global user_folder
+async def persist_peer_info(match_info):
+    if not user_folder:
+        return
     peer_info_path = os.path.join(user_folder, "peer_info.json")
     try:
-        current_info = await read_peer_info()
-        if current_info is None:
-            current_info = {}
-        current_info.update(new_info)
         async with aiofiles.open(peer_info_path, 'w') as f:
-            await f.write(json.dumps(current_info, ensure_ascii=False, indent=4))
-        logging.info(f"更新 peer_info.json：{new_info}")
+            await f.write(json.dumps(match_info.as_dict(), ensure_ascii=False, indent=4))
+        logging.info(f"更新 peer_info.json：{match_info}")
     except Exception as e:
-        print(f"更新 peer_info.json 時發生錯誤：{e}")
         logging.error(f"更新 peer_info.json 時發生錯誤：{e}")
 
-async def initiate_game(game_name, game_in_progress, writer, user_folder):
+def game_event_handler(match_info, writer, received_at=None):
+    """Forward game_sdk events to the lobby: the host's HOST_READY releases the other player's p2p_info"""
+    launched_at = asyncio.get_running_loop().time()
+    received_at = received_at or launched_at
+
+    def on_event(message):
+        if message.get("event") == "started":
+            elapsed = (asyncio.get_running_loop().time() - received_at) * 1000
+            logging.info(f"Game {match_info.game_name} first tick {elapsed:.0f} ms after p2p_info "
+                         f"(prefetch {'on' if PREFETCH_GAMES else 'off'})")
+        elif message.get("event") == "host_ready" and match_info.role == "host":
+            elapsed = (asyncio.get_running_loop().time() - launched_at) * 1000
+            logging.info(f"Game {match_info.game_name} listening {elapsed:.0f} ms after launch, sending HOST_READY")
+            asyncio.create_task(ut.send_command("client", writer, "HOST_READY", [match_info.room_id]))
+
+    return on_event
+
+
+async def initiate_game(match_info, game_in_progress, writer, user_folder, received_at=None):
     try:
+        game_name = match_info.game_name
         if not game_name:
             print("無法啟動遊戲：未知遊戲名稱。")
             logging.error("Missing game name for initiate_game.")
@@ -1150,25 +1461,20 @@ async def initiate_game(game_name, game_in_progress, writer, user_folder):
             logging.error(f"遊戲檔案 {game_name} 不存在於 {game_folder}。")
             return
 
-        peer_info = await read_peer_info()
-        if peer_info is None:
-            print("錯誤：無法讀取 peer_info。")
-            logging.error("無法讀取 peer_info。")
-            return
-        
-        required_fields = ["role", "peer_ip", "peer_port", "own_port", "game_name"]
-        missing_fields = [field for field in required_fields if peer_info.get(field) is None]
-        if missing_fields:
-            print(f"錯誤：peer_info 缺少字段：{', '.join(missing_fields)}")
-            logging.error(f"peer_info 缺少字段：{', '.join(missing_fields)}")
-            return
-
+        peer_info = match_info.as_dict()
         game_globals = {}
         game_globals['peer_info'] = peer_info
+        on_event = game_event_handler(match_info, writer, received_at)
         try:
-            # Force UTF-8 decoding to avoid Windows cp950 locale issues when games contain non-ASCII.
-            async with aiofiles.open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                code = await f.read()
+            code = await code_cache.load_code(file_path, game_name, game_folder)
+            # Prefer a runner process so the game can't block the lobby connection
+            result = await runner_pool.run(game_name, code, peer_info, on_event) if runner_pool else None
+            if result is not None:
+                if not result.get("ok"):
+                    print(f"讀取或執行遊戲腳本時發生錯誤：{result.get('error')}")
+                    logging.error(f"讀取或執行遊戲腳本時發生錯誤：{result.get('error')}")
+                return
+            game_sdk.set_event_hook(on_event)
             exec(code, game_globals)
             if 'main' in game_globals and callable(game_globals['main']):
                 await game_globals['main'](peer_info)
@@ -1178,6 +1484,8 @@ async def initiate_game(game_name, game_in_progress, writer, user_folder):
         except Exception as e:
             print(f"讀取或執行遊戲腳本時發生錯誤：{e}")
             logging.error(f"讀取或執行遊戲腳本時發生錯誤：{e}")
+        finally:
+            game_sdk.set_event_hook(None)
     except Exception as e:
         print(f"遊戲執行時發生錯誤：{e}")
         logging.error(f"遊戲執行時發生錯誤：{e}")
@@ -1320,7 +1628,11 @@ def display_online_users(online_users):
 
 
 async def main():
+    global runner_pool
     ut.init_logging()
+    # Start the game runners (and the forkserver that replaces them) before the lobby connection exists
+    runner_pool = game_runner.GameRunnerPool()
+    runner_pool.start()
 
     server_ip = config.HOST
     server_port = config.PORT
@@ -1338,17 +1650,19 @@ async def main():
         logging.error(f"Unable to connect to server: {e}")
         return
 
-    game_in_progress = type('', (), {'value': False})()
+    game_in_progress = GameInProgress()
     logged_in = type('', (), {'value': False})()
     shutdown_event = asyncio.Event()
+    lobby = LobbyLink(reader, writer)
 
-    asyncio.create_task(handle_server_messages(reader, writer, game_in_progress, logged_in, shutdown_event))
-    asyncio.create_task(handle_user_input(writer, game_in_progress, logged_in, shutdown_event))
+    asyncio.create_task(handle_server_messages(lobby, lobby, game_in_progress, logged_in, shutdown_event))
+    asyncio.create_task(handle_user_input(lobby, game_in_progress, logged_in, shutdown_event))
 
     display_help(False)
 
     await shutdown_event.wait()
 
+    runner_pool.close()
     print("Client end closed.")
     logging.info("Client end closed.")
     sys.exit()
@@ -0,0 +1,71 @@
+"""
+Compiled-code cache for downloaded game scripts
+
+initiate_game used to compile the game's source on every launch. The code object
+is now marshal'd into <games folder>/.code-cache/<game>-<sha256>-<magic>.bin:
+- the key is the script's content hash, so a new version (or a local edit) misses
+  and recompiles, and older entries for the same game are removed
+- the interpreter's bytecode magic number is part of the name, since marshal'd
+  code is only valid for the Python version that wrote it
+- an unreadable or corrupt entry is treated as a miss
+"""
+
+import hashlib
+import importlib.util
+import logging
+import marshal
+import os
+import uuid
+
+import aiofiles
+
+CACHE_DIRNAME = '.code-cache'
+MAGIC = importlib.util.MAGIC_NUMBER.hex()
+
+
+def _entry_path(cache_dir, game_name, digest):
+    return os.path.join(cache_dir, f"{game_name}-{digest}-{MAGIC}.bin")
+
+
+def _prune(cache_dir, game_name, keep):
+    prefix = f"{game_name}-"
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        # The digest is 64 hex chars, so "<game>-<digest>-..." can't be confused with another game's prefix
+        if name.startswith(prefix) and len(name) > len(prefix) + 64 and name[len(prefix) + 64] == '-' and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+async def load_code(file_path, game_name, games_folder):
+    """Code object for the game script at file_path, compiled at most once per version"""
+    async with aiofiles.open(file_path, 'rb') as f:
+        source = await f.read()
+    digest = hashlib.sha256(source).hexdigest()
+    cache_dir = os.path.join(games_folder, CACHE_DIRNAME)
+    entry = _entry_path(cache_dir, game_name, digest)
+
+    try:
+        async with aiofiles.open(entry, 'rb') as f:
+            code = marshal.loads(await f.read())
+        logging.info(f"Loaded compiled {game_name} from code cache")
+        return code
+    except FileNotFoundError:
+        pass
+    except (OSError, EOFError, ValueError, TypeError) as e:
+        logging.warning(f"Ignoring corrupt code cache entry {entry}: {e}")
+
+    # Force UTF-8 decoding to avoid Windows cp950 locale issues when games contain non-ASCII.
+    code = compile(source.decode('utf-8', errors='replace'), file_path, 'exec')
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{entry}.{uuid.uuid4().hex}.tmp"
+        async with aiofiles.open(temp_path, 'wb') as f:
+            await f.write(marshal.dumps(code))
+        os.replace(temp_path, entry)
+        _prune(cache_dir, game_name, entry)
+    except OSError as e:
+        logging.warning(f"Could not write code cache for {game_name}: {e}")
+    return code
@@ -2,6 +2,8 @@ import asyncio
 import json
 import copy
 
+import allocator
+
 HOST = '140.113.17.13'
 # HOST = '192.168.56.1'
 # WSL
@@ -28,22 +30,50 @@ DEFAULT_DB_STRUCTURE = {
 }
 
 P2P_PORT_RANGE = (63042, 63142)
-available_ports = {}
-for i in range(63042, 63142 + 1):
-    available_ports[i] = 1
+# Ports stay leased to their room until the lobby releases it; no TTL, so a long
+# game's port is never reaped and handed to another room while still bound
+p2p_ports = allocator.IdAllocator(*P2P_PORT_RANGE, name="p2p ports")
+game_ports = allocator.IdAllocator(*GAME_PORT_RANGE, name="game ports")
+room_ids = allocator.RoomIdAllocator()
 
 MAX_MSG_SIZE = 65536
+# Game files are streamed in chunks of this size
+FILE_CHUNK_SIZE = 64 * 1024
+# Bytes handed to each os.sendfile call when serving game files
+SENDFILE_CHUNK_SIZE = 1024 * 1024
+# Unreferenced game objects younger than this (seconds) survive garbage collection
+GAME_OBJECT_GRACE = 60
+# Previous versions kept per game so outdated clients can be sent a delta
+GAME_VERSION_HISTORY = 3
+# Send the full file instead when a delta is larger than this fraction of it
+DELTA_MAX_RATIO = 0.5
+# Lobby's in-memory cache of hot game files: total bytes, largest cached file, keep gzip copies
+GAME_CACHE_BYTES = 32 * 1024 * 1024
+GAME_CACHE_MAX_ENTRY = 4 * 1024 * 1024
+GAME_CACHE_COMPRESS = True
+# A game download is abandoned (and resumed next time) after this many seconds without data
+DOWNLOAD_IDLE_TIMEOUT = 15
+# Idle pre-forked processes kept ready to run games on the client
+GAME_RUNNER_POOL_SIZE = 1
+# Lobby TCP relay for peers that can't connect directly; 0 picks a free port
+RELAY_PORT = 52326
+# Bytes moved per splice; must not exceed the kernel pipe size (64 KiB by default)
+RELAY_CHUNK_SIZE = 64 * 1024
+RELAY_STATS_HISTORY = 100
+# Longest the lobby holds the client player's p2p_info waiting for the host's HOST_READY; 0 sends it at once
+HOST_READY_TIMEOUT = 3
+# Seconds a dropped lobby connection stays resumable with its session token; 0 logs out at once
+SESSION_GRACE_PERIOD = 60
+# Messages queued per lobby connection before a client that stopped reading is dropped
+SESSION_QUEUE_LIMIT = 256
+# Client reconnect backoff while resuming a session (seconds, doubled per attempt up to the max)
+RESUME_BASE_DELAY = 0.5
+RESUME_MAX_DELAY = 5
+# Pause before re-prompting so the reply to the last command prints first
+PROMPT_SETTLE_DELAY = 0.2
 
 id_count = 1
 
-target_lock = asyncio.Lock()
-targets = {
-    "template":{
-        "writer": None,
-        "reader": None
-    }
-}
-
 class server:
     def __init__(self):
         self.online_users = {}
@@ -96,3 +126,7 @@ class server:
             self.games = {}
         
 tetris_server = server()
+
+# Room IDs restored from disk stay taken
+for _room_id in tetris_server.rooms:
+    room_ids.reserve_id(_room_id)
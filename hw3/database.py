@@ -253,6 +253,8 @@ async def db_logout(username, writer, sender=None):
                     remove_room.append(room)
             for room in remove_room:
                 del rooms[room]
+                if not is_dev:
+                    ut.release_room_id(room)
                 logging.info(f"Removed room {room}")
             
             async with db_lock:
@@ -267,8 +269,11 @@ async def db_logout(username, writer, sender=None):
 Game-related
 """
 async def db_create_room(params, writer):
-    room_id = ut.get_room_id()
     username, room_type, game_name = params
+    room_id = ut.get_room_id(username)
+    if room_id is None:
+        await ut.send_message(writer, ut.build_response("database", "error", "No room IDs available"))
+        return
     
     # Update server
     async with tetris_server.rooms_lock:
@@ -380,6 +385,7 @@ async def db_leave_room(params, writer):
                     }
                 else:
                     del tetris_server.rooms[r_id]
+                    ut.release_room_id(r_id)
                 break
     if not room_id:
         await ut.send_message(writer, ut.build_response("database", "error", "User not in a room"))
@@ -682,6 +688,8 @@ async def db_close_server(params):
                 
         for rm in rm_room:
             del rooms[rm]
+            if not is_dev:
+                ut.release_room_id(rm)
         
         async with db_lock:
             data = _load_db_document()
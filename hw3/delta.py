@@ -0,0 +1,57 @@
+"""
+Line-based deltas between game file versions
+
+A delta rebuilds the target file from a base file the client already has:
+    {"base": <sha256>, "target": <sha256>, "ops": [...]}
+where each op is either [start, end] (copy base lines start:end) or a string
+(literal text to insert). apply_delta checks both hashes, so a wrong base or a
+corrupted patch raises ValueError instead of producing a bad file.
+"""
+
+import difflib
+import hashlib
+import json
+
+
+def make_delta(base: bytes, target: bytes) -> bytes:
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            # replace / insert; deletes just skip base lines
+            ops.append(b''.join(target_lines[j1:j2]).decode('utf-8', 'surrogateescape'))
+    delta = {
+        'base': hashlib.sha256(base).hexdigest(),
+        'target': hashlib.sha256(target).hexdigest(),
+        'ops': ops,
+    }
+    return json.dumps(delta, separators=(',', ':')).encode('utf-8', 'surrogateescape')
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    try:
+        patch = json.loads(delta.decode('utf-8', 'surrogateescape'))
+        ops = patch['ops']
+        expected_base, expected_target = patch['base'], patch['target']
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Malformed delta: {e}") from e
+    if hashlib.sha256(base).hexdigest() != expected_base:
+        raise ValueError("Delta does not apply to this base version")
+
+    base_lines = base.splitlines(keepends=True)
+    out = []
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op.encode('utf-8', 'surrogateescape'))
+        elif isinstance(op, list) and len(op) == 2 and 0 <= op[0] <= op[1] <= len(base_lines):
+            out.extend(base_lines[op[0]:op[1]])
+        else:
+            raise ValueError(f"Malformed delta op: {op!r}")
+    result = b''.join(out)
+    if hashlib.sha256(result).hexdigest() != expected_target:
+        raise ValueError("Patched file failed hash check")
+    return result
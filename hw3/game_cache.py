@@ -0,0 +1,99 @@
+"""
+In-memory LRU cache of hot game files
+
+The lobby serves most downloads from a handful of games, so their bytes are kept
+in memory instead of being re-read from disk on every DOWNLOAD_GAME_FILE:
+- bounded by total bytes, least recently used entries are evicted first
+- keys are tuples starting with the game name, e.g. (game, version) for files and
+  (game, 'delta', base, target) for patches, so invalidate(game) drops them all
+- with compress=True a gzip copy is made once on insert and kept if it's smaller
+- stats() reports hit/miss/eviction counters
+"""
+
+import collections
+import gzip
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class CacheEntry:
+    data: bytes
+    gz: Optional[bytes] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + (len(self.gz) if self.gz else 0)
+
+
+class GameFileCache:
+    def __init__(self, max_bytes: int, max_entry_bytes: Optional[int] = None, compress: bool = False):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self.compress = compress
+        self._entries: "collections.OrderedDict[tuple, CacheEntry]" = collections.OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: tuple, data: bytes) -> CacheEntry:
+        """Cache data under key; entries too large to cache are returned but not stored"""
+        gz = None
+        if self.compress:
+            gz = gzip.compress(data, compresslevel=6, mtime=0)
+            if len(gz) >= len(data):
+                gz = None
+        entry = CacheEntry(data, gz)
+        if entry.size > self.max_entry_bytes:
+            return entry
+        self._drop(key)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes and self._entries:
+            old_key, _ = next(iter(self._entries.items()))
+            self._drop(old_key)
+            self.evictions += 1
+        return entry
+
+    def _drop(self, key: tuple) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry.size
+        return True
+
+    def invalidate(self, game_name: str) -> int:
+        """Drop every entry belonging to game_name"""
+        keys = [key for key in self._entries if key[0] == game_name]
+        for key in keys:
+            self._drop(key)
+        self.invalidations += len(keys)
+        if keys:
+            logging.info(f"[Cache] Invalidated {len(keys)} cached entries for {game_name}")
+        return len(keys)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
@@ -6,6 +6,9 @@ from typing import Dict, Optional
 import aiofiles
 import aiofiles.os
 
+import config
+import utils as ut
+
 
 READY_TIMEOUT = 10
 CONFIRM_TIMEOUT = 15
@@ -30,10 +33,18 @@ async def _send_game_file(game_name: str, file_path: str, writer, send_message)
         return False
 
     await send_message(writer, {"file_size": file_size})
+    sent = 0
+    progress = ut.progress_printer(f"Uploading {game_name}.py")
     async with aiofiles.open(file_path, "rb") as f:
-        data = await f.read()
-    writer.write(data)
-    await writer.drain()
+        while sent < file_size:
+            chunk = await f.read(min(config.FILE_CHUNK_SIZE, file_size - sent))
+            if not chunk:
+                logging.error("[Dev] %s shrank while uploading (%d/%d bytes)", file_path, sent, file_size)
+                return False
+            writer.write(chunk)
+            await writer.drain()
+            sent += len(chunk)
+            progress(sent, file_size)
     logging.info("[Dev] Sent %s (%d bytes)", game_name, file_size)
     return True
 
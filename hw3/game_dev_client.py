@@ -5,6 +5,7 @@ import os
 import aiofiles
 import aiofiles.os
 
+import async_input
 import config
 import utils as ut
 from game_dev import manager as dev_manager
@@ -265,8 +266,7 @@ async def handle_server_messages(reader, writer, logged_in, shutdown_event):
 
 
 async def get_user_input(prompt):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: input(prompt).strip())
+    return (await async_input.ainput(prompt)).strip()
 
 
 async def forward_command(writer, command, params):
@@ -299,7 +299,7 @@ async def handle_user_input(writer, logged_in, shutdown_event):
     global username
     while True:
         try:
-            await asyncio.sleep(1)
+            await asyncio.sleep(config.PROMPT_SETTLE_DELAY)
             user_input = await get_user_input("dev> ")
             if not user_input:
                 continue
@@ -0,0 +1,215 @@
+"""
+Pre-forked game runner processes
+
+initiate_game used to exec the downloaded game inside the client's own event loop,
+so a busy game (Tetris' GUI thread and polling loops) could starve lobby message
+handling. Games now run in a small pool of worker processes:
+- workers are started ahead of time and come with the imports games commonly use
+  (asyncio, aiofiles, tkinter...) already loaded, so a launch only pays for
+  exec + main()
+- they are forked by a forkserver, not by the client: the client is running an
+  event loop with the lobby connection, a selector and executor threads open,
+  and a plain fork() would copy all of that into every worker, including
+  workers started to replace a busy one after the client is connected
+- the client sends the marshal'd code object and peer_info over a Pipe and gets
+  {"ok": bool, "error": str} back when main() returns
+- each worker is handed a dup of the terminal's stdin, so input() in games still works
+- a worker that dies is replaced; without forkserver (Windows) run() returns
+  None and the caller runs the game in-process as before
+
+    client -> worker   {"game_name", "code", "peer_info"}  |  None (shut down)
+    worker -> client   {"event": ...} (game_sdk events, any number) then
+                       {"ok": True}  |  {"ok": False, "error"}
+"""
+
+import asyncio
+import contextlib
+import importlib
+import logging
+import marshal
+import multiprocessing
+import multiprocessing.reduction
+import os
+import sys
+
+import config
+
+WARM_IMPORTS = ('asyncio', 'json', 'logging', 'random', 'threading', 'queue', 'dataclasses',
+                'aiofiles', 'tkinter', 'game_sdk')
+
+
+# ============================================================================
+# Worker process
+# ============================================================================
+
+class _StdinFd:
+    """Sends a dup of the client's stdin to the worker when the process is started"""
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __reduce__(self):
+        return _StdinFd._rebuild, (multiprocessing.reduction.DupFd(self.fd),)
+
+    @staticmethod
+    def _rebuild(dup_fd):
+        return _StdinFd(dup_fd.detach())
+
+
+def _runner_main(conn, stdin):
+    stdin_fd = stdin.fd if stdin is not None else None
+    if stdin_fd is not None:
+        with contextlib.suppress(OSError):
+            sys.stdin = open(stdin_fd, 'r', encoding='utf-8', errors='replace')
+    # Normally already loaded by the forkserver
+    for name in WARM_IMPORTS:
+        with contextlib.suppress(Exception):
+            importlib.import_module(name)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        try:
+            conn.send(_run_job(job, conn))
+        except (BrokenPipeError, OSError):
+            break
+
+
+def _run_job(job, conn):
+    peer_info = job['peer_info']
+    game_globals = {'peer_info': peer_info}
+    game_sdk = sys.modules.get('game_sdk')
+    if game_sdk is not None:
+        game_sdk.set_event_hook(conn.send)
+    try:
+        exec(marshal.loads(job['code']), game_globals)
+        main = game_globals.get('main')
+        if not callable(main):
+            return {'ok': False, 'error': "遊戲腳本不包含 main() 函數。"}
+        asyncio.run(main(peer_info))
+        return {'ok': True}
+    except (Exception, SystemExit) as e:
+        logging.error(f"[Runner] {job.get('game_name')} failed: {e}")
+        return {'ok': False, 'error': str(e)}
+    finally:
+        if game_sdk is not None:
+            game_sdk.set_event_hook(None)
+        asyncio.set_event_loop(None)
+
+
+# ============================================================================
+# Client side
+# ============================================================================
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class GameRunnerPool:
+    """Keeps `size` idle runner processes ready to take a game"""
+
+    def __init__(self, size=None):
+        self.size = max(1, size or config.GAME_RUNNER_POOL_SIZE)
+        self.idle = []
+        self.busy = set()
+        self.available = 'forkserver' in multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context('forkserver') if self.available else None
+        self._stdin_fd = None
+
+    def start(self):
+        if not self.available:
+            logging.info("[Runner] forkserver unavailable, games will run in-process")
+            return
+        # Loaded once in the forkserver, then shared by every worker it forks
+        self._ctx.set_forkserver_preload(['__main__', __name__, *WARM_IMPORTS])
+        with contextlib.suppress(OSError, ValueError, AttributeError):
+            self._stdin_fd = os.dup(sys.stdin.fileno())
+        self._fill()
+
+    def _fill(self):
+        while len(self.idle) < self.size:
+            parent_conn, child_conn = self._ctx.Pipe()
+            stdin = _StdinFd(self._stdin_fd) if self._stdin_fd is not None else None
+            process = self._ctx.Process(target=_runner_main, args=(child_conn, stdin),
+                                        name="game-runner", daemon=True)
+            try:
+                process.start()
+            except OSError as e:
+                logging.error(f"[Runner] Could not start a game runner: {e}")
+                return
+            child_conn.close()
+            self.idle.append(_Worker(process, parent_conn))
+
+    def _take(self):
+        while self.idle:
+            worker = self.idle.pop()
+            if worker.process.is_alive():
+                return worker
+            worker.conn.close()
+        return None
+
+    async def run(self, game_name, code, peer_info, on_event=None):
+        """Run a game to completion in a runner; None if no runner could take it.
+        on_event(message) is called for each game_sdk event the game emits."""
+        if not self.available:
+            return None
+        worker = self._take()
+        if worker is None:
+            self._fill()
+            worker = self._take()
+            if worker is None:
+                return None
+        self.busy.add(worker)
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+
+        def on_readable():
+            try:
+                message = worker.conn.recv()
+            except (EOFError, OSError):
+                message = {'ok': False, 'error': "遊戲程序意外結束"}
+            if 'event' in message:
+                if on_event:
+                    on_event(message)
+                return
+            loop.remove_reader(worker.conn.fileno())
+            if not result.done():
+                result.set_result(message)
+
+        try:
+            worker.conn.send({'game_name': game_name, 'code': marshal.dumps(code), 'peer_info': dict(peer_info)})
+            loop.add_reader(worker.conn.fileno(), on_readable)
+            # Replace the worker we took while this game runs
+            self._fill()
+            return await result
+        finally:
+            self.busy.discard(worker)
+            with contextlib.suppress(Exception):
+                loop.remove_reader(worker.conn.fileno())
+            if worker.process.is_alive() and result.done() and len(self.idle) < self.size:
+                self.idle.append(worker)
+            else:
+                self._stop(worker)
+
+    def _stop(self, worker):
+        with contextlib.suppress(Exception):
+            worker.conn.send(None)
+        worker.conn.close()
+        if worker.process.is_alive():
+            worker.process.terminate()
+
+    def close(self):
+        for worker in self.idle + list(self.busy):
+            self._stop(worker)
+        self.idle.clear()
+        self.busy.clear()
+        if self._stdin_fd is not None:
+            with contextlib.suppress(OSError):
+                os.close(self._stdin_fd)
+            self._stdin_fd = None
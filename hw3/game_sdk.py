@@ -0,0 +1,230 @@
+"""
+Runtime shared by uploaded P2P games
+
+Games are exec'd by the client (in a runner process or in-process) with the
+client's directory on sys.path, so instead of each upload carrying its own
+transport code they `import game_sdk`:
+- Connection: 4-byte length-prefixed JSON frames, the same framing as the lobby
+  protocol. post() only queues a frame; drain() writes everything queued in one
+  write, so a burst of updates costs one syscall. send() is post() + drain().
+- connect(): retries a refused connection with exponential backoff and jitter,
+  since the host may still be starting its listener
+- accept(): waits for the single peer on own_port, then stops listening. Once
+  it is listening it emits a "host_ready" event; the client forwards that to the
+  lobby as HOST_READY, and only then does the lobby give the other player its
+  p2p_info, so the first connect() normally succeeds
+- ainput(): async_input.read_line, for uploads that only import game_sdk
+- P2PGame: checks peer_info, connects according to the role and drives the
+  on_connect / play / on_disconnect hooks. It emits a "started" event right
+  before play(), which the client logs as the game's first tick
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import socket
+import struct
+import time
+
+import async_input
+
+HEADER = struct.Struct('!I')
+MAX_FRAME = 1024 * 1024
+CONNECT_ATTEMPTS = 10
+CONNECT_BASE_DELAY = 0.1
+CONNECT_MAX_DELAY = 2.0
+
+
+_event_hook = None
+
+
+def set_event_hook(hook):
+    """Install hook(event_dict) to receive lifecycle events; the client does this before launching a game"""
+    global _event_hook
+    _event_hook = hook
+
+
+def notify(event, **data):
+    if _event_hook is None:
+        return
+    try:
+        _event_hook({"event": event, **data})
+    except Exception as e:
+        logging.warning(f"Game event hook failed for {event}: {e}")
+
+
+class Connection:
+    def __init__(self, reader, writer, max_frame=MAX_FRAME):
+        self.reader = reader
+        self.writer = writer
+        self.max_frame = max_frame
+        self._pending = []
+        get_extra_info = getattr(writer, 'get_extra_info', None)
+        sock = get_extra_info('socket') if get_extra_info else None
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            # Frames are small and latency-sensitive; don't let Nagle hold them back
+            with contextlib.suppress(OSError):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def post(self, message):
+        """Queue a message; it goes out with the next drain()"""
+        payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        self._pending.append(HEADER.pack(len(payload)))
+        self._pending.append(payload)
+
+    async def drain(self):
+        if self._pending:
+            data = b''.join(self._pending)
+            self._pending.clear()
+            self.writer.write(data)
+        await self.writer.drain()
+
+    async def send(self, message):
+        self.post(message)
+        await self.drain()
+
+    async def recv(self):
+        """Next message, or None once the peer has gone"""
+        try:
+            (length,) = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+            if length > self.max_frame:
+                raise ValueError(f"Frame of {length} bytes exceeds the {self.max_frame} byte limit")
+            payload = await self.reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        return json.loads(payload.decode('utf-8'))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.recv()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def close(self):
+        with contextlib.suppress(Exception):
+            await self.drain()
+        self.writer.close()
+        with contextlib.suppress(Exception):
+            await self.writer.wait_closed()
+
+
+async def connect(host, port, attempts=CONNECT_ATTEMPTS, base_delay=CONNECT_BASE_DELAY,
+                  max_delay=CONNECT_MAX_DELAY, on_retry=None):
+    """Connect to the host, retrying refusals; re-raises the last error after `attempts`"""
+    started = time.monotonic()
+    delay = base_delay
+    for attempt in range(1, attempts + 1):
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            logging.info(f"Connected to {host}:{port} in {(time.monotonic() - started) * 1000:.0f} ms "
+                         f"({attempt} attempt{'s' if attempt > 1 else ''})")
+            return Connection(reader, writer)
+        except ConnectionRefusedError:
+            if attempt >= attempts:
+                logging.warning(f"Gave up connecting to {host}:{port} after {attempts} attempts "
+                                f"({(time.monotonic() - started) * 1000:.0f} ms)")
+                raise
+            # Equal jitter: at least half the backoff, so two clients don't retry in lockstep
+            wait = delay / 2 + random.uniform(0, delay / 2)
+            if on_retry:
+                on_retry(attempt, wait)
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, max_delay)
+
+
+async def accept(port, host='0.0.0.0', timeout=None):
+    """Listen on port until one peer connects; raises asyncio.TimeoutError after timeout"""
+    loop = asyncio.get_running_loop()
+    connected = loop.create_future()
+
+    def on_peer(reader, writer):
+        if connected.done():
+            writer.close()
+            return
+        connected.set_result(Connection(reader, writer))
+
+    server = await asyncio.start_server(on_peer, host, port)
+    listening_at = time.monotonic()
+    notify("host_ready", port=port)
+    try:
+        conn = await asyncio.wait_for(connected, timeout)
+        logging.info(f"Peer connected {(time.monotonic() - listening_at) * 1000:.0f} ms after listening on {port}")
+        return conn
+    finally:
+        # Only the listener; the accepted connection stays open
+        server.close()
+
+
+ainput = async_input.read_line
+
+
+class P2PGame:
+    """
+    Base class for two-player games. Subclasses implement play() using self.conn
+    and may override on_connect / on_disconnect, or open_connection() to use a
+    different transport.
+    """
+
+    connect_attempts = CONNECT_ATTEMPTS
+
+    def __init__(self, peer_info):
+        self.peer_info = peer_info
+        self.role = peer_info.get("role")
+        self.conn = None
+
+    @property
+    def is_host(self):
+        return self.role == "host"
+
+    async def open_connection(self):
+        if self.is_host:
+            port = int(self.peer_info["own_port"])
+            print(f"等待對手連接於 {port}...")
+            return await accept(port)
+        host, port = self.peer_info["peer_ip"], int(self.peer_info["peer_port"])
+        print(f"正在連接到 {host}:{port} 的主機...")
+
+        def on_retry(attempt, wait):
+            print(f"連接被拒絕，{wait:.1f} 秒後重試...（嘗試 {attempt}）")
+
+        return await connect(host, port, attempts=self.connect_attempts, on_retry=on_retry)
+
+    async def on_connect(self):
+        print("已連接到對手。")
+
+    async def play(self):
+        raise NotImplementedError
+
+    async def on_disconnect(self):
+        pass
+
+    async def run(self):
+        missing = [key for key in ("role", "own_port", "peer_ip", "peer_port") if self.peer_info.get(key) is None]
+        if missing:
+            print("錯誤：缺少必要的 P2P 連接資訊。")
+            logging.error(f"缺少必要的 P2P 連接資訊：{missing}")
+            return
+        if self.role not in ("host", "client"):
+            print("無效的角色，無法啟動遊戲")
+            return
+        try:
+            self.conn = await self.open_connection()
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            print(f"無法連接到對手：{e}")
+            logging.error(f"無法連接到對手：{e}")
+            return
+        if self.conn is None:
+            print("無法連接到對手。")
+            return
+        try:
+            await self.on_connect()
+            notify("started")
+            await self.play()
+        finally:
+            await self.on_disconnect()
+            await self.conn.close()
@@ -0,0 +1,186 @@
+"""
+Content-addressed game storage
+
+Uploaded game files are stored once under games-server/objects/<sha256> and the
+digest is the game's version:
+- an upload is hashed while it streams to disk; if the object already exists
+  (same file uploaded by another dev, or re-uploaded unchanged) the copy is dropped
+- clients holding a file with the same digest already have the current version
+- the previous config.GAME_VERSION_HISTORY versions of each game are kept, so a
+  client on an older version can be sent a delta instead of the whole file
+- objects no game references any more are removed by collect()
+- file bytes and deltas are served from an in-memory LRU (file_cache) when hot
+Games uploaded before this (uuid versions) are still served from games-server/<game>.py.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+import aiofiles
+
+import config
+import delta
+import game_cache
+import utils as ut
+
+GAMES_DIR = 'games-server'
+OBJECTS_DIR = os.path.join(GAMES_DIR, 'objects')
+HISTORY_FILE = os.path.join(GAMES_DIR, 'history.json')
+
+_history = None     # game name -> digests, oldest first, current version last
+
+file_cache = game_cache.GameFileCache(
+    config.GAME_CACHE_BYTES,
+    max_entry_bytes=config.GAME_CACHE_MAX_ENTRY,
+    compress=config.GAME_CACHE_COMPRESS
+)
+
+
+def object_path(digest):
+    return os.path.join(OBJECTS_DIR, digest)
+
+
+def legacy_path(game_name):
+    return os.path.join(GAMES_DIR, game_name + '.py')
+
+
+async def ingest(reader, file_size, progress=None):
+    """Stream file_size bytes from reader into the store, returning their digest"""
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    hasher = hashlib.sha256()
+    temp_path = os.path.join(OBJECTS_DIR, f"incoming-{uuid.uuid4().hex}")
+    await ut.stream_to_file(reader, temp_path, file_size, progress, hasher=hasher)
+    digest = hasher.hexdigest()
+    target = object_path(digest)
+    if os.path.exists(target):
+        os.remove(temp_path)
+        # Refresh mtime so collect() treats it as a fresh upload awaiting DB confirmation
+        os.utime(target)
+        logging.info(f"[Store] Upload matches existing object {digest[:12]}, deduplicated")
+    else:
+        os.replace(temp_path, target)
+        logging.info(f"[Store] Stored object {digest[:12]} ({file_size} bytes)")
+    return digest
+
+
+def resolve(game_name, version):
+    """Path of the file for game_name at version, or None"""
+    if ut.is_sha256(version):
+        path = object_path(version)
+        if os.path.exists(path):
+            return path
+    path = legacy_path(game_name)
+    return path if os.path.exists(path) else None
+
+
+async def load(game_name, version):
+    """Bytes of game_name at version through file_cache, or None if missing or too large to cache"""
+    key = (game_name, version)
+    entry = file_cache.get(key)
+    if entry is not None:
+        return entry
+    path = resolve(game_name, version)
+    if path is None or os.path.getsize(path) > file_cache.max_entry_bytes:
+        return None
+    async with aiofiles.open(path, 'rb') as f:
+        data = await f.read()
+    return file_cache.put(key, data)
+
+
+# ----------------------------------------------------------------------------
+# Version history
+# ----------------------------------------------------------------------------
+
+def _load_history():
+    global _history
+    if _history is None:
+        try:
+            with open(HISTORY_FILE, 'r') as f:
+                _history = json.load(f)
+        except (OSError, ValueError):
+            _history = {}
+    return _history
+
+
+def _save_history():
+    os.makedirs(GAMES_DIR, exist_ok=True)
+    temp_path = HISTORY_FILE + '.part'
+    with open(temp_path, 'w') as f:
+        json.dump(_history, f, indent=4)
+    os.replace(temp_path, HISTORY_FILE)
+
+
+def record_version(game_name, digest):
+    """Remember digest as game_name's current version, keeping the previous N"""
+    if not ut.is_sha256(digest):
+        return
+    versions = [v for v in _load_history().get(game_name, []) if v != digest]
+    versions.append(digest)
+    _history[game_name] = versions[-(config.GAME_VERSION_HISTORY + 1):]
+    _save_history()
+
+
+def forget_game(game_name):
+    if _load_history().pop(game_name, None) is not None:
+        _save_history()
+
+
+def has_version(game_name, digest):
+    return digest in _load_history().get(game_name, []) and os.path.exists(object_path(digest))
+
+
+async def make_delta(game_name, base_digest, target_digest):
+    """
+    Delta turning base_digest into target_digest, or None when the base isn't
+    retained or the delta wouldn't be meaningfully smaller than the file.
+    """
+    if not has_version(game_name, base_digest):
+        return None
+    key = (game_name, 'delta', base_digest, target_digest)
+    cached = file_cache.get(key)
+    if cached is not None:
+        return cached.data or None
+    base = await load(game_name, base_digest)
+    target = await load(game_name, target_digest)
+    if base is None or target is None:
+        return None
+    patch = await asyncio.to_thread(delta.make_delta, base.data, target.data)
+    if len(patch) > len(target.data) * config.DELTA_MAX_RATIO:
+        patch = b''                         # remembered as "not worth it"
+    file_cache.put(key, patch)
+    return patch or None
+
+
+def collect(games, grace=None):
+    """
+    Remove objects no entry in games references.
+    Objects younger than grace seconds are kept: they may belong to an upload
+    whose DB confirmation hasn't arrived yet.
+    """
+    if not os.path.isdir(OBJECTS_DIR):
+        return 0
+    grace = config.GAME_OBJECT_GRACE if grace is None else grace
+    referenced = {entry.get("version") for entry in games.values()}
+    for versions in _load_history().values():
+        referenced.update(versions)
+    cutoff = time.time() - grace
+    removed = 0
+    for name in os.listdir(OBJECTS_DIR):
+        if not ut.is_sha256(name) or name in referenced:
+            continue
+        path = object_path(name)
+        try:
+            if os.path.getmtime(path) > cutoff:
+                continue
+            os.remove(path)
+            removed += 1
+        except OSError as e:
+            logging.error(f"[Store] Failed to remove object {name}: {e}")
+    if removed:
+        logging.info(f"[Store] Removed {removed} unreferenced game objects")
+    return removed
@@ -4,11 +4,16 @@ import json
 import logging
 import os
 import random
+import struct
+import tempfile
 import threading
+import time
 import queue
 from dataclasses import dataclass, replace
+from multiprocessing import resource_tracker, shared_memory
 
-import aiofiles
+import async_input
+import game_sdk
 
 try:
     import tkinter
@@ -19,23 +24,11 @@ except Exception:  # pragma: no cover - environments without Tk
     TK_AVAILABLE = False
 
 
-server_close_event = None
 score_log_cache = {}
 
 
-async def send_message(writer, message):
-    """Send JSON message with newline framing."""
-    try:
-        data = json.dumps(message) + "\n"
-        writer.write(data.encode())
-        await writer.drain()
-    except Exception as exc:
-        logging.error(f"Failed to send message: {exc}")
-
-
 async def get_user_input(prompt):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: input(prompt).strip())
+    return (await async_input.read_line(prompt)).strip()
 
 
 SHAPES = {
@@ -49,11 +42,21 @@ SHAPES = {
 }
 
 AUTO_DROP_INTERVAL = 1.0  # Seconds between automatic soft drops
-FILE_RELAY_ROOT = ""
+LOCAL_RING_CAPACITY = 64 * 1024  # Bytes buffered per direction in the local channel
+LOCAL_POLL_INTERVAL = 0.05  # Fallback poll when no wakeup pipe is available
+LOCAL_ATTACH_TIMEOUT = 30
+GUI_FRAME_MS = 16  # At most one redraw per display refresh (~60 Hz)
+GUI_IDLE_POLL_MS = 250  # Safety poll for close / missed wakeups while nothing is drawn
+EMPTY_COLOR = "#ecf0f1"
+FILLED_COLOR = "#3498db"
+
 
+def _should_force_shm():
+    return os.environ.get("FORCE_TETRIS_SHM", "").lower() in ("1", "true", "yes")
 
-def _should_force_file_relay():
-    return os.environ.get("FORCE_TETRIS_FILE_RELAY", "").lower() in ("1", "true", "yes")
+
+def _should_force_relay():
+    return os.environ.get("FORCE_TETRIS_RELAY", "").lower() in ("1", "true", "yes")
 
 
 def _relay_channel_id(peer_info):
@@ -68,40 +71,196 @@ def _relay_channel_id(peer_info):
     return f"{game_name}_{ordered[0]}_{ordered[1]}"
 
 
-class FileStreamReader:
-    def __init__(self, path):
+class ShmRing:
+    """
+    Single-producer/single-consumer byte ring in shared memory.
+    Header: write count (u64), read count (u64), closed flag (u8); the counters only
+    grow, so used = write - read and positions are counters mod capacity.
+    """
+
+    HEADER = struct.Struct("<QQB7x")
+
+    def __init__(self, name, capacity=LOCAL_RING_CAPACITY, create=False):
+        self.name = name
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=self.HEADER.size + capacity)
+            except FileExistsError:
+                # Left behind by a game that crashed; start fresh
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=self.HEADER.size + capacity)
+            self.HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+        else:
+            # Only the creator should unlink the segment; keep this process' tracker from doing it at exit
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:  # Python < 3.13
+                self.shm = shared_memory.SharedMemory(name=name)
+                with contextlib.suppress(Exception):
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.owner = create
+        self.capacity = self.shm.size - self.HEADER.size
+
+    def _state(self):
+        return self.HEADER.unpack_from(self.shm.buf, 0)
+
+    def write(self, data):
+        """Copy as much of data as fits, returning the number of bytes written"""
+        written, read, closed = self._state()
+        count = min(len(data), self.capacity - (written - read))
+        if count <= 0:
+            return 0
+        start = written % self.capacity
+        first = min(count, self.capacity - start)
+        base = self.HEADER.size
+        self.shm.buf[base + start:base + start + first] = data[:first]
+        if count > first:
+            self.shm.buf[base:base + count - first] = data[first:count]
+        # Publish only after the bytes are in place
+        struct.pack_into("<Q", self.shm.buf, 0, written + count)
+        return count
+
+    def read(self):
+        """Everything currently buffered (possibly b"")"""
+        written, read, closed = self._state()
+        count = written - read
+        if count <= 0:
+            return b""
+        start = read % self.capacity
+        first = min(count, self.capacity - start)
+        base = self.HEADER.size
+        data = bytes(self.shm.buf[base + start:base + start + first])
+        if count > first:
+            data += bytes(self.shm.buf[base:base + count - first])
+        struct.pack_into("<Q", self.shm.buf, 8, read + count)
+        return data
+
+    @property
+    def closed(self):
+        return bool(self._state()[2])
+
+    def mark_closed(self):
+        struct.pack_into("<B", self.shm.buf, 16, 1)
+
+    def close(self):
+        with contextlib.suppress(Exception):
+            self.shm.close()
+        if self.owner:
+            with contextlib.suppress(FileNotFoundError):
+                self.shm.unlink()
+
+
+class FifoWakeup:
+    """Named-pipe doorbell so the reader sleeps until the writer has sent something"""
+
+    def __init__(self, path, create=False):
         self.path = path
-        self._offset = 0
-        self._buffer = ""
+        self.owner = create
+        if create:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            os.mkfifo(path, 0o600)
+        self.read_fd = None
+        self.write_fd = None
+
+    def open_reader(self):
+        self.read_fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        # Hold a write end ourselves so the FIFO never reports EOF while the peer is away
+        self._keepalive_fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        return self.read_fd
+
+    def ring(self):
+        if self.write_fd is None:
+            try:
+                self.write_fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                return  # Reader not there yet; it polls as a fallback
+        with contextlib.suppress(BlockingIOError, OSError):
+            os.write(self.write_fd, b"\0")
+
+    def drain(self):
+        with contextlib.suppress(BlockingIOError, OSError):
+            while os.read(self.read_fd, 4096):
+                pass
+
+    def close(self):
+        for fd in (self.read_fd, self.write_fd, getattr(self, "_keepalive_fd", None)):
+            if fd is not None:
+                with contextlib.suppress(OSError):
+                    os.close(fd)
+        self.read_fd = self.write_fd = self._keepalive_fd = None
+        if self.owner:
+            with contextlib.suppress(OSError):
+                os.remove(self.path)
+
+
+class ShmStreamReader:
+    def __init__(self, ring, wakeup=None):
+        self.ring = ring
+        self.wakeup = wakeup
+        self._buffer = b""
         self._closed = False
+        self._event = asyncio.Event()
+        self._loop = None
 
-    async def readline(self):
+    def _on_wakeup(self):
+        self.wakeup.drain()
+        self._event.set()
+
+    async def _wait(self):
+        if self.wakeup is not None and self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            try:
+                self._loop.add_reader(self.wakeup.open_reader(), self._on_wakeup)
+            except (OSError, NotImplementedError):
+                self.wakeup = None
+        self._event.clear()
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._event.wait(), timeout=LOCAL_POLL_INTERVAL)
+
+    async def _fill(self):
+        """Append whatever the ring holds to the buffer; False once the writer has closed"""
         while not self._closed:
-            newline_idx = self._buffer.find("\n")
+            closed = self.ring.closed
+            chunk = self.ring.read()
+            if chunk:
+                self._buffer += chunk
+                return True
+            if closed:
+                break
+            await self._wait()
+        return False
+
+    async def readline(self):
+        while True:
+            newline_idx = self._buffer.find(b"\n")
             if newline_idx != -1:
                 line = self._buffer[: newline_idx + 1]
                 self._buffer = self._buffer[newline_idx + 1 :]
-                return line.encode()
-            try:
-                async with aiofiles.open(self.path, "r") as f:
-                    await f.seek(self._offset)
-                    chunk = await f.read()
-            except FileNotFoundError:
-                chunk = ""
-            if chunk:
-                self._offset += len(chunk)
-                self._buffer += chunk
-                continue
-            await asyncio.sleep(0.2)
-        return b""
+                return line
+            if not await self._fill():
+                return b""
+
+    async def readexactly(self, n):
+        while len(self._buffer) < n:
+            if not await self._fill():
+                raise asyncio.IncompleteReadError(self._buffer, n)
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
 
     def close(self):
         self._closed = True
+        if self._loop is not None and self.wakeup is not None and self.wakeup.read_fd is not None:
+            with contextlib.suppress(Exception):
+                self._loop.remove_reader(self.wakeup.read_fd)
 
 
-class FileStreamWriter:
-    def __init__(self, path):
-        self.path = path
+class ShmStreamWriter:
+    def __init__(self, ring, wakeup=None):
+        self.ring = ring
+        self.wakeup = wakeup
         self._buffer = bytearray()
         self._closed = False
 
@@ -111,56 +270,99 @@ class FileStreamWriter:
         self._buffer.extend(data)
 
     async def drain(self):
-        if self._closed or not self._buffer:
-            return
-        async with aiofiles.open(self.path, "a") as f:
-            await f.write(self._buffer.decode())
-        self._buffer.clear()
+        while self._buffer and not self._closed:
+            written = self.ring.write(self._buffer)
+            if written:
+                del self._buffer[:written]
+                if self.wakeup is not None:
+                    self.wakeup.ring()
+            else:
+                await asyncio.sleep(0.001)  # Ring full: bounded, wait for the reader
 
     def close(self):
-        self._closed = True
+        if not self._closed:
+            self._closed = True
+            self.ring.mark_closed()
+            if self.wakeup is not None:
+                self.wakeup.ring()
 
     async def wait_closed(self):
         return
 
 
-class FileRelayChannel:
+class SharedMemoryChannel:
+    """
+    Transport for two players on the same machine when TCP isn't possible:
+    one shared-memory ring per direction plus a FIFO wakeup for each.
+    The host creates (and later unlinks) everything; the client attaches.
+    """
+
     def __init__(self, peer_info, role):
         self.role = role
         self.peer_info = peer_info
         self.channel_id = _relay_channel_id(peer_info)
-        prefix = f"relay_{self.channel_id}"
-        base = FILE_RELAY_ROOT or ""
-        self.host_to_client = os.path.join(base, f"{prefix}_h2c.log")
-        self.client_to_host = os.path.join(base, f"{prefix}_c2h.log")
-        if role == "host":
-            self.out_path = self.host_to_client
-            self.in_path = self.client_to_host
+        self.rings = []
+        self.wakeups = []
+        self.reader = None
+        self.writer = None
+        self.conn = None
+
+    def _names(self, direction):
+        safe_id = "".join(ch if ch.isalnum() else "_" for ch in self.channel_id)
+        return f"tetris_{safe_id}_{direction}", os.path.join(tempfile.gettempdir(), f"tetris_{safe_id}_{direction}.fifo")
+
+    async def open(self):
+        create = self.role == "host"
+        deadline = asyncio.get_running_loop().time() + LOCAL_ATTACH_TIMEOUT
+        for direction in ("h2c", "c2h"):
+            shm_name, fifo_path = self._names(direction)
+            while True:
+                try:
+                    self.rings.append(ShmRing(shm_name, create=create))
+                    break
+                except FileNotFoundError:
+                    # Host hasn't created the channel yet
+                    if asyncio.get_running_loop().time() > deadline:
+                        raise
+                    await asyncio.sleep(LOCAL_POLL_INTERVAL)
+            wakeup = None
+            if hasattr(os, "mkfifo"):
+                try:
+                    wakeup = FifoWakeup(fifo_path, create=create)
+                    if not create and not os.path.exists(fifo_path):
+                        wakeup = None
+                except OSError:
+                    wakeup = None
+            self.wakeups.append(wakeup)
+        h2c, c2h = self.rings
+        h2c_wakeup, c2h_wakeup = self.wakeups
+        if create:
+            self.writer = ShmStreamWriter(h2c, h2c_wakeup)
+            self.reader = ShmStreamReader(c2h, c2h_wakeup)
         else:
-            self.out_path = self.client_to_host
-            self.in_path = self.host_to_client
-        self.reader = FileStreamReader(self.in_path)
-        self.writer = FileStreamWriter(self.out_path)
+            self.writer = ShmStreamWriter(c2h, c2h_wakeup)
+            self.reader = ShmStreamReader(h2c, h2c_wakeup)
+        self.conn = game_sdk.Connection(self.reader, self.writer)
+        return self
 
     async def send_json(self, payload):
-        data = json.dumps(payload) + "\n"
-        self.writer.write(data.encode())
-        await self.writer.drain()
+        await self.conn.send(payload)
 
     async def recv_json(self):
-        line = await self.reader.readline()
-        if not line:
-            return None
-        return json.loads(line.decode())
+        return await self.conn.recv()
 
     def cleanup(self):
-        for path in (self.host_to_client, self.client_to_host):
-            try:
-                os.remove(path)
-            except FileNotFoundError:
-                pass
-            except OSError:
-                pass
+        if self.reader is not None:
+            self.reader.close()
+        if self.writer is not None:
+            self.writer.close()
+        for wakeup in self.wakeups:
+            if wakeup is not None:
+                wakeup.close()
+        for ring in self.rings:
+            ring.close()
+        self.rings = []
+        self.wakeups = []
 
 
 @dataclass(frozen=True)
@@ -364,7 +566,6 @@ class TetrisGUI:
     def __init__(self, title, width=10, height=20):
         self.width = width
         self.height = height
-        self.queue = queue.Queue()
         self.command_queue = queue.Queue()
         self.closed = threading.Event()
         self.thread = None
@@ -372,6 +573,16 @@ class TetrisGUI:
         self.canvas = None
         self.blocks = {}
         self.score_var = None
+        # Only the newest frame matters: updates overwrite the pending slot, and the
+        # GUI thread draws it at most once per GUI_FRAME_MS
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        self._frame_scheduled = False
+        self._last_draw = 0.0
+        self._shown = {}
+        self._shown_score = None
+        self.frames_drawn = 0
+        self.cells_drawn = 0
         if TK_AVAILABLE:
             self.thread = threading.Thread(target=self._run_gui, args=(title,), daemon=True)
             self.thread.start()
@@ -415,62 +626,207 @@ class TetrisGUI:
                         (self.height - y - 1) * self.BLOCK_SIZE,
                         (x + 1) * self.BLOCK_SIZE,
                         (self.height - y) * self.BLOCK_SIZE,
-                        fill="#ecf0f1",
+                        fill=EMPTY_COLOR,
                         outline="#2f3640",
                     )
                     self.blocks[(x, y)] = rect
+                    self._shown[(x, y)] = EMPTY_COLOR
 
-            def poll_queue():
-                if self.closed.is_set():
-                    self.root.destroy()
+            def idle_poll():
+                if self._check_closed():
                     return
-                try:
-                    while True:
-                        item = self.queue.get_nowait()
-                        if item is None:
-                            self.closed.set()
-                            self.root.destroy()
-                            return
-                        board_lines, score, lines = item
-                        self._apply_board(board_lines, score, lines)
-                except queue.Empty:
-                    pass
-                self.root.after(50, poll_queue)
+                if self._pending is not None:
+                    self._schedule_frame()
+                self.root.after(GUI_IDLE_POLL_MS, idle_poll)
 
             self.root.bind("<Key>", on_key)
-            poll_queue()
+            self.root.bind("<<TetrisFrame>>", lambda _event: self._schedule_frame())
+            idle_poll()
             self.root.mainloop()
         except Exception as exc:
             logging.error(f"Tetris GUI error: {exc}")
 
+    def _check_closed(self):
+        if self.closed.is_set():
+            self.root.destroy()
+            return True
+        return False
+
+    def _schedule_frame(self):
+        # GUI thread only
+        if self._frame_scheduled or self._check_closed():
+            return
+        self._frame_scheduled = True
+        wait = GUI_FRAME_MS - int((time.monotonic() - self._last_draw) * 1000)
+        self.root.after(max(wait, 0), self._draw_frame)
+
+    def _draw_frame(self):
+        self._frame_scheduled = False
+        if self._check_closed():
+            return
+        with self._pending_lock:
+            frame, self._pending = self._pending, None
+        if frame is not None:
+            self._apply_board(*frame)
+            self._last_draw = time.monotonic()
+
     def _apply_board(self, board_lines, score, lines):
         if not self.canvas:
             return
-        for y, row in enumerate(board_lines):
+        height = len(board_lines)
+        changed = 0
+        for row_index, row in enumerate(board_lines):
+            y = height - row_index - 1
             for x, cell in enumerate(row):
-                rect = self.blocks.get((x, len(board_lines) - y - 1))
+                rect = self.blocks.get((x, y))
                 if not rect:
                     continue
-                color = "#3498db" if cell != "." else "#ecf0f1"
-                self.canvas.itemconfigure(rect, fill=color)
-        if self.score_var:
+                color = FILLED_COLOR if cell != "." else EMPTY_COLOR
+                if self._shown.get((x, y)) != color:
+                    self.canvas.itemconfigure(rect, fill=color)
+                    self._shown[(x, y)] = color
+                    changed += 1
+        if self.score_var and self._shown_score != (score, lines):
             self.score_var.set(f"Score: {score} | Lines: {lines}")
+            self._shown_score = (score, lines)
+        self.frames_drawn += 1
+        self.cells_drawn += changed
+
+    def _wake(self):
+        """Ask the GUI thread to draw; the idle poll picks it up if this fails"""
+        root = self.root
+        if root is None:
+            return
+        try:
+            root.event_generate("<<TetrisFrame>>", when="tail")
+        except Exception:
+            pass
 
     def update_board(self, board_lines, score, lines):
         if not TK_AVAILABLE or not self.thread:
             return
         # ensure we always have a snapshot of the board
         copied = list(board_lines)
-        self.queue.put((copied, score, lines))
+        with self._pending_lock:
+            # A frame still waiting to be drawn is simply replaced
+            wake = self._pending is None
+            self._pending = (copied, score, lines)
+        if wake:
+            self._wake()
 
     def close(self):
         if not TK_AVAILABLE or not self.thread:
             return
         self.closed.set()
-        self.queue.put(None)
+        self._wake()
         self.thread.join(timeout=2)
 
 
+def _row_mask(row):
+    mask = 0
+    for x, cell in enumerate(row):
+        if cell:
+            mask |= 1 << x
+    return mask
+
+
+def _piece_state(piece):
+    return [piece.shape, piece.rot, piece.x, piece.y] if piece else None
+
+
+class BoardSync:
+    """
+    Turns successive game states into the smallest message that brings the peer up to date:
+    - MOVE   {"p": [shape, rot, x, y]} when only the falling piece changed
+    - ROWS   {"r": [[y, row_bitmask], ...], "p": ...} when locked rows changed
+    - SNAPSHOT (the full board) first, every FULL_RESYNC_EVERY updates and at game over
+    "s"/"l" carry score/lines only when they changed.
+    """
+
+    FULL_RESYNC_EVERY = 50
+
+    def __init__(self):
+        self.rows = None
+        self.piece = None
+        self.score = None
+        self.lines = None
+        self.since_full = 0
+
+    def update(self, game):
+        """Message for the current state, or None if nothing visible changed"""
+        rows = [_row_mask(row) for row in game.field]
+        piece = _piece_state(game.piece)
+        if self.rows is None or game.game_over or self.since_full >= self.FULL_RESYNC_EVERY:
+            message = {"type": "SNAPSHOT", **game.snapshot(), "piece": piece}
+            self.since_full = 0
+        else:
+            changed = [[y, mask] for y, (mask, old) in enumerate(zip(rows, self.rows)) if mask != old]
+            if not changed and piece == self.piece and game.score == self.score and game.lines == self.lines:
+                return None
+            message = {"type": "ROWS", "r": changed} if changed else {"type": "MOVE"}
+            message["p"] = piece
+            if game.score != self.score:
+                message["s"] = game.score
+            if game.lines != self.lines:
+                message["l"] = game.lines
+            self.since_full += 1
+        self.rows, self.piece, self.score, self.lines = rows, piece, game.score, game.lines
+        return message
+
+
+class RemoteBoard:
+    """The opponent's board rebuilt from SNAPSHOT / ROWS / MOVE messages"""
+
+    def __init__(self, width=10, height=20):
+        self.width = width
+        self.height = height
+        self.rows = [0] * height
+        self.piece = None
+        self.score = 0
+        self.lines = 0
+        self.game_over = False
+        self.synced = False
+
+    def apply(self, message):
+        msg_type = message.get("type")
+        if msg_type == "SNAPSHOT":
+            self._apply_snapshot(message)
+        elif msg_type in ("ROWS", "MOVE"):
+            if not self.synced:
+                return False  # Deltas before the first full board can't be applied
+            for y, mask in message.get("r", []):
+                if 0 <= y < self.height:
+                    self.rows[y] = mask
+        else:
+            return False
+        if "p" in message:
+            self.piece = Piece(*message["p"]) if message["p"] else None
+        self.score = message.get("s", message.get("score", self.score))
+        self.lines = message.get("l", message.get("lines", self.lines))
+        return True
+
+    def _apply_snapshot(self, message):
+        board = message.get("board") or ""
+        has_piece = "piece" in message
+        rows = [0] * self.height
+        for i, row in enumerate(board.split("|")[: self.height]):
+            y = self.height - 1 - i
+            # With the piece sent separately, keep only locked cells ("1"); legacy snapshots draw everything
+            rows[y] = sum(1 << x for x, cell in enumerate(row) if cell == "1" or (cell != "0" and not has_piece))
+        self.rows = rows
+        self.piece = Piece(*message["piece"]) if message.get("piece") else None
+        self.game_over = bool(message.get("game_over"))
+        self.synced = True
+
+    def render(self):
+        grid = [[1 if self.rows[y] >> x & 1 else 0 for x in range(self.width)] for y in range(self.height)]
+        if self.piece:
+            for x, y in get_piece_blocks(self.piece):
+                if 0 <= y < self.height and 0 <= x < self.width:
+                    grid[y][x] = 2
+        return ["".join("#" if cell else "." for cell in row) for row in reversed(grid)]
+
+
 def log_score_if_changed(label, score, lines):
     key = f"{label}"
     previous = score_log_cache.get(key)
@@ -481,6 +837,8 @@ def log_score_if_changed(label, score, lines):
 
 
 def render_remote_board(board_rle):
+    if isinstance(board_rle, RemoteBoard):
+        return board_rle.render()
     if not board_rle:
         return []
     rows = board_rle.split("|")
@@ -490,16 +848,22 @@ def render_remote_board(board_rle):
     return rendered
 
 
-async def print_and_sync_board(role, board_lines, snapshot, writer, game_over_event=None, gui=None):
+async def print_and_sync_board(role, board_lines, snapshot, conn, game_over_event=None, gui=None, update=None):
     if gui:
         gui.update_board(board_lines, snapshot.get("score", 0), snapshot.get("lines", 0))
     else:
         for line in board_lines:
             print(f"[{role}] {line}")
     log_score_if_changed(role, snapshot.get("score", 0), snapshot.get("lines", 0))
-    await send_message(writer, {"type": "SNAPSHOT", "from": role, **snapshot})
+    if update is not None:
+        if update.get("type") == "SNAPSHOT":
+            update = {**update, "from": role}
+        conn.post(update)
+    if snapshot.get("game_over"):
+        # Goes out in the same write as the final snapshot
+        conn.post({"type": "GAME_OVER", "reason": f"{role} topped out"})
+    await conn.drain()
     if snapshot.get("game_over"):
-        await send_message(writer, {"type": "GAME_OVER", "reason": f"{role} topped out"})
         print(f"[{role}] Game over! Score: {snapshot.get('score')}, Lines: {snapshot.get('lines')}")
         if game_over_event and not game_over_event.is_set():
             game_over_event.set()
@@ -507,7 +871,7 @@ async def print_and_sync_board(role, board_lines, snapshot, writer, game_over_ev
     return False
 
 
-async def auto_drop_loop(role, game, writer, lock, game_over_event, interval=AUTO_DROP_INTERVAL, gui=None):
+async def auto_drop_loop(role, game, conn, lock, game_over_event, interval=AUTO_DROP_INTERVAL, gui=None, sync=None):
     try:
         while not game_over_event.is_set():
             await asyncio.sleep(interval)
@@ -519,9 +883,8 @@ async def auto_drop_loop(role, game, writer, lock, game_over_event, interval=AUT
                 game.soft_drop()
                 board_state = game.render_text_board()
                 snapshot = game.snapshot()
-            if gui:
-                gui.update_board(board_state, snapshot.get("score", 0), snapshot.get("lines", 0))
-            finished = await print_and_sync_board(role, board_state, snapshot, writer, game_over_event, gui)
+                update = sync.update(game) if sync else {"type": "SNAPSHOT", **snapshot}
+            finished = await print_and_sync_board(role, board_state, snapshot, conn, game_over_event, gui, update)
             if finished:
                 return
     except asyncio.CancelledError:
@@ -542,19 +905,21 @@ async def wait_for_gui_command(gui, game_over_event):
     return ""
 
 
-async def play_local_game(role, game, writer):
+async def play_local_game(role, game, conn):
     print(f"\n[{role}] Commands: left, right, down, rotleft, rotright, hold, drop, quit")
     gui = TetrisGUI(role, width=game.width, height=game.height) if TK_AVAILABLE else None
     game_lock = asyncio.Lock()
     game_over_event = asyncio.Event()
+    sync = BoardSync()
 
     async with game_lock:
         board_state = game.render_text_board()
         snapshot = game.snapshot()
-    await print_and_sync_board(role, board_state, snapshot, writer, gui=gui)
+        update = sync.update(game)
+    await print_and_sync_board(role, board_state, snapshot, conn, gui=gui, update=update)
 
     drop_task = asyncio.create_task(
-        auto_drop_loop(role, game, writer, game_lock, game_over_event, AUTO_DROP_INTERVAL, gui)
+        auto_drop_loop(role, game, conn, game_lock, game_over_event, AUTO_DROP_INTERVAL, gui, sync)
     )
     try:
         while not game_over_event.is_set():
@@ -579,7 +944,7 @@ async def play_local_game(role, game, writer):
             if not command:
                 continue
             if command in ("quit", "exit"):
-                await send_message(writer, {"type": "GAME_OVER", "reason": f"{role} quit"})
+                await conn.send({"type": "GAME_OVER", "reason": f"{role} quit"})
                 print("You ended the session.")
                 game_over_event.set()
                 break
@@ -588,8 +953,9 @@ async def play_local_game(role, game, writer):
                     game.apply_command(command)
                     board_state = game.render_text_board()
                     snapshot = game.snapshot()
+                    update = sync.update(game)
                 finished = await print_and_sync_board(
-                    role, board_state, snapshot, writer, game_over_event, gui
+                    role, board_state, snapshot, conn, game_over_event, gui, update
                 )
                 if finished:
                     break
@@ -604,22 +970,21 @@ async def play_local_game(role, game, writer):
             gui.close()
 
 
-async def handle_remote_updates(reader, label):
+async def handle_remote_updates(conn, label, remote_board=None):
+    remote_board = remote_board or RemoteBoard()
     try:
         while True:
-            data = await reader.readline()
-            if not data:
-                print(f"[{label}] disconnected.")
-                return
             try:
-                message = json.loads(data.decode())
-            except json.JSONDecodeError:
+                message = await conn.recv()
+            except ValueError:
                 continue
+            if message is None:
+                print(f"[{label}] disconnected.")
+                return
             msg_type = message.get("type")
-            if msg_type == "SNAPSHOT":
-                score = message.get("score", 0)
-                lines = message.get("lines", 0)
-                log_score_if_changed(label, score, lines)
+            if msg_type in ("SNAPSHOT", "ROWS", "MOVE"):
+                if remote_board.apply(message):
+                    log_score_if_changed(label, remote_board.score, remote_board.lines)
             elif msg_type == "GAME_OVER":
                 print(f"\n[{label}] reports game over: {message.get('reason')}")
                 return
@@ -629,147 +994,114 @@ async def handle_remote_updates(reader, label):
         pass
 
 
-async def run_tetris_session(reader, writer, role, remote_label, seed):
+async def run_tetris_session(conn, role, remote_label, seed):
     game = SimpleTetris(seed=seed)
-    remote_task = asyncio.create_task(handle_remote_updates(reader, remote_label))
-    local_task = asyncio.create_task(play_local_game(role, game, writer))
+    remote_task = asyncio.create_task(handle_remote_updates(conn, remote_label))
+    local_task = asyncio.create_task(play_local_game(role, game, conn))
     done, pending = await asyncio.wait(
         [remote_task, local_task],
         return_when=asyncio.FIRST_COMPLETED
     )
     for task in pending:
         task.cancel()
-    writer.close()
-    await writer.wait_closed()
 
 
-async def start_tetris_game_as_host(own_port, peer_info):
-    global server_close_event
-    if _should_force_file_relay():
-        await start_tetris_game_via_file(peer_info, role="host")
-        return
-    try:
-        server_close_event = asyncio.Event()
-        connection_event = asyncio.Event()
+async def open_relay_connection(peer_info, timeout=30):
+    """Connect through the lobby relay; None if the lobby didn't offer one or it refused us"""
+    host = peer_info.get("relay_host")
+    port = peer_info.get("relay_port")
+    token = peer_info.get("relay_token")
+    if not (host and port and token):
+        return None
+    reader, writer = await asyncio.open_connection(host, int(port))
+    # The relay's own hello is a JSON line; game frames start once it's READY
+    hello = {"type": "RELAY_HELLO", "room_id": peer_info.get("room_id"), "token": token}
+    writer.write((json.dumps(hello) + "\n").encode())
+    await writer.drain()
+    line = await asyncio.wait_for(reader.readline(), timeout=timeout)
+    reply = json.loads(line.decode()) if line else {}
+    if reply.get("type") != "RELAY_READY":
+        logging.warning(f"Relay refused connection: {reply.get('message')}")
+        writer.close()
+        return None
+    return game_sdk.Connection(reader, writer)
 
-        async def client_connected(reader, writer):
-            connection_event.set()
-            seed = random.randint(0, 1_000_000)
-            await send_message(writer, {"type": "INIT", "seed": seed})
-            await run_tetris_session(reader, writer, "Host", "Client", seed)
-            server_close_event.set()
-
-        server = await asyncio.start_server(client_connected, "0.0.0.0", own_port)
-        print(f"Tetris host listening on {own_port}")
-
-        async def stop_server():
-            await server_close_event.wait()
-            server.close()
-            await server.wait_closed()
-            print("Tetris host closed.")
-
-        async with server:
-            serve_task = asyncio.create_task(server.serve_forever())
-            stop_task = asyncio.create_task(stop_server())
-            try:
-                await asyncio.wait_for(connection_event.wait(), timeout=5)
-            except asyncio.TimeoutError:
-                print("連線逾時，改用本地檔案通道進行遊戲。")
-                server_close_event.set()
-                server.close()
-                await server.wait_closed()
-                serve_task.cancel()
-                stop_task.cancel()
-                with contextlib.suppress(asyncio.CancelledError):
-                    await serve_task
-                    await stop_task
-                await start_tetris_game_via_file(peer_info, role="host")
-                return
-            await asyncio.gather(serve_task, stop_task)
-    except (PermissionError, OSError) as exc:
-        logging.warning(f"TCP hosting unavailable ({exc}); falling back to file relay.")
-        print("無法建立 TCP 主機，改用本地檔案通道。")
-        await start_tetris_game_via_file(peer_info, role="host")
 
+class TetrisGame(game_sdk.P2PGame):
+    """
+    Direct TCP first; if that fails, the lobby relay, then (same machine only)
+    the shared-memory channel.
+    """
 
-async def start_tetris_game_as_client(peer_ip, peer_port, peer_info):
-    if _should_force_file_relay():
-        await start_tetris_game_via_file(peer_info, role="client")
-        return
-    retries = 0
-    writer = None
-    while retries < 10:
-        try:
-            reader, writer = await asyncio.open_connection(peer_ip, peer_port)
-            break
-        except (PermissionError, OSError) as exc:
-            logging.warning(f"TCP client connection unavailable ({exc}); falling back to file relay.")
-            print("無法以 TCP 連線至主機，改用本地檔案通道。")
-            await start_tetris_game_via_file(peer_info, role="client")
-            return
-        except ConnectionRefusedError:
-            retries += 1
-            await asyncio.sleep(1)
-    if writer is None:
-        print("Unable to connect to host, using local relay instead.")
-        await start_tetris_game_via_file(peer_info, role="client")
-        return
+    def __init__(self, peer_info):
+        super().__init__(peer_info)
+        self.channel = None
+        self.where = None
 
-    init_data = await reader.readline()
-    if not init_data:
-        print("Host closed connection.")
-        writer.close()
-        await writer.wait_closed()
-        return
-    message = json.loads(init_data.decode())
-    if message.get("type") != "INIT":
-        print("Unexpected handshake from host.")
-        writer.close()
-        await writer.wait_closed()
-        return
-    seed = message.get("seed")
-    print(f"Joined Tetris host on {peer_ip}:{peer_port} (seed {seed})")
-    await run_tetris_session(reader, writer, "Client", "Host", seed)
+    async def open_connection(self):
+        if not (_should_force_shm() or _should_force_relay()):
+            try:
+                if self.is_host:
+                    port = int(self.peer_info["own_port"])
+                    print(f"Tetris host listening on {port}")
+                    conn = await game_sdk.accept(port, timeout=5)
+                else:
+                    host, port = self.peer_info["peer_ip"], int(self.peer_info["peer_port"])
+                    conn = await game_sdk.connect(host, port)
+                self.where = "TCP"
+                return conn
+            except asyncio.TimeoutError:
+                print("連線逾時，改用大廳中繼或本地通道進行遊戲。")
+            except OSError as exc:
+                logging.warning(f"TCP connection unavailable ({exc}); falling back.")
+                print("無法建立 TCP 連線，改用大廳中繼或本地通道。")
+        # Lobby relay first; the shared-memory channel only helps if both players share a machine
+        if not _should_force_shm():
+            try:
+                conn = await open_relay_connection(self.peer_info)
+            except (OSError, asyncio.TimeoutError, ValueError) as exc:
+                logging.warning(f"Relay unavailable ({exc})")
+                conn = None
+            if conn is not None:
+                self.where = "lobby relay"
+                return conn
+        self.channel = SharedMemoryChannel(self.peer_info, self.role)
+        try:
+            await self.channel.open()
+        except (OSError, ValueError) as exc:
+            print(f"無法建立本地共享記憶體通道：{exc}")
+            logging.error(f"Local channel {self.channel.channel_id} unavailable: {exc}")
+            return None
+        self.where = f"local shared-memory channel {self.channel.channel_id}"
+        if not self.is_host:
+            print(f"Waiting for host via {self.where}...")
+        return self.channel.conn
 
+    async def on_connect(self):
+        pass
 
-async def start_tetris_game_via_file(peer_info, role):
-    channel = FileRelayChannel(peer_info, role)
-    try:
-        if role == "host":
+    async def play(self):
+        if self.is_host:
             seed = random.randint(0, 1_000_000)
-            await channel.send_json({"type": "INIT", "seed": seed})
-            print(f"Using file relay channel {channel.channel_id} (seed {seed})")
-            await run_tetris_session(channel.reader, channel.writer, "Host", "Client", seed)
-        else:
-            print(f"Waiting for host via file relay channel {channel.channel_id}...")
-            message = await channel.recv_json()
-            if not message or message.get("type") != "INIT":
-                print("Failed to receive host handshake via file relay.")
-                return
-            seed = message.get("seed")
-            print(f"Joined file relay channel with seed {seed}")
-            await run_tetris_session(channel.reader, channel.writer, "Client", "Host", seed)
-    finally:
-        channel.reader.close()
-        channel.writer.close()
-        await channel.writer.wait_closed()
-        if role == "host":
-            channel.cleanup()
-
+            await self.conn.send({"type": "INIT", "seed": seed})
+            print(f"Using {self.where} (seed {seed})")
+            await run_tetris_session(self.conn, "Host", "Client", seed)
+            return
+        message = await self.conn.recv()
+        if message is None:
+            print("Host closed connection.")
+            return
+        if message.get("type") != "INIT":
+            print("Unexpected handshake from host.")
+            return
+        seed = message.get("seed")
+        print(f"Joined Tetris host via {self.where} (seed {seed})")
+        await run_tetris_session(self.conn, "Client", "Host", seed)
 
-async def main(peer_info):
-    role = peer_info.get("role")
-    own_port = peer_info.get("own_port")
-    peer_ip = peer_info.get("peer_ip")
-    peer_port = peer_info.get("peer_port")
+    async def on_disconnect(self):
+        if self.channel is not None:
+            self.channel.cleanup()
 
-    if None in [role, own_port, peer_ip, peer_port]:
-        print("Missing peer info, cannot start.")
-        return
 
-    if role == "host":
-        await start_tetris_game_as_host(int(own_port), peer_info)
-    elif role == "client":
-        await start_tetris_game_as_client(peer_ip, int(peer_port), peer_info)
-    else:
-        print("Unknown role provided in peer info.")
+async def main(peer_info):
+    await TetrisGame(peer_info).run()
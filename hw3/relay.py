@@ -0,0 +1,306 @@
+"""
+Lobby-hosted TCP relay
+
+For players that can't reach each other directly (NAT, firewalls) and aren't on
+the same machine. The lobby hands each player of a room a one-time token in
+p2p_info; both connect here and introduce themselves with one JSON line:
+
+    peer  -> relay   {"type": "RELAY_HELLO", "room_id": ..., "token": ...}\\n
+    relay -> peer    {"type": "RELAY_READY", "role": "host" | "client"}\\n
+                     {"type": "RELAY_ERROR", "message": ...}\\n
+
+Once both tokens of a room have arrived the two sockets are spliced together:
+bytes move socket -> pipe -> socket with os.splice, never entering Python, and the
+pipe bounds how much is in flight per direction. Without os.splice (non-Linux)
+a bounded recv_into/sendall loop is used instead. stats() reports throughput and
+per-chunk forwarding latency for each relay.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import secrets
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import config
+
+HELLO_LIMIT = 4096
+SPLICE_FLAGS = getattr(os, 'SPLICE_F_MOVE', 0) | getattr(os, 'SPLICE_F_NONBLOCK', 0)
+
+
+@dataclass
+class DirectionStats:
+    bytes: int = 0
+    chunks: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+    def record(self, count: int, latency: float) -> None:
+        self.bytes += count
+        self.chunks += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def as_dict(self, duration: float) -> dict:
+        return {
+            'bytes': self.bytes,
+            'chunks': self.chunks,
+            'throughput_bps': self.bytes / duration if duration > 0 else 0.0,
+            'latency_avg_us': self.latency_total / self.chunks * 1e6 if self.chunks else 0.0,
+            'latency_max_us': self.latency_max * 1e6,
+        }
+
+
+@dataclass
+class RelaySession:
+    room_id: str
+    tokens: Dict[str, str]                          # token -> role
+    waiting: Dict[str, socket.socket] = field(default_factory=dict)
+    early: Dict[str, bytes] = field(default_factory=dict)  # bytes sent right after the hello
+    paired_at: Optional[float] = None
+    closed_at: Optional[float] = None
+    host_to_client: DirectionStats = field(default_factory=DirectionStats)
+    client_to_host: DirectionStats = field(default_factory=DirectionStats)
+
+    def stats(self) -> dict:
+        end = self.closed_at or time.monotonic()
+        duration = end - self.paired_at if self.paired_at else 0.0
+        return {
+            'room_id': self.room_id,
+            'paired': self.paired_at is not None,
+            'duration': duration,
+            'host_to_client': self.host_to_client.as_dict(duration),
+            'client_to_host': self.client_to_host.as_dict(duration),
+        }
+
+
+class PeerRelay:
+    """Pairs the two players of a room by token and splices their connections"""
+
+    def __init__(self, pair_timeout: float = 30.0, chunk_size: Optional[int] = None):
+        self.pair_timeout = pair_timeout
+        self.chunk_size = chunk_size or config.RELAY_CHUNK_SIZE
+        self.sessions: Dict[str, RelaySession] = {}
+        self.finished: List[dict] = []
+        self.use_splice = hasattr(os, 'splice')
+        self.port: Optional[int] = None
+        self._listener: Optional[socket.socket] = None
+        self._tasks = set()
+
+    # ------------------------------------------------------------------
+    # Lobby side
+    # ------------------------------------------------------------------
+
+    def register(self, room_id: str) -> Dict[str, str]:
+        """Issue fresh host/client tokens for room_id, replacing any previous ones"""
+        self.sessions.pop(room_id, None)
+        tokens = {'host': secrets.token_hex(16), 'client': secrets.token_hex(16)}
+        self.sessions[room_id] = RelaySession(room_id, {token: role for role, token in tokens.items()})
+        return tokens
+
+    def unregister(self, room_id: str) -> None:
+        session = self.sessions.pop(room_id, None)
+        if session:
+            for sock in session.waiting.values():
+                sock.close()
+
+    async def start(self, host: str = '0.0.0.0', port: int = 0) -> None:
+        self._listener = socket.create_server((host, port), reuse_port=False)
+        self._listener.setblocking(False)
+        self.port = self._listener.getsockname()[1]
+        self._spawn(self._accept_loop())
+        logging.info(f"[Relay] Listening on {host}:{self.port} ({'splice' if self.use_splice else 'copy'} mode)")
+
+    async def close(self) -> None:
+        if self._listener:
+            self._listener.close()
+        for task in list(self._tasks):
+            task.cancel()
+        for room_id in list(self.sessions):
+            self.unregister(room_id)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # ------------------------------------------------------------------
+    # Pairing
+    # ------------------------------------------------------------------
+
+    async def _accept_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            sock, addr = await loop.sock_accept(self._listener)
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._spawn(self._handle_peer(sock, addr))
+
+    async def _read_hello(self, sock: socket.socket):
+        loop = asyncio.get_running_loop()
+        data = b''
+        while b'\n' not in data:
+            chunk = await loop.sock_recv(sock, HELLO_LIMIT - len(data))
+            if not chunk or len(data) + len(chunk) >= HELLO_LIMIT:
+                return None, b''
+            data += chunk
+        line, _, rest = data.partition(b'\n')
+        try:
+            return json.loads(line), rest
+        except ValueError:
+            return None, b''
+
+    async def _reply(self, sock: socket.socket, message: dict) -> None:
+        await asyncio.get_running_loop().sock_sendall(sock, (json.dumps(message) + '\n').encode())
+
+    async def _handle_peer(self, sock: socket.socket, addr) -> None:
+        try:
+            hello, leftover = await asyncio.wait_for(self._read_hello(sock), timeout=10)
+        except (asyncio.TimeoutError, OSError):
+            sock.close()
+            return
+        room_id = hello.get('room_id') if isinstance(hello, dict) else None
+        session = self.sessions.get(room_id)
+        role = session.tokens.get(hello.get('token')) if session else None
+        if role is None or role in session.waiting or session.paired_at:
+            logging.warning(f"[Relay] Rejected peer {addr} for room {room_id}")
+            with contextlib.suppress(OSError):
+                await self._reply(sock, {'type': 'RELAY_ERROR', 'message': 'Unknown room or token'})
+            sock.close()
+            return
+
+        session.waiting[role] = sock
+        session.early[role] = leftover
+        logging.info(f"[Relay] {role} of room {session.room_id} connected from {addr}")
+        if len(session.waiting) < 2:
+            self._spawn(self._expire(session, role, sock))
+            return
+
+        host, client = session.waiting.pop('host'), session.waiting.pop('client')
+        pending = {'host': session.early.pop('host', b''), 'client': session.early.pop('client', b'')}
+        session.paired_at = time.monotonic()
+        try:
+            await self._reply(host, {'type': 'RELAY_READY', 'role': 'host'})
+            await self._reply(client, {'type': 'RELAY_READY', 'role': 'client'})
+            loop = asyncio.get_running_loop()
+            if pending['host']:
+                await loop.sock_sendall(client, pending['host'])
+            if pending['client']:
+                await loop.sock_sendall(host, pending['client'])
+        except OSError:
+            host.close()
+            client.close()
+            self._finish(session)
+            return
+        logging.info(f"[Relay] Paired room {session.room_id}")
+        self._spawn(self._run_pair(session, host, client))
+
+    async def _expire(self, session: RelaySession, role: str, sock: socket.socket) -> None:
+        await asyncio.sleep(self.pair_timeout)
+        if session.waiting.get(role) is sock:
+            session.waiting.pop(role, None)
+            session.early.pop(role, None)
+            logging.info(f"[Relay] {role} of room {session.room_id} gave up waiting for its peer")
+            with contextlib.suppress(OSError):
+                await self._reply(sock, {'type': 'RELAY_ERROR', 'message': 'Peer never arrived'})
+            sock.close()
+
+    # ------------------------------------------------------------------
+    # Forwarding
+    # ------------------------------------------------------------------
+
+    async def _run_pair(self, session: RelaySession, host: socket.socket, client: socket.socket) -> None:
+        pump = self._pump_splice if self.use_splice else self._pump_copy
+        try:
+            await asyncio.gather(
+                pump(host, client, session.host_to_client),
+                pump(client, host, session.client_to_host),
+                return_exceptions=True
+            )
+        finally:
+            host.close()
+            client.close()
+            self._finish(session)
+
+    def _finish(self, session: RelaySession) -> None:
+        session.closed_at = time.monotonic()
+        stats = session.stats()
+        self.finished.append(stats)
+        del self.finished[:-config.RELAY_STATS_HISTORY]
+        if self.sessions.get(session.room_id) is session:
+            del self.sessions[session.room_id]
+        h2c, c2h = stats['host_to_client'], stats['client_to_host']
+        logging.info(
+            f"[Relay] Room {session.room_id} closed after {stats['duration']:.1f}s: "
+            f"h->c {h2c['bytes']}B {h2c['throughput_bps']:.0f}B/s avg {h2c['latency_avg_us']:.0f}us, "
+            f"c->h {c2h['bytes']}B {c2h['throughput_bps']:.0f}B/s avg {c2h['latency_avg_us']:.0f}us"
+        )
+
+    @staticmethod
+    async def _wait(fd: int, writable: bool = False) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        add, remove = (loop.add_writer, loop.remove_writer) if writable else (loop.add_reader, loop.remove_reader)
+        add(fd, lambda: future.done() or future.set_result(None))
+        try:
+            await future
+        finally:
+            remove(fd)
+
+    async def _pump_splice(self, src: socket.socket, dst: socket.socket, stats: DirectionStats) -> None:
+        pipe_r, pipe_w = os.pipe()
+        try:
+            while True:
+                # Try first; only park on the selector when the socket is actually empty
+                try:
+                    count = os.splice(src.fileno(), pipe_w, self.chunk_size, flags=SPLICE_FLAGS)
+                except BlockingIOError:
+                    await self._wait(src.fileno())
+                    continue
+                if count == 0:
+                    break
+                started = time.monotonic()
+                remaining = count
+                while remaining:
+                    try:
+                        remaining -= os.splice(pipe_r, dst.fileno(), remaining, flags=SPLICE_FLAGS)
+                    except BlockingIOError:
+                        await self._wait(dst.fileno(), writable=True)
+                stats.record(count, time.monotonic() - started)
+        except OSError:
+            pass
+        finally:
+            os.close(pipe_r)
+            os.close(pipe_w)
+            with contextlib.suppress(OSError):
+                dst.shutdown(socket.SHUT_WR)
+
+    async def _pump_copy(self, src: socket.socket, dst: socket.socket, stats: DirectionStats) -> None:
+        loop = asyncio.get_running_loop()
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        try:
+            while True:
+                count = await loop.sock_recv_into(src, buffer)
+                if count == 0:
+                    break
+                started = time.monotonic()
+                await loop.sock_sendall(dst, view[:count])
+                stats.record(count, time.monotonic() - started)
+        except OSError:
+            pass
+        finally:
+            with contextlib.suppress(OSError):
+                dst.shutdown(socket.SHUT_WR)
+
+    def stats(self) -> dict:
+        return {
+            'active': [s.stats() for s in self.sessions.values() if s.paired_at],
+            'waiting': sum(1 for s in self.sessions.values() if s.waiting),
+            'finished': list(self.finished),
+        }
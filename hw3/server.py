@@ -1,4 +1,5 @@
 import asyncio
+import contextlib
 import logging
 import json
 import utils as ut
@@ -6,9 +7,18 @@ import config
 from config import tetris_server
 import aiofiles
 import os
-import uuid
+import time
+import game_store
+import relay
+import sessions
 from database import start_db_server
 
+peer_relay = relay.PeerRelay()
+# room_id -> the client player's p2p_info, held until the host's game is listening
+pending_peer_info = {}
+session_store = sessions.SessionStore()
+lobby_sessions = sessions.SessionRegistry()
+
 games = {}
 DEV_ONLY_COMMANDS = {"UPLOAD_GAME", "UPDATE_GAME", "DELETE_GAME", "LIST_OWN_GAMES"}
 async def handle_client(reader, writer):
@@ -36,6 +46,9 @@ async def handle_client(reader, writer):
         writer.close()
         await writer.wait_closed()
         return
+    # Every write to this client goes through its LobbyConnection, so replies, messages from other
+    # users and file transfers reach it in the order they were produced
+    lobby_conn = sessions.LobbyConnection(writer)
     # From client to db
     username = None
     async def handle_client_messages():
@@ -45,12 +58,14 @@ async def handle_client(reader, writer):
                 message = await ut.unpack_message(reader)
                 if message is None:
                     logging.info(f"[Lobby] Client from  {addr} disconnected")
-                    if username:
+                    role = user_role or "client"
+                    # Keep the session for a resume; SERVER_CLOSED only goes out if the grace period runs out
+                    if username and not session_store.detach(username, role, lobby_conn, close_expired_session):
                         await ut.send_command(
                             "lobby",
                             db_writer,
                             "SERVER_CLOSED",
-                            [username, user_role or "client"]
+                            [username, role]
                         )
 
                     break
@@ -60,13 +75,13 @@ async def handle_client(reader, writer):
                     username,
                     user_role,
                     reader,
-                    writer,
+                    lobby_conn,
                     db_reader,
                     db_writer
                 )
         
         except Exception as e:
-            await ut.send_message(writer, ut.build_response("lobby", "error", "Server error"))
+            await ut.send_message(lobby_conn, ut.build_response("lobby", "error", "Server error"))
             logging.error(f"[Lobby] Error when processing client at {addr}: {e}")
     # From db to client
     async def handle_db_messages():
@@ -81,13 +96,13 @@ async def handle_client(reader, writer):
                     username,
                     user_role,
                     reader,
-                    writer,
+                    lobby_conn,
                     db_reader,
                     db_writer
                 )
         
         except Exception as e:
-            await ut.send_message(writer, ut.build_response("lobby", "error", "Server error"))
+            await ut.send_message(lobby_conn, ut.build_response("lobby", "error", "Server error"))
             logging.error(f"[Lobby] Error when processing DB for {addr}: {e}")
     # Run both at the same time
     try:
@@ -101,9 +116,12 @@ async def handle_client(reader, writer):
         for task in pending:
             task.cancel()
     finally:
+        if username:
+            lobby_sessions.unregister(username, user_role or "client", lobby_conn)
+            logging.info(f"[Lobby] Live sessions: {lobby_sessions.stats()}")
         try:
-            writer.close()
-            await writer.wait_closed()
+            lobby_conn.close()
+            await lobby_conn.wait_closed()
             db_writer.close()
             await db_writer.wait_closed()
         except Exception:
@@ -128,6 +146,10 @@ async def process_client_message(message, username, user_role, client_reader, cl
             if len(params) >= 1:
                 username = params[0]
                 user_role = sender
+        elif command == "RESUME":
+            resumed = await handle_resume(params, username, client_writer)
+            if resumed:
+                username, user_role = resumed
         elif command == "LOGOUT":
             if username:
                 await handle_logout(username, client_writer, db_writer, sender)
@@ -160,6 +182,11 @@ async def process_client_message(message, username, user_role, client_reader, cl
                 await ut.send_command("lobby", db_writer, "CHECK", [username])
             else:
                 await ut.send_message(client_writer, ut.build_response("lobby", "error", "Not logged in"))
+        elif command == "HOST_READY":
+            if username:
+                await handle_host_ready(params, username)
+            else:
+                await ut.send_message(client_writer, ut.build_response("lobby", "error", "Not logged in"))
         elif command == "GAME_OVER":
             if username:
                 await handle_game_over(username)
@@ -257,11 +284,6 @@ async def process_db_message(message, username, user_role, client_reader, client
             elif msg.startswith("LOGIN_SUCCESS"):
                 client_ip, client_port = client_writer.get_extra_info('peername')
                 if not is_dev:
-                    async with config.target_lock:
-                        config.targets[username] = {
-                            "writer": client_writer,
-                            "reader": client_reader
-                        }
                     async with tetris_server.online_users_lock:
                         tetris_server.online_users[username] = {
                             "status": "idle",
@@ -275,8 +297,12 @@ async def process_db_message(message, username, user_role, client_reader, client
                             "ip": client_ip,
                             "port": client_port
                         }
-                await ut.send_message(client_writer, ut.build_response("lobby", "success", "LOGIN_SUCCESS"))
+                lobby_sessions.register(username, user_role or "client", client_writer)
+                session = session_store.issue(username, user_role or "client", client_writer)
+                await ut.send_message(client_writer, ut.build_response("lobby", "success", "LOGIN_SUCCESS", [session.token]))
             elif msg.startswith("LOGOUT_SUCCESS"):
+                session_store.revoke(username, user_role or "client")
+                lobby_sessions.unregister(username, user_role or "client", client_writer)
                 async with tetris_server.online_users_lock:
                     tetris_server.online_users.pop(username, None)
                 async with tetris_server.dev_online_users_lock:
@@ -297,6 +323,7 @@ async def process_db_message(message, username, user_role, client_reader, client
                         "game_name": game_name
                     }
                 await ut.send_message(client_writer, ut.build_response("lobby", "success", f"CREATE_ROOM_SUCCESS {room_id}", params_list))
+                await send_prefetch_hint(game_name, client_writer)
             
             elif msg.startswith("JOIN_ROOM_SUCCESS"):
                 parts = msg.split()
@@ -322,31 +349,22 @@ async def process_db_message(message, username, user_role, client_reader, client
                         room_entry["game_name"] = game_name
                     tetris_server.rooms[room_id] = room_entry
                 await ut.send_message(client_writer, ut.build_response("lobby", "success", f"JOIN_ROOM_SUCCESS {room_id}", params_list))
+                await send_prefetch_hint(game_name or room_entry.get("game_name"), client_writer)
                 await send_p2p_info(params_list if params_list else [room_id], username, client_writer)
             elif msg.startswith("INVITE_SENT"):
                 parts = msg.split()
                 target_username = parts[1]
                 room_id = parts[2]
-                target_writer = None
-                
-                try:
-                    target_writer = config.targets[target_username]["writer"]
-                except:
+                if not lobby_sessions.send(target_username, ut.build_response("lobby", "invite", f"{username} {room_id}")):
                     logging.error(f"Target {target_username} not found")
-                await ut.send_message(target_writer, ut.build_response("lobby", "invite", f"{username} {room_id}"))
                 await ut.send_message(client_writer, ut.build_response("lobby", "success", f"INVITE_SENT {target_username} {room_id}"))
             
             elif msg.startswith("DECLINED_INVITE"):
                 parts = msg.split()
                 target_username = parts[1]
                 room_id = parts[2]
-                target_writer = None
-                
-                try:
-                    target_writer = config.targets[target_username]["writer"]
-                except:
+                if not lobby_sessions.send(target_username, ut.build_response("lobby", "invite_declined", f"{username} {room_id}")):
                     logging.error(f"Decline target {target_username} not found")
-                await ut.send_message(target_writer, ut.build_response("lobby", "invite_declined", f"{username} {room_id}"))
                 await ut.send_message(client_writer, ut.build_response("lobby", "success", f"DECLINED_INVITE {target_username} {room_id}"))
             elif msg.startswith("LEAVE_ROOM_SUCCESS"):
                 parts = msg.split()
@@ -368,15 +386,24 @@ async def process_db_message(message, username, user_role, client_reader, client
                         }
                     elif room_id:
                         tetris_server.rooms.pop(room_id, None)
+                        ut.release_ports(room_id)
+                        peer_relay.unregister(room_id)
+                        discard_pending_peer_info(room_id)
                 await ut.send_message(client_writer, ut.build_response("lobby", "success", msg, params_list))
             elif msg.startswith("UPLOAD_GAME_SUCCESS") or msg.startswith("UPDATE_GAME_SUCCESS") or msg.startswith("DELETE_GAME_SUCCESS"):
                 params_list = message_json.get("params", [])
                 if msg.startswith("DELETE_GAME_SUCCESS"):
                     game_name = message_json.get("game_name")
                     games.pop(game_name, None)
+                    game_store.forget_game(game_name)
+                    game_store.file_cache.invalidate(game_name)
                 elif params_list:
                     game_entry = params_list[0]
                     games[game_entry.get("name")] = game_entry
+                    game_store.file_cache.invalidate(game_entry.get("name"))
+                    game_store.record_version(game_entry.get("name"), game_entry.get("version"))
+                if not msg.startswith("UPLOAD_GAME_SUCCESS"):
+                    game_store.collect(games)
                 await ut.send_message(client_writer, message_json)
             elif msg.startswith("LEAVE_REVIEW_SUCCESS"):
                 await ut.send_message(client_writer, message_json)
@@ -457,13 +484,7 @@ async def handle_upload_game(params, username, reader, writer, db_writer):
         if file_size <= 0:
             await ut.send_message(writer, ut.build_response("lobby", "error", "Invalid file size"))
             return
-        file_content = await reader.readexactly(file_size)
-        if not os.path.exists('games-server'):
-            os.makedirs('games-server')
-        file_path = os.path.join('games-server', game_name + '.py')
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
-        version = str(uuid.uuid4())
+        version = await game_store.ingest(reader, file_size)
         await ut.send_command("lobby", db_writer, "UPLOAD_GAME", [username, game_name, game_description, version])
         logging.info(f"[Lobby] Stored uploaded file for {game_name}, awaiting DB confirmation")
     except Exception as e:
@@ -495,13 +516,7 @@ async def handle_update_game(params, username, reader, writer, db_writer):
         if file_size <= 0:
             await ut.send_message(writer, ut.build_response("lobby", "error", "Invalid file size"))
             return
-        file_content = await reader.readexactly(file_size)
-        if not os.path.exists('games-server'):
-            os.makedirs('games-server')
-        file_path = os.path.join('games-server', game_name + '.py')
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
-        version = str(uuid.uuid4())
+        version = await game_store.ingest(reader, file_size)
         await ut.send_command("lobby", db_writer, "UPDATE_GAME", [username, game_name, version, game_description])
         logging.info(f"[Lobby] Stored updated file for {game_name}, awaiting DB confirmation")
     except Exception as e:
@@ -521,7 +536,8 @@ async def handle_delete_game(params, username, writer, db_writer):
     if game_entry.get("publisher") != username:
         await ut.send_message(writer, ut.build_response("lobby", "error", "You are not the publisher of this game"))
         return
-    file_path = os.path.join('games-server', game_name + '.py')
+    # Content-addressed objects are collected once the DB confirms the delete
+    file_path = game_store.legacy_path(game_name)
     if os.path.exists(file_path):
         try:
             os.remove(file_path)
@@ -529,21 +545,95 @@ async def handle_delete_game(params, username, writer, db_writer):
             logging.error(f"Failed to remove game file {file_path}: {e}")
     await ut.send_command("lobby", db_writer, "DELETE_GAME", [username, game_name])
     logging.info(f"[Lobby] Requested deletion of {game_name} metadata in DB")
+async def send_prefetch_hint(game_name, writer):
+    # Lets the client fetch the room's game while waiting, so the match start only confirms the version
+    if not game_name:
+        return
+    async with tetris_server.games_lock:
+        game_entry = games.get(game_name)
+    if game_entry:
+        await ut.send_message(writer, {"status": "prefetch", "game_name": game_name, "version": game_entry.get("version")})
 async def handle_download_game_file(params, writer):
-    if len(params) != 1:
+    # DOWNLOAD_GAME_FILE <game> [local_hash] [gzip] [resume=<version>:<offset>]
+    if not 1 <= len(params) <= 4:
         await ut.send_message(writer, ut.build_response("lobby", "error", "Invalid DOWNLOAD_GAME_FILE command"))
         return
     game_name = params[0]
+    local_hash = params[1] if len(params) > 1 else None
+    accept_gzip = "gzip" in params[2:]
+    resume_version, resume_offset = None, 0
+    for flag in params[2:]:
+        if isinstance(flag, str) and flag.startswith("resume="):
+            resume_version, _, offset = flag[len("resume="):].rpartition(":")
+            resume_offset = int(offset) if offset.isdigit() else 0
     async with tetris_server.games_lock:
         game_entry = games.get(game_name)
         game_version = game_entry.get("version") if game_entry else None
     if not game_entry:
         await ut.send_message(writer, ut.build_response("lobby", "error", "Game metadata not found"))
         return
+    if local_hash and local_hash == game_version:
+        await ut.send_message(writer, {"status": "not_modified", "game_name": game_name, "version": game_version})
+        logging.info(f"Client already has {game_name} at {game_version[:12]}, skipped transfer")
+        return
+    # Header and raw body go out back to back: nothing else is written to this client in between
+    await writer.run(lambda stream: send_game_file(stream, game_name, game_version, local_hash,
+                                                   accept_gzip, resume_version, resume_offset))
+async def send_game_file(writer, game_name, game_version, local_hash, accept_gzip, resume_version, resume_offset):
     try:
-        file_path = os.path.join('games-server', game_name + '.py')
+        if local_hash and ut.is_sha256(local_hash):
+            patch = await game_store.make_delta(game_name, local_hash, game_version)
+            if patch is not None:
+                await ut.send_message(writer, {
+                    "status": "file_delta",
+                    "game_name": game_name,
+                    "version": game_version,
+                    "base": local_hash,
+                    "delta_size": len(patch)
+                })
+                writer.write(patch)
+                await writer.drain()
+                logging.info(f"Sent {len(patch)} byte delta for {game_name} ({local_hash[:12]} -> {game_version[:12]})")
+                return
+        cached = await game_store.load(game_name, game_version)
+        if resume_version != game_version:
+            resume_offset = 0
+        if resume_offset:
+            # Resuming a partial download of the current version: raw bytes from the offset
+            file_path = game_store.resolve(game_name, game_version)
+            total_size = len(cached.data) if cached else (os.path.getsize(file_path) if file_path else 0)
+            if 0 < resume_offset < total_size:
+                await ut.send_message(writer, {
+                    "status": "file_transfer",
+                    "game_name": game_name,
+                    "file_size": total_size - resume_offset,
+                    "offset": resume_offset,
+                    "total_size": total_size,
+                    "version": game_version
+                })
+                if cached:
+                    writer.write(cached.data[resume_offset:])
+                    await writer.drain()
+                else:
+                    await ut.send_file(writer, file_path, total_size - resume_offset, offset=resume_offset)
+                logging.info(f"Resumed game file {game_name} at byte {resume_offset}/{total_size}")
+                return
+        if cached is not None:
+            body = cached.gz if accept_gzip and cached.gz else cached.data
+            await ut.send_message(writer, {
+                "status": "file_transfer",
+                "game_name": game_name,
+                "file_size": len(body),
+                "version": game_version,
+                "encoding": "gzip" if body is cached.gz else "identity"
+            })
+            writer.write(body)
+            await writer.drain()
+            logging.info(f"Sent game file {game_name} from cache ({len(body)} bytes) {game_store.file_cache.stats()}")
+            return
+        file_path = game_store.resolve(game_name, game_version)
         logging.info(f"Sending game file {game_name}")
-        if not os.path.exists(file_path):
+        if not file_path:
             await ut.send_message(writer, ut.build_response("lobby", "error", "Game file does not exist"))
             return
         file_size = os.path.getsize(file_path)
@@ -554,10 +644,7 @@ async def handle_download_game_file(params, writer):
             "version": game_version
         }
         await ut.send_message(writer, file_transfer_message)
-        async with aiofiles.open(file_path, 'rb') as f:
-            file_content = await f.read()
-            writer.write(file_content)
-            await writer.drain()
+        await ut.send_file(writer, file_path, file_size)
         logging.info(f"Sent game file {game_name}")
     except Exception as e:
         logging.error(f"Error while handling DOWNLOAD_GAME_FILE: {e}")
@@ -597,6 +684,12 @@ async def handle_login(params, reader, writer, db_writer, sender):
         await ut.send_message(writer, ut.build_response("lobby", "error", "Invalid LOGIN command"))
         return
     
+    session = session_store.get(params[0], sender)
+    if session is not None and session.writer is None:
+        # A fresh login (e.g. the client restarted and lost its token) replaces the detached session,
+        # which the DB would otherwise still count as logged in
+        session_store.revoke(params[0], sender)
+        await ut.send_command("lobby", db_writer, "SERVER_CLOSED", [params[0], sender])
     client_ip, client_port = writer.get_extra_info('peername')
     params.append(client_ip)
     params.append(str(client_port))
@@ -604,6 +697,37 @@ async def handle_login(params, reader, writer, db_writer, sender):
     
     await ut.send_command("lobby", db_writer, "LOGIN", params)
     logging.info(f"[Lobby] Sent command to login user {params[0]}.")
+async def handle_resume(params, username, writer):
+    if username:
+        await ut.send_message(writer, ut.build_response("lobby", "error", "RESUME_FAILED Already logged in"))
+        return None
+    session = session_store.resume(params[0], writer) if len(params) == 1 else None
+    if session is None:
+        await ut.send_message(writer, ut.build_response("lobby", "error", "RESUME_FAILED Session expired, please log in again"))
+        return None
+    client_ip, client_port = writer.get_extra_info('peername')
+    online_users = tetris_server.dev_online_users if session.role == "game_dev" else tetris_server.online_users
+    lobby_sessions.register(session.username, session.role, writer)
+    # Same user, new address; rooms and status are left as they were
+    entry = online_users.get(session.username)
+    if entry is not None:
+        entry["ip"] = client_ip
+        entry["port"] = client_port
+    await ut.send_message(writer, ut.build_response("lobby", "success", "RESUME_SUCCESS", [session.token, session.username]))
+    logging.info(f"[Lobby] {session.username} resumed its session from {client_ip}:{client_port}")
+    return session.username, session.role
+async def close_expired_session(session):
+    try:
+        db_reader, db_writer = await asyncio.open_connection(config.HOST, config.DB_PORT)
+    except OSError as e:
+        logging.error(f"[Lobby] Could not reach DB to close session of {session.username}: {e}")
+        return
+    try:
+        await ut.send_command("lobby", db_writer, "SERVER_CLOSED", [session.username, session.role])
+    finally:
+        db_writer.close()
+        with contextlib.suppress(Exception):
+            await db_writer.wait_closed()
 async def handle_logout(username, writer, db_writer, sender):
     if not username:
         await ut.send_message(writer, ut.build_response("lobby", "error", "Not logged in"))
@@ -679,13 +803,23 @@ async def send_p2p_info(params, username, writer):
     client_player = players[1]
     host_info = online_snapshot[host_player]
     client_info = online_snapshot[client_player]
-    host_writer = config.targets.get(host_player, {}).get("writer")
-    client_writer = config.targets.get(client_player, {}).get("writer")
-    if not host_writer or not client_writer:
+    host_session = lobby_sessions.get(host_player)
+    client_session = lobby_sessions.get(client_player)
+    if not host_session or not client_session:
         logging.error(f"[Lobby] Missing lobby connection for players {players}")
         return
-    host_port = ut.get_port()
-    client_port = ut.get_port()
+    # A rematch in the same room takes fresh ports
+    ut.release_ports(room_id)
+    host_port = ut.get_port(room_id)
+    client_port = ut.get_port(room_id)
+    if host_port is None or client_port is None:
+        ut.release_ports(room_id)
+        error = ut.build_response("lobby", "error", "No P2P ports available, try again later")
+        host_session.send(error)
+        client_session.send(error)
+        return
+    # Tokens for the lobby relay, used by games when a direct connection fails
+    relay_tokens = peer_relay.register(room_id)
     host_message = {
         "status": "p2p_info",
         "role": "host",
@@ -694,7 +828,10 @@ async def send_p2p_info(params, username, writer):
         "peer_port": client_port,
         "own_port": host_port,
         "game_name": game_name,
-        "game_version": latest_version
+        "game_version": latest_version,
+        "relay_host": config.HOST,
+        "relay_port": peer_relay.port,
+        "relay_token": relay_tokens["host"]
     }
     client_message = {
         "status": "p2p_info",
@@ -704,11 +841,55 @@ async def send_p2p_info(params, username, writer):
         "peer_port": host_port,
         "own_port": client_port,
         "game_name": game_name,
-        "game_version": latest_version
+        "game_version": latest_version,
+        "relay_host": config.HOST,
+        "relay_port": peer_relay.port,
+        "relay_token": relay_tokens["client"]
+    }
+    host_session.send(host_message)
+    discard_pending_peer_info(room_id)
+    if config.HOST_READY_TIMEOUT <= 0:
+        client_session.send(client_message)
+        logging.info(f"[Lobby] Sent peer connection info for room {room_id}")
+        return
+    # The client connects as soon as it gets its info, so hold it until the host reports HOST_READY
+    pending_peer_info[room_id] = {
+        "host": host_player,
+        "client": client_player,
+        "message": client_message,
+        "sent_at": time.monotonic(),
+        "timer": asyncio.create_task(expire_host_ready(room_id))
     }
-    await ut.send_message(host_writer, host_message)
-    await ut.send_message(client_writer, client_message)
-    logging.info(f"[Lobby] Sent peer connection info for room {room_id}")
+    logging.info(f"[Lobby] Sent peer connection info to host of room {room_id}, waiting for HOST_READY")
+def discard_pending_peer_info(room_id):
+    pending = pending_peer_info.pop(room_id, None)
+    if pending and pending["timer"] is not asyncio.current_task():
+        pending["timer"].cancel()
+    return pending
+async def release_peer_info(room_id, host_ready):
+    pending = discard_pending_peer_info(room_id)
+    if not pending:
+        return
+    waited = (time.monotonic() - pending["sent_at"]) * 1000
+    # Looked up now: the client may have resumed on a new connection in the meantime
+    if not lobby_sessions.send(pending["client"], {**pending["message"], "host_ready": host_ready}):
+        logging.error(f"[Lobby] Failed to send peer connection info for room {room_id}: {pending['client']} is not connected")
+        return
+    if host_ready:
+        logging.info(f"[Lobby] Host of room {room_id} listening after {waited:.0f} ms, sent peer connection info to client")
+    else:
+        logging.warning(f"[Lobby] No HOST_READY for room {room_id} after {waited:.0f} ms, sent peer connection info to client anyway")
+async def expire_host_ready(room_id):
+    # Games that don't report readiness still start, with the client's connect retries covering the gap
+    await asyncio.sleep(config.HOST_READY_TIMEOUT)
+    await release_peer_info(room_id, False)
+async def handle_host_ready(params, username):
+    room_id = params[0] if params else None
+    pending = pending_peer_info.get(room_id)
+    if not pending or pending["host"] != username:
+        logging.info(f"[Lobby] Ignoring HOST_READY from {username} for room {room_id}")
+        return
+    await release_peer_info(room_id, True)
 async def handle_decline_invite(params, username, writer, db_writer):
     if len(params) != 2:
         await ut.send_message(writer, ut.build_response("lobby", "error", "Invalid DECLINE_INVITE command"))
@@ -740,6 +921,7 @@ async def handle_game_over(username):
                 break
         if room_to_delete:
             del tetris_server.rooms[room_to_delete]
+            ut.release_ports(room_to_delete)
     async with tetris_server.online_users_lock:
         users_data = [
             {"username": user, "status": info["status"]}
@@ -769,6 +951,10 @@ async def main():
     global games
     games = await load_games()
     
+    try:
+        await peer_relay.start(config.HOST, config.RELAY_PORT)
+    except OSError as e:
+        logging.error(f"[Lobby] Peer relay unavailable: {e}")
     server_ = await asyncio.start_server(handle_client, config.HOST, config.PORT)
     addr = server_.sockets[0].getsockname()
     logging.info(f"[Lobby] Lobby Server running on {addr}")
@@ -781,6 +967,7 @@ async def main():
         finally:
             server_.close()
             await server_.wait_closed()
+            await peer_relay.close()
             logging.info("[Lobby] Server is closed.")
 if __name__ == "__main__":
     asyncio.run(main())
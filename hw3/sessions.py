@@ -0,0 +1,291 @@
+"""
+Lobby sessions
+
+LobbyConnection: the only writer of a client's lobby socket. Replies to its own
+commands, messages fanned out from other users and file transfers all go through
+one queue drained by one task, so they reach the client in the order they were
+produced; it stands in for the StreamWriter (write/drain/get_extra_info) so the
+handlers keep using ut.send_message.
+
+SessionRegistry: the live lobby connection of each logged-in user, replacing the
+global config.targets dict, which was never cleaned up on disconnect and was read
+without its lock. Lookups are by (role, username), entries are dropped when the
+connection closes, and fanning out an invite or p2p_info only queues on the
+target's LobbyConnection (bounded), so it never waits on (or writes to) another
+user's dead socket.
+
+SessionStore: a dropped lobby connection used to log the user out at once
+(SERVER_CLOSED to the DB), so a network blip meant logging in again: a password
+hash check, a data.json rewrite and rebuilding the user's online entry. Now:
+- LOGIN_SUCCESS carries a random session token
+- when the connection drops, the session is only detached; SERVER_CLOSED is
+  deferred until SESSION_GRACE_PERIOD passes without a resume
+- RESUME <token> on a new connection reattaches the user with dict lookups only,
+  keeping its room membership; the token is rotated on every resume so a token
+  can only be used once
+- LOGOUT revokes the session
+"""
+
+import asyncio
+import contextlib
+import logging
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import config
+import utils as ut
+
+
+@dataclass
+class Session:
+    token: str
+    username: str
+    role: str
+    writer: object = None                   # lobby connection the session is attached to
+    detached_at: Optional[float] = None
+    expiry: Optional[asyncio.Task] = None
+
+
+class SessionStore:
+    def __init__(self, grace: Optional[float] = None):
+        self.grace = config.SESSION_GRACE_PERIOD if grace is None else grace
+        self.by_token: Dict[str, Session] = {}
+        self.by_user: Dict[Tuple[str, str], Session] = {}
+
+    def issue(self, username: str, role: str, writer) -> Session:
+        """New session for a fresh login, replacing any earlier one for the same user"""
+        self.revoke(username, role)
+        session = Session(secrets.token_urlsafe(24), username, role, writer)
+        self.by_token[session.token] = session
+        self.by_user[(role, username)] = session
+        return session
+
+    def get(self, username: str, role: str) -> Optional[Session]:
+        return self.by_user.get((role, username))
+
+    def detach(self, username: str, role: str, writer,
+               on_expire: Callable[[Session], Awaitable[None]]) -> bool:
+        """
+        The connection `writer` went away. Returns False if there is no session to
+        keep (the caller should log the user out now), True if it is kept: either
+        detached until on_expire runs, or already resumed on another connection.
+        """
+        session = self.by_user.get((role, username))
+        if session is None or self.grace <= 0:
+            self.revoke(username, role)
+            return False
+        if session.writer is not writer:
+            return True
+        session.writer = None
+        session.detached_at = time.monotonic()
+        session.expiry = asyncio.create_task(self._expire(session, on_expire))
+        logging.info(f"[Session] {role} {username} detached, resumable for {self.grace}s")
+        return True
+
+    async def _expire(self, session: Session, on_expire) -> None:
+        await asyncio.sleep(self.grace)
+        if self.by_user.get((session.role, session.username)) is not session or session.writer is not None:
+            return
+        self._drop(session)
+        logging.info(f"[Session] {session.role} {session.username} was not resumed, closing")
+        await on_expire(session)
+
+    def resume(self, token: str, writer) -> Optional[Session]:
+        """Reattach the session for token to writer; None if unknown or expired"""
+        session = self.by_token.pop(token, None)
+        if session is None:
+            return None
+        if session.expiry and session.expiry is not asyncio.current_task():
+            session.expiry.cancel()
+        session.expiry = None
+        away = time.monotonic() - session.detached_at if session.detached_at else 0.0
+        session.detached_at = None
+        session.writer = writer
+        session.token = secrets.token_urlsafe(24)
+        self.by_token[session.token] = session
+        logging.info(f"[Session] {session.role} {session.username} resumed after {away:.1f}s")
+        return session
+
+    def revoke(self, username: str, role: str) -> None:
+        session = self.by_user.get((role, username))
+        if session is not None:
+            self._drop(session)
+            if session.expiry and session.expiry is not asyncio.current_task():
+                session.expiry.cancel()
+
+    def _drop(self, session: Session) -> None:
+        self.by_token.pop(session.token, None)
+        if self.by_user.get((session.role, session.username)) is session:
+            del self.by_user[(session.role, session.username)]
+
+
+class LobbyConnection:
+    """A client's lobby connection; everything written to it is queued and a task writes it in order"""
+
+    def __init__(self, writer, queue_limit: Optional[int] = None,
+                 username: Optional[str] = None, role: Optional[str] = None):
+        self.writer = writer
+        self.username = username
+        self.role = role
+        self.queue_limit = config.SESSION_QUEUE_LIMIT if queue_limit is None else queue_limit
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.sent = 0
+        self.task = asyncio.create_task(self._pump())
+
+    @property
+    def alive(self) -> bool:
+        return not self.writer.is_closing() and not self.task.done()
+
+    def send(self, message) -> bool:
+        """Queue a message from elsewhere in the lobby; False if the client is not keeping up"""
+        if self.queue.qsize() >= self.queue_limit:
+            return False
+        self.queue.put_nowait(message)
+        return True
+
+    # StreamWriter stand-in, so ut.send_message(conn, ...) queues like send() but waits like drain()
+
+    def write(self, data: bytes) -> None:
+        if not self.task.done():
+            self.queue.put_nowait(bytes(data))
+
+    async def drain(self) -> None:
+        """Wait until everything queued so far has been written"""
+        await self.run(None)
+
+    def get_extra_info(self, name, default=None):
+        return self.writer.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return not self.alive
+
+    async def run(self, job: Optional[Callable[[object], Awaitable[None]]]) -> None:
+        """Run job(writer) on the pump after everything queued before it; nothing queued meanwhile
+        goes out until it returns, so e.g. a file_transfer header and its raw body stay together"""
+        if self.task.done():
+            raise ConnectionResetError("Lobby connection closed")
+        done = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((job, done))
+        await done
+
+    async def _pump(self) -> None:
+        item = None
+        try:
+            while True:
+                item = await self.queue.get()
+                if self.writer.is_closing():
+                    return
+                if isinstance(item, tuple):
+                    job, done = item
+                    try:
+                        if job is not None:
+                            await job(self.writer)
+                    except Exception as e:
+                        if not done.done():
+                            done.set_exception(e)
+                    else:
+                        if not done.done():
+                            done.set_result(None)
+                elif isinstance(item, bytes):
+                    self.writer.write(item)
+                    await self.writer.drain()
+                    self.sent += 1
+                else:
+                    await ut.send_message(self.writer, item)
+                    self.sent += 1
+                item = None
+        except ConnectionError:
+            pass
+        finally:
+            # Nothing more will be written; release whoever is waiting on a drain or a job
+            pending = [item] if item is not None else []
+            while not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+            for entry in pending:
+                if isinstance(entry, tuple) and not entry[1].done():
+                    entry[1].set_exception(ConnectionResetError("Lobby connection closed"))
+
+    def close(self) -> None:
+        """Drop whatever is still queued and close the socket"""
+        self.task.cancel()
+        self.writer.close()
+
+    async def wait_closed(self) -> None:
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        await self.writer.wait_closed()
+
+
+class SessionRegistry:
+    def __init__(self, queue_limit: Optional[int] = None):
+        self.queue_limit = config.SESSION_QUEUE_LIMIT if queue_limit is None else queue_limit
+        self.by_user: Dict[Tuple[str, str], LobbyConnection] = {}
+        # Counters
+        self.opened = 0
+        self.closed = 0
+        self.peak = 0
+        self.dropped = 0                    # messages for users with no live connection or a full queue
+
+    def register(self, username: str, role: str, writer) -> LobbyConnection:
+        """writer (a LobbyConnection, or a bare StreamWriter to wrap in one) becomes username's
+        lobby connection (login or resume)"""
+        old = self.by_user.get((role, username))
+        if old is not None:
+            if old is writer or old.writer is writer:
+                return old
+            self._remove(old)
+        conn = writer if isinstance(writer, LobbyConnection) else LobbyConnection(writer, self.queue_limit)
+        conn.username, conn.role = username, role
+        self.by_user[(role, username)] = conn
+        self.opened += 1
+        self.peak = max(self.peak, len(self.by_user))
+        return conn
+
+    def unregister(self, username: str, role: str, writer) -> None:
+        """The connection writer closed; a newer connection for the same user is left alone"""
+        conn = self.by_user.get((role, username))
+        if conn is not None and (conn is writer or conn.writer is writer):
+            self._remove(conn)
+
+    def get(self, username: str, role: str = "client") -> Optional[LobbyConnection]:
+        conn = self.by_user.get((role, username))
+        if conn is not None and not conn.alive:
+            self._remove(conn)
+            return None
+        return conn
+
+    def send(self, username: str, message, role: str = "client") -> bool:
+        """Queue message for username; False if it has no live connection or is not keeping up"""
+        conn = self.get(username, role)
+        if conn is None:
+            self.dropped += 1
+            return False
+        if not conn.send(message):
+            # The client stopped reading; drop it rather than buffer without bound
+            logging.warning(f"[Session] Outbound queue of {role} {username} is full, closing its connection")
+            self.dropped += 1
+            self._remove(conn)
+            conn.writer.close()
+            return False
+        return True
+
+    def _remove(self, conn: LobbyConnection) -> None:
+        # The connection itself stays open: after a logout it still carries replies to the client
+        if self.by_user.get((conn.role, conn.username)) is conn:
+            del self.by_user[(conn.role, conn.username)]
+        self.closed += 1
+
+    @property
+    def live(self) -> int:
+        return len(self.by_user)
+
+    def stats(self) -> dict:
+        return {
+            "live": self.live,
+            "peak": self.peak,
+            "opened": self.opened,
+            "closed": self.closed,
+            "dropped": self.dropped
+        }
@@ -0,0 +1,71 @@
+import unittest
+
+import allocator
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class IdAllocatorTests(unittest.TestCase):
+    def test_unique_until_exhausted_then_reuses_released(self):
+        ids = allocator.IdAllocator(10, 14, stride=2)
+        taken = [ids.allocate() for _ in range(5)]
+        self.assertEqual(sorted(taken), [10, 11, 12, 13, 14])
+        self.assertIsNone(ids.allocate())
+        self.assertEqual(ids.stats()['exhausted'], 1)
+
+        self.assertTrue(ids.release(12))
+        self.assertFalse(ids.release(12))
+        self.assertEqual(ids.allocate(), 12)
+
+    def test_leases_expire_and_owner_release(self):
+        clock = FakeClock()
+        ids = allocator.IdAllocator(0, 3, default_ttl=5, clock=clock)
+        a = ids.allocate(owner='room1')
+        b = ids.allocate(owner='room1')
+        c = ids.allocate(owner='room2', ttl=100)
+        self.assertEqual(ids.release_owner('room1'), 2)
+        self.assertFalse(ids.is_leased(a) or ids.is_leased(b))
+
+        clock.now = 50
+        self.assertEqual(ids.reap(), 0)     # released leases leave stale heap entries only
+        d = ids.allocate(owner='room3')
+        clock.now = 60
+        self.assertEqual(ids.reap(), 1)
+        self.assertFalse(ids.is_leased(d))
+        self.assertTrue(ids.is_leased(c))
+
+        stats = ids.stats()
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['expired'], 1)
+        self.assertAlmostEqual(stats['utilization'], 0.25)
+
+    def test_port_leases_last_until_the_room_releases_them(self):
+        clock = FakeClock()
+        ports = allocator.IdAllocator(100, 101, clock=clock)
+        port = ports.allocate(owner='room1')
+        clock.now = 30 * 24 * 60 * 60
+        self.assertEqual(ports.reap(), 0)
+        self.assertEqual(ports.owner_of(port), 'room1')
+        self.assertNotEqual(ports.allocate(owner='room2'), port)
+        self.assertEqual(ports.release_owner('room1'), 1)
+        self.assertEqual(ports.allocate(owner='room3'), port)
+
+    def test_room_ids_skip_reserved(self):
+        rooms = allocator.RoomIdAllocator(digits=2, stride=7)
+        self.assertTrue(rooms.reserve_id('07'))
+        self.assertFalse(rooms.reserve_id('07'))
+        seen = {rooms.allocate_id() for _ in range(99)}
+        self.assertNotIn('07', seen)
+        self.assertNotIn(None, seen)
+        self.assertTrue(all(len(room_id) == 2 for room_id in seen))
+        self.assertIsNone(rooms.allocate_id())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import io
+import os
+import unittest
+
+import async_input
+
+
+class AsyncLineReaderTests(unittest.TestCase):
+    def test_lines_pause_and_eof(self):
+        async def run():
+            read_fd, write_fd = os.pipe()
+            stream = os.fdopen(read_fd, 'r')
+            reader = async_input.AsyncLineReader(stream)
+            try:
+                os.write(write_fd, 'help\nlist'.encode())
+                self.assertEqual(await reader.readline(), 'help')
+                self.assertEqual(reader.mode, 'selector')
+                pending = asyncio.create_task(reader.readline())
+                await asyncio.sleep(0.01)
+                self.assertFalse(pending.done())
+                os.write(write_fd, ' rooms\r\n'.encode())
+                self.assertEqual(await asyncio.wait_for(pending, 1), 'list rooms')
+
+                # Paused: a pending readline must leave stdin to whoever else reads it
+                reader.pause()
+                pending = asyncio.create_task(reader.readline())
+                os.write(write_fd, '遊戲\n'.encode())
+                await asyncio.sleep(0.01)
+                self.assertFalse(pending.done())
+                reader.resume()
+                self.assertEqual(await asyncio.wait_for(pending, 1), '遊戲')
+
+                os.write(write_fd, b'last')
+                os.close(write_fd)
+                self.assertEqual(await asyncio.wait_for(reader.readline(), 1), 'last')
+                with self.assertRaises(EOFError):
+                    await reader.readline()
+            finally:
+                reader.pause()
+                stream.close()
+
+        asyncio.run(run())
+
+    def test_thread_fallback_for_unselectable_streams(self):
+        async def run():
+            reader = async_input.AsyncLineReader(io.StringIO('one\ntwo\n'))
+            self.assertEqual(await asyncio.wait_for(reader.readline(), 1), 'one')
+            self.assertEqual(reader.mode, 'thread')
+            self.assertEqual(await asyncio.wait_for(reader.readline(), 1), 'two')
+            with self.assertRaises(EOFError):
+                await asyncio.wait_for(reader.readline(), 1)
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
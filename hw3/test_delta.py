@@ -0,0 +1,33 @@
+import unittest
+
+import delta
+
+
+BASE = "".join(f"line {i}\n" for i in range(700)).encode()
+
+
+class DeltaTests(unittest.TestCase):
+    def test_small_edit_round_trips_and_is_small(self):
+        target = BASE.replace(b"line 350\n", b"line 350 changed\nextra line\n").replace(b"line 10\n", b"")
+        patch = delta.make_delta(BASE, target)
+        self.assertEqual(delta.apply_delta(BASE, patch), target)
+        self.assertLess(len(patch), len(target) // 10)
+
+    def test_unterminated_last_line_and_non_utf8(self):
+        base = b"a\nb\n\xff\xfe"
+        target = b"a\nc\n\xff\xfe tail"
+        self.assertEqual(delta.apply_delta(base, delta.make_delta(base, target)), target)
+
+    def test_wrong_base_and_corrupt_patch_are_rejected(self):
+        target = BASE + b"new line\n"
+        patch = delta.make_delta(BASE, target)
+        with self.assertRaises(ValueError):
+            delta.apply_delta(BASE + b"local edit\n", patch)
+        with self.assertRaises(ValueError):
+            delta.apply_delta(BASE, patch.replace(b"new line", b"bad line"))
+        with self.assertRaises(ValueError):
+            delta.apply_delta(BASE, b"not json")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import gzip
+import os
+import tempfile
+import unittest
+
+import game_cache
+import utils as ut
+
+
+class GameFileCacheTests(unittest.TestCase):
+    def test_lru_eviction_by_bytes(self):
+        cache = game_cache.GameFileCache(max_bytes=25)
+        cache.put(('a', '1'), b'x' * 10)
+        cache.put(('b', '1'), b'y' * 10)
+        self.assertIsNotNone(cache.get(('a', '1')))     # b is now least recently used
+        cache.put(('c', '1'), b'z' * 10)
+        self.assertIsNone(cache.get(('b', '1')))
+        self.assertIsNotNone(cache.get(('a', '1')))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+        self.assertEqual(stats['bytes'], 20)
+
+    def test_oversized_entries_are_not_stored(self):
+        cache = game_cache.GameFileCache(max_bytes=100, max_entry_bytes=10)
+        entry = cache.put(('big', '1'), b'x' * 50)
+        self.assertEqual(entry.data, b'x' * 50)
+        self.assertIsNone(cache.get(('big', '1')))
+
+    def test_gzip_copy_and_invalidate(self):
+        cache = game_cache.GameFileCache(max_bytes=10_000, compress=True)
+        data = b'print("hello")\n' * 200
+        entry = cache.put(('tetris', 'v1'), data)
+        self.assertEqual(gzip.decompress(entry.gz), data)
+        cache.put(('tetris', 'delta', 'v0', 'v1'), b'patch')
+        cache.put(('rps', 'v1'), b'r')
+        self.assertEqual(cache.invalidate('tetris'), 2)
+        self.assertIsNone(cache.get(('tetris', 'v1')))
+        self.assertIsNotNone(cache.get(('rps', 'v1')))
+
+
+    def test_gzip_body_is_inflated_in_chunks_into_part_file(self):
+        data = b'print("hello")\n' * 5000
+        entry = game_cache.GameFileCache(max_bytes=1_000_000, compress=True).put(('tetris', 'v1'), data)
+
+        async def receive(body, part_path):
+            reader = asyncio.StreamReader()
+            reader.feed_data(body)
+            reader.feed_eof()
+            return await ut.append_to_file(reader, part_path, 0, len(body), chunk_size=1024, gzipped=True)
+
+        with tempfile.TemporaryDirectory() as folder:
+            part_path = os.path.join(folder, 'tetris.py.v1.part')
+            self.assertEqual(asyncio.run(receive(entry.gz, part_path)), len(entry.gz))
+            with open(part_path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+            with self.assertRaises(ValueError):
+                asyncio.run(receive(entry.gz[:len(entry.gz) // 2], part_path))
+            # What did arrive is a raw prefix a resume can continue from
+            with open(part_path, 'rb') as f:
+                self.assertTrue(data.startswith(f.read()))
+
+
+if __name__ == '__main__':
+    unittest.main()
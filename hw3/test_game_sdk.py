@@ -0,0 +1,115 @@
+import asyncio
+import socket
+import unittest
+from unittest import mock
+
+import game_sdk
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class EchoGame(game_sdk.P2PGame):
+    async def on_connect(self):
+        self.events = ['connect']
+
+    async def play(self):
+        if self.is_host:
+            self.conn.post({"n": 1})
+            self.conn.post({"n": 2})
+            await self.conn.drain()
+            self.reply = await self.conn.recv()
+        else:
+            self.received = [await self.conn.recv(), await self.conn.recv()]
+            await self.conn.send({"sum": sum(m["n"] for m in self.received)})
+
+    async def on_disconnect(self):
+        self.events.append('disconnect')
+
+
+class GameSdkTests(unittest.TestCase):
+    def test_host_and_client_lifecycle(self):
+        port = free_port()
+
+        async def run():
+            host = EchoGame({"role": "host", "own_port": port, "peer_ip": "127.0.0.1", "peer_port": 1})
+            client = EchoGame({"role": "client", "own_port": 1, "peer_ip": "127.0.0.1", "peer_port": port})
+            # The client starts first and has to back off until the host listens
+            client_task = asyncio.create_task(client.run())
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(asyncio.gather(host.run(), client_task), 10)
+            return host, client
+
+        with mock.patch('builtins.print'):
+            host, client = asyncio.run(run())
+        self.assertEqual(client.received, [{"n": 1}, {"n": 2}])
+        self.assertEqual(host.reply, {"sum": 3})
+        self.assertEqual(host.events, ['connect', 'disconnect'])
+
+    def test_accept_reports_host_ready_once_listening(self):
+        port = free_port()
+        events = []
+
+        async def run():
+            def on_event(message):
+                events.append(message)
+                # The lobby only now tells the other player where to connect
+                asyncio.get_running_loop().create_task(game_sdk.connect('127.0.0.1', port, attempts=1))
+
+            game_sdk.set_event_hook(on_event)
+            try:
+                conn = await asyncio.wait_for(game_sdk.accept(port, host='127.0.0.1'), 5)
+                await conn.close()
+            finally:
+                game_sdk.set_event_hook(None)
+
+        asyncio.run(run())
+        self.assertEqual(events, [{"event": "host_ready", "port": port}])
+
+    def test_posted_frames_go_out_in_one_write(self):
+        async def run():
+            writer = mock.Mock()
+            writer.drain = mock.AsyncMock()
+            conn = game_sdk.Connection(mock.Mock(), writer)
+            conn.post({"type": "MOVE"})
+            conn.post({"type": "GAME_OVER"})
+            await conn.drain()
+            self.assertEqual(writer.write.call_count, 1)
+            data = writer.write.call_args[0][0]
+
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            conn = game_sdk.Connection(reader, mock.Mock())
+            self.assertEqual([m async for m in conn], [{"type": "MOVE"}, {"type": "GAME_OVER"}])
+
+        asyncio.run(run())
+
+    def test_connect_gives_up_with_backoff(self):
+        delays = []
+
+        async def run():
+            with self.assertRaises(ConnectionRefusedError):
+                await game_sdk.connect('127.0.0.1', free_port(), attempts=4, base_delay=0.01,
+                                       on_retry=lambda attempt, wait: delays.append(wait))
+
+        asyncio.run(run())
+        self.assertEqual(len(delays), 3)
+        self.assertTrue(0.005 <= delays[0] <= 0.01)
+        self.assertTrue(0.02 <= delays[2] <= 0.04)
+
+    def test_oversized_frame_is_rejected(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(game_sdk.HEADER.pack(game_sdk.MAX_FRAME + 1))
+            with self.assertRaises(ValueError):
+                await game_sdk.Connection(reader, mock.Mock()).recv()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
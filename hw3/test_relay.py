@@ -0,0 +1,82 @@
+import asyncio
+import os
+import socket
+import unittest
+from unittest import mock
+
+import games.tetris as tetris
+import relay
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class PeerRelayTests(unittest.TestCase):
+    def test_forced_relay_pairs_two_local_players(self):
+        async def run():
+            peer_relay = relay.PeerRelay(pair_timeout=5)
+            await peer_relay.start('127.0.0.1', 0)
+            tokens = peer_relay.register('123456')
+            try:
+                direct_port = free_port()
+
+                def peer_info(role):
+                    # The direct TCP path would work here; only the flag sends both players to the relay
+                    return {"role": role, "room_id": "123456", "own_port": direct_port, "peer_ip": "127.0.0.1",
+                            "peer_port": direct_port, "relay_host": "127.0.0.1", "relay_port": peer_relay.port,
+                            "relay_token": tokens[role]}
+
+                host_game = tetris.TetrisGame(peer_info("host"))
+                client_game = tetris.TetrisGame(peer_info("client"))
+                with mock.patch.dict(os.environ, {"FORCE_TETRIS_RELAY": "1"}):
+                    host_conn, client_conn = await asyncio.wait_for(asyncio.gather(
+                        host_game.open_connection(),
+                        client_game.open_connection(),
+                    ), 10)
+                self.assertEqual(host_game.where, "lobby relay")
+                self.assertEqual(client_game.where, "lobby relay")
+                await host_conn.send({"type": "INIT", "seed": 5})
+                self.assertEqual(await client_conn.recv(), {"type": "INIT", "seed": 5})
+
+                payload = os.urandom(1024 * 1024)
+                client_conn.writer.write(payload)
+                await client_conn.writer.drain()
+                self.assertEqual(await host_conn.reader.readexactly(len(payload)), payload)
+
+                await client_conn.close()
+                self.assertIsNone(await host_conn.recv())
+                await host_conn.close()
+                for _ in range(50):
+                    if peer_relay.finished:
+                        break
+                    await asyncio.sleep(0.01)
+                stats = peer_relay.finished[-1]
+                self.assertEqual(stats['room_id'], '123456')
+                self.assertEqual(stats['client_to_host']['bytes'], len(payload))
+                self.assertGreater(stats['host_to_client']['bytes'], 0)
+                self.assertGreater(stats['client_to_host']['throughput_bps'], 0)
+            finally:
+                await peer_relay.close()
+
+        asyncio.run(run())
+
+    def test_unknown_token_is_rejected(self):
+        async def run():
+            peer_relay = relay.PeerRelay()
+            await peer_relay.start('127.0.0.1', 0)
+            peer_relay.register('654321')
+            try:
+                peer_info = {"room_id": "654321", "relay_host": "127.0.0.1",
+                             "relay_port": peer_relay.port, "relay_token": "not-a-token"}
+                self.assertIsNone(await tetris.open_relay_connection(peer_info, timeout=5))
+            finally:
+                await peer_relay.close()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import asyncio
+import unittest
+
+import sessions
+import utils as ut
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = []
+        self.closing = False
+
+    def write(self, data):
+        self.data.append(data)
+
+    async def drain(self):
+        pass
+
+    def is_closing(self):
+        return self.closing
+
+    def close(self):
+        self.closing = True
+
+
+class SessionStoreTests(unittest.TestCase):
+    def test_resume_rotates_token_and_cancels_expiry(self):
+        async def run():
+            store = sessions.SessionStore(grace=0.05)
+            expired = []
+
+            async def on_expire(session):
+                expired.append(session.username)
+
+            old_writer, new_writer = object(), object()
+            token = store.issue("alice", "client", old_writer).token
+            self.assertTrue(store.detach("alice", "client", old_writer, on_expire))
+            session = store.resume(token, new_writer)
+            await asyncio.sleep(0.1)
+            return store, token, session, expired, new_writer
+
+        store, token, session, expired, new_writer = asyncio.run(run())
+        self.assertEqual(expired, [])
+        self.assertIs(session.writer, new_writer)
+        self.assertNotEqual(session.token, token)
+        self.assertIsNone(store.resume(token, object()))
+
+    def test_unresumed_session_expires(self):
+        async def run():
+            store = sessions.SessionStore(grace=0.01)
+            expired = []
+
+            async def on_expire(session):
+                expired.append(session.username)
+
+            writer = object()
+            token = store.issue("bob", "client", writer).token
+            store.detach("bob", "client", writer, on_expire)
+            await asyncio.sleep(0.05)
+            return store, token, expired
+
+        store, token, expired = asyncio.run(run())
+        self.assertEqual(expired, ["bob"])
+        self.assertIsNone(store.get("bob", "client"))
+        self.assertIsNone(store.resume(token, object()))
+
+    def test_stale_connection_closing_keeps_resumed_session(self):
+        async def run():
+            store = sessions.SessionStore(grace=10)
+
+            async def on_expire(session):
+                pass
+
+            old_writer = object()
+            session = store.issue("carol", "client", old_writer)
+            store.detach("carol", "client", old_writer, on_expire)
+            store.resume(session.token, object())
+            # The old handler only notices the drop now; it must not detach again
+            self.assertTrue(store.detach("carol", "client", old_writer, on_expire))
+            self.assertIsNone(session.expiry)
+            self.assertIsNone(session.detached_at)
+
+        asyncio.run(run())
+
+    def test_no_session_means_log_out_now(self):
+        async def run():
+            store = sessions.SessionStore(grace=10)
+
+            async def on_expire(session):
+                pass
+
+            self.assertFalse(store.detach("dave", "client", object(), on_expire))
+
+        asyncio.run(run())
+
+
+class SessionRegistryTests(unittest.TestCase):
+    def test_messages_go_out_in_order_on_the_current_connection(self):
+        async def run():
+            registry = sessions.SessionRegistry()
+            old_writer, new_writer = FakeWriter(), FakeWriter()
+            registry.register("alice", "client", old_writer)
+            # Resumed on a new connection before the old one was noticed as closed
+            registry.register("alice", "client", new_writer)
+            registry.unregister("alice", "client", old_writer)
+            for n in range(3):
+                self.assertTrue(registry.send("alice", {"n": n}))
+            await asyncio.sleep(0)
+            return registry, old_writer, new_writer
+
+        registry, old_writer, new_writer = asyncio.run(run())
+        self.assertEqual(old_writer.data, [])
+        self.assertEqual([b'"n": %d' % n in frame for n, frame in enumerate(new_writer.data)], [True] * 3)
+        self.assertEqual(registry.stats()["live"], 1)
+
+    def test_closed_and_unknown_connections_are_not_written(self):
+        async def run():
+            registry = sessions.SessionRegistry()
+            writer = FakeWriter()
+            registry.register("bob", "client", writer)
+            writer.close()
+            self.assertFalse(registry.send("bob", {"type": "invite"}))
+            self.assertFalse(registry.send("nobody", {"type": "invite"}))
+            await asyncio.sleep(0)
+            return registry, writer
+
+        registry, writer = asyncio.run(run())
+        self.assertEqual(writer.data, [])
+        self.assertEqual(registry.stats(), {"live": 0, "peak": 1, "opened": 1, "closed": 1, "dropped": 2})
+
+    def test_full_queue_drops_the_connection(self):
+        async def run():
+            registry = sessions.SessionRegistry(queue_limit=2)
+            writer = FakeWriter()
+            registry.register("carol", "client", writer)
+            results = [registry.send("carol", {"n": n}) for n in range(3)]
+            return registry, writer, results
+
+        registry, writer, results = asyncio.run(run())
+        self.assertEqual(results, [True, True, False])
+        self.assertTrue(writer.closing)
+        self.assertEqual(registry.live, 0)
+
+
+class LobbyConnectionTests(unittest.TestCase):
+    def test_replies_fan_out_and_transfers_keep_their_order(self):
+        async def run():
+            registry = sessions.SessionRegistry()
+            writer = FakeWriter()
+            conn = sessions.LobbyConnection(writer)
+            self.assertIs(registry.register("dave", "client", conn), conn)
+
+            async def transfer(stream):
+                stream.write(b"header")
+                await asyncio.sleep(0.01)
+                stream.write(b"body")
+
+            await ut.send_message(conn, {"reply": 1})
+            transfer_task = asyncio.create_task(conn.run(transfer))
+            await asyncio.sleep(0)
+            # Queued while the transfer is running; must not land between header and body
+            self.assertTrue(registry.send("dave", {"invite": 2}))
+            await ut.send_message(conn, {"reply": 3})
+            await transfer_task
+
+            registry.unregister("dave", "client", conn)
+            self.assertFalse(registry.send("dave", {"invite": 4}))
+            # Logged out, but the connection still carries replies
+            await ut.send_message(conn, {"reply": 5})
+            return writer
+
+        writer = asyncio.run(run())
+        order = [b"reply" if b'"reply"' in frame else b"invite" if b'"invite"' in frame else frame
+                 for frame in writer.data]
+        self.assertEqual(order, [b"reply", b"header", b"body", b"invite", b"reply", b"reply"])
+
+    def test_drain_fails_once_the_connection_is_closed(self):
+        async def run():
+            writer = FakeWriter()
+            conn = sessions.LobbyConnection(writer)
+            conn.close()
+            await asyncio.sleep(0)
+            with self.assertRaises(ConnectionResetError):
+                await conn.drain()
+            return writer
+
+        self.assertTrue(asyncio.run(run()).closing)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,9 @@
+import asyncio
+import json
+import os
+import time
 import unittest
+from unittest import mock
 
 import games.tetris as tetris
 
@@ -22,5 +27,119 @@ class TetrisLogicTests(unittest.TestCase):
         self.assertIsNotNone(game.hold_piece)
 
 
+class BoardSyncTests(unittest.TestCase):
+    def test_remote_board_tracks_deltas(self):
+        game = tetris.SimpleTetris(seed=3)
+        sync = tetris.BoardSync()
+        remote = tetris.RemoteBoard()
+        first = sync.update(game)
+        self.assertEqual(first["type"], "SNAPSHOT")
+        remote.apply(first)
+        self.assertEqual(remote.render(), game.render_text_board())
+
+        game.apply_command("left")
+        move = sync.update(game)
+        self.assertEqual(move["type"], "MOVE")
+        self.assertLess(len(json.dumps(move, separators=(",", ":"))), 40)
+        self.assertLess(len(json.dumps(move)), len(json.dumps(first)) // 5)
+
+        for command in ["right", "rotright", "drop", "down", "left", "left", "drop", "hold", "right", "right", "drop"] * 4:
+            game.apply_command(command)
+            update = sync.update(game)
+            if update:
+                remote.apply(update)
+            self.assertEqual(remote.render(), game.render_text_board())
+            self.assertEqual((remote.score, remote.lines), (game.score, game.lines))
+        self.assertIsNone(sync.update(game))
+
+    def test_periodic_full_resync(self):
+        game = tetris.SimpleTetris(seed=5)
+        sync = tetris.BoardSync()
+        types = []
+        for i in range(tetris.BoardSync.FULL_RESYNC_EVERY + 2):
+            game.apply_command("left" if i % 2 else "right")
+            types.append(sync.update(game)["type"])
+        self.assertEqual(types[0], "SNAPSHOT")
+        self.assertEqual(types[tetris.BoardSync.FULL_RESYNC_EVERY + 1], "SNAPSHOT")
+        self.assertEqual(types.count("SNAPSHOT"), 2)
+        self.assertFalse(tetris.RemoteBoard().apply({"type": "MOVE", "p": ["T", 0, 4, 19]}))
+
+
+class FakeCanvas:
+    def __init__(self):
+        self.fills = []
+
+    def itemconfigure(self, item, fill):
+        self.fills.append((item, fill))
+
+
+class TetrisGUIRenderTests(unittest.TestCase):
+    def make_gui(self):
+        with mock.patch.object(tetris, "TK_AVAILABLE", False):
+            gui = tetris.TetrisGUI("test", width=4, height=3)
+        gui.thread = mock.Mock()  # Pretend the GUI thread is up without opening a window
+        gui.canvas = FakeCanvas()
+        for x in range(4):
+            for y in range(3):
+                gui.blocks[(x, y)] = (x, y)
+                gui._shown[(x, y)] = tetris.EMPTY_COLOR
+        return gui
+
+    def test_updates_are_coalesced_and_only_changed_cells_redrawn(self):
+        gui = self.make_gui()
+        with mock.patch.object(tetris, "TK_AVAILABLE", True):
+            gui.update_board(["....", "....", "#..."], 0, 0)
+            gui.update_board(["....", "....", "##.."], 0, 0)
+            gui._draw_frame()
+            self.assertEqual(gui.frames_drawn, 1)
+            self.assertEqual(sorted(gui.canvas.fills), [((0, 0), tetris.FILLED_COLOR), ((1, 0), tetris.FILLED_COLOR)])
+
+            gui.canvas.fills.clear()
+            gui.update_board(["....", "....", ".#.."], 0, 0)
+            gui._draw_frame()
+            self.assertEqual(gui.canvas.fills, [((0, 0), tetris.EMPTY_COLOR)])
+            gui._draw_frame()  # Nothing pending, nothing drawn
+            self.assertEqual(gui.frames_drawn, 2)
+
+
+class SharedMemoryChannelTests(unittest.TestCase):
+    def test_ring_wraps_and_stays_bounded(self):
+        ring = tetris.ShmRing(f"tetris_test_{os.getpid()}", capacity=16, create=True)
+        try:
+            self.assertEqual(ring.write(b"0123456789"), 10)
+            self.assertEqual(ring.read(), b"0123456789")
+            self.assertEqual(ring.write(b"abcdefghijklmnopqrstuvwxyz"), 16)
+            self.assertEqual(ring.write(b"more"), 0)
+            self.assertEqual(ring.read(), b"abcdefghijklmnop")
+            self.assertFalse(ring.closed)
+            ring.mark_closed()
+            self.assertTrue(ring.closed)
+        finally:
+            ring.close()
+
+    def test_host_and_client_exchange_json(self):
+        peer_info = {"game_name": f"test{os.getpid()}", "own_port": 1, "peer_port": 2}
+
+        async def run():
+            host = await tetris.SharedMemoryChannel(peer_info, "host").open()
+            client = await tetris.SharedMemoryChannel(peer_info, "client").open()
+            try:
+                await host.send_json({"type": "INIT", "seed": 7})
+                self.assertEqual(await client.recv_json(), {"type": "INIT", "seed": 7})
+                started = time.perf_counter()
+                reply = asyncio.create_task(host.recv_json())
+                await asyncio.sleep(0)
+                await client.send_json({"type": "SNAPSHOT", "score": 1})
+                self.assertEqual(await reply, {"type": "SNAPSHOT", "score": 1})
+                self.assertLess(time.perf_counter() - started, tetris.LOCAL_POLL_INTERVAL)
+                client.writer.close()
+                self.assertIsNone(await host.recv_json())
+            finally:
+                client.cleanup()
+                host.cleanup()
+
+        asyncio.run(run())
+
+
 if __name__ == "__main__":
     unittest.main()
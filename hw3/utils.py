@@ -1,10 +1,13 @@
 import struct
 import asyncio
 import hashlib
+import contextlib
+import os
 
 import logging
 import json
-import random
+import zlib
+import aiofiles
 import config
 from config import tetris_server as tetris_server
 
@@ -118,17 +121,192 @@ def hash(p):
     pswd = hashlib.sha256(p.encode()).hexdigest()
     return str(pswd)
 
-def get_port():
-    return random.randint(config.P2P_PORT_RANGE[0], config.P2P_PORT_RANGE[1])
+def get_port(owner=None):
+    """Lease a P2P port, None when the range is exhausted"""
+    return config.p2p_ports.allocate(owner)
 
 
-def get_game_port():
-    return random.randint(config.GAME_PORT_RANGE[0], config.GAME_PORT_RANGE[1])
+def release_port(port):
+    if port is not None:
+        config.p2p_ports.release(port)
 
 
-def get_room_id():
-    id = ''.join(str(random.randint(0, 9)) for x in range(6))
-    return id
+def release_ports(owner):
+    """Release every P2P port leased to owner (e.g. a room)"""
+    return config.p2p_ports.release_owner(owner)
+
+
+def get_game_port(owner=None):
+    """Lease a game server port, None when the range is exhausted"""
+    return config.game_ports.allocate(owner)
+
+
+def release_game_port(port):
+    if port is not None:
+        config.game_ports.release(port)
+
+
+def get_room_id(owner=None):
+    """Lease an unused 6-digit room ID, None when all are taken"""
+    return config.room_ids.allocate_id(owner)
+
+
+def release_room_id(room_id):
+    config.room_ids.release_id(room_id)
+
+
+def allocator_stats():
+    return [config.p2p_ports.stats(), config.game_ports.stats(), config.room_ids.stats()]
+
+
+"""
+File streaming
+"""
+async def stream_to_file(reader, file_path, file_size, progress=None, chunk_size=None,
+                         hasher=None, expected_sha256=None):
+    """
+    Copy exactly file_size bytes from reader into file_path, one bounded chunk at a time.
+    Data lands in a .part file that replaces file_path only once complete (and, with
+    expected_sha256, only if the content matches; ValueError otherwise).
+    """
+    chunk_size = chunk_size or config.FILE_CHUNK_SIZE
+    if expected_sha256 and hasher is None:
+        hasher = hashlib.sha256()
+    temp_path = file_path + ".part"
+    received = 0
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            while received < file_size:
+                chunk = await reader.readexactly(min(chunk_size, file_size - received))
+                await f.write(chunk)
+                if hasher:
+                    hasher.update(chunk)
+                received += len(chunk)
+                if progress:
+                    progress(received, file_size)
+        if expected_sha256 and hasher.hexdigest() != expected_sha256:
+            raise ValueError(f"{file_path} failed hash check (got {hasher.hexdigest()}, expected {expected_sha256})")
+        os.replace(temp_path, file_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return received
+
+
+async def append_to_file(reader, file_path, offset, count, progress=None, chunk_size=None, gzipped=False):
+    """
+    Write count bytes from reader into file_path starting at offset, keeping what's
+    already there before it. Unlike stream_to_file nothing is removed on failure:
+    every chunk is flushed, so an interrupted transfer can resume from the file's size.
+    With gzipped=True the count bytes are a gzip stream, inflated chunk by chunk, so
+    what lands in the file (and any later resume offset) is always the raw content.
+    """
+    chunk_size = chunk_size or config.FILE_CHUNK_SIZE
+    inflater = zlib.decompressobj(wbits=31) if gzipped else None
+    received = 0
+    async with aiofiles.open(file_path, 'r+b' if offset and os.path.exists(file_path) else 'wb') as f:
+        await f.seek(offset)
+        await f.truncate()
+        while received < count:
+            chunk = await reader.readexactly(min(chunk_size, count - received))
+            received += len(chunk)
+            if inflater:
+                # Bounded output per call, so a highly compressible chunk can't balloon
+                while chunk:
+                    await f.write(inflater.decompress(chunk, chunk_size))
+                    chunk = inflater.unconsumed_tail
+            else:
+                await f.write(chunk)
+            await f.flush()
+            if progress:
+                progress(offset + received, offset + count)
+        if inflater:
+            await f.write(inflater.flush())
+            if not inflater.eof:
+                raise ValueError(f"{file_path}: gzip stream ended early")
+    return received
+
+
+async def skip_bytes(reader, count, chunk_size=None):
+    """Read and drop count bytes, e.g. a file body the receiver can't use"""
+    chunk_size = chunk_size or config.FILE_CHUNK_SIZE
+    while count > 0:
+        count -= len(await reader.readexactly(min(chunk_size, count)))
+
+
+async def stream_from_file(writer, file_path, file_size, progress=None, chunk_size=None, offset=0):
+    """Write file_size bytes of file_path (from offset) to writer, draining after every chunk"""
+    chunk_size = chunk_size or config.FILE_CHUNK_SIZE
+    sent = 0
+    async with aiofiles.open(file_path, 'rb') as f:
+        if offset:
+            await f.seek(offset)
+        while sent < file_size:
+            chunk = await f.read(min(chunk_size, file_size - sent))
+            if not chunk:
+                raise IOError(f"{file_path} shrank while sending ({sent}/{file_size} bytes)")
+            writer.write(chunk)
+            await writer.drain()
+            sent += len(chunk)
+            if progress:
+                progress(sent, file_size)
+    return sent
+
+
+async def send_file(writer, file_path, file_size, progress=None, offset=0):
+    """
+    Send file_size bytes of file_path, starting at offset, with os.sendfile through the transport, so the
+    data never passes through Python buffers or the aiofiles thread pool.
+    Falls back to stream_from_file when the transport can't sendfile (e.g. TLS, Windows selector loop).
+    """
+    loop = asyncio.get_running_loop()
+    sent = 0
+    try:
+        with open(file_path, 'rb') as f:
+            while sent < file_size:
+                count = min(config.SENDFILE_CHUNK_SIZE, file_size - sent)
+                n = await loop.sendfile(writer.transport, f, offset + sent, count, fallback=False)
+                if n == 0:
+                    raise IOError(f"{file_path} shrank while sending ({sent}/{file_size} bytes)")
+                sent += n
+                if progress:
+                    progress(sent, file_size)
+        return sent
+    except (asyncio.SendfileNotAvailableError, NotImplementedError) as e:
+        if sent:
+            raise
+        logging.debug(f"[Network] sendfile unavailable, streaming {file_path} instead: {e}")
+        return await stream_from_file(writer, file_path, file_size, progress, offset=offset)
+
+
+async def file_sha256(file_path, chunk_size=None):
+    """SHA-256 of a file, or None if it can't be read"""
+    chunk_size = chunk_size or config.FILE_CHUNK_SIZE
+    hasher = hashlib.sha256()
+    try:
+        async with aiofiles.open(file_path, 'rb') as f:
+            while True:
+                chunk = await f.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+
+def is_sha256(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+def progress_printer(label):
+    """Progress callback that redraws one console line per chunk"""
+    def report(done, total):
+        percent = done * 100 // total if total else 100
+        end = "\n" if done >= total else ""
+        print(f"\r{label}: {done}/{total} bytes ({percent}%)", end=end, flush=True)
+    return report
 
 
 """